@@ -2,11 +2,13 @@
 pip install -q transformers huggingface_hub
 
 python - << 'EOF'
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoConfig, AutoModelForImageTextToText, AutoProcessor
 
-model = AutoModelForCausalLM.from_pretrained(
-    "anonymous-uiagent-weights/GUISwiper"
-)
-tok = AutoTokenizer.from_pretrained("anonymous-uiagent-weights/GUISwiper")
-print("Model & tokenizer loaded.")
+# GUISwiper reads screenshots, so it is loaded as an image-text model, the same way SwipeGen/guiswiper.py loads it
+repo = "anonymous-uiagent-weights/GUISwiper"
+config = AutoConfig.from_pretrained(repo, trust_remote_code=True)
+assert getattr(config, "vision_config", None) is not None, f"{repo} has no vision_config"
+model = AutoModelForImageTextToText.from_pretrained(repo, trust_remote_code=True)
+processor = AutoProcessor.from_pretrained(repo, trust_remote_code=True)
+print(f"Model ({config.model_type}) & processor loaded.")
 EOF
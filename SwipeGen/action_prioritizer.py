@@ -0,0 +1,232 @@
+# action_prioritizer.py
+import json
+import math
+from pathlib import Path
+
+# 区域语义关键字 -> 类别，同时匹配 type 和描述（中英文）
+_KEYWORDS = [
+    ("tab", ("tab", "标签", "导航", "nav", "分类", "category")),
+    ("carousel", ("carousel", "banner", "轮播", "横幅")),
+    ("list", ("list", "feed", "列表", "grid", "网格", "recycler", "内容流")),
+    ("progress", ("progress", "slider", "进度", "滑块", "seek")),
+    ("calendar", ("calendar", "日历", "date", "日期")),
+    ("button", ("button", "按钮", "icon", "图标", "fab")),
+    ("input", ("input", "search", "搜索", "输入", "edittext")),
+    ("card", ("card", "卡片", "item", "条目", "列表项")),
+    ("page", ("page", "首页", "页面", "screen", "home")),
+]
+
+_FEATURES = ("kind", "direction", "semantic", "aspect", "area", "ypos", "fullscreen")
+
+
+def _semantic(text):
+    text = (text or "").lower()
+    for name, keys in _KEYWORDS:
+        if any(k in text for k in keys):
+            return name
+    return "other"
+
+
+def region_features(region, kind):
+    """
+    从区域字典提取离散特征。
+    region: ExplorationDetector 的区域（bbox 为 0-1000）；kind: "click" / "slide"
+    """
+    x1, y1, x2, y2 = [float(v) for v in region["bbox"]]
+    w, h = max(1.0, x2 - x1), max(1.0, y2 - y1)
+    # 0-1000 坐标下屏幕约为 1:2.2，换算为像素长宽比
+    aspect = math.log2(w / (h * 2.2))
+    area = w * h / 1e6
+    direction = (region.get("direction") or "").lower()
+    if kind == "click":
+        direction = "none"
+    elif "horiz" in direction or direction in ("left", "right"):
+        direction = "horizontal"
+    else:
+        direction = "vertical"
+    return {
+        "kind": kind,
+        "direction": direction,
+        "semantic": _semantic(f"{region.get('type', '')} {region.get('description', '')}"),
+        "aspect": str(max(-3, min(3, int(round(aspect))))),
+        "area": "xs" if area < 0.01 else "s" if area < 0.05 else "m" if area < 0.25 else "l" if area < 0.8 else "xl",
+        "ypos": "top" if (y1 + y2) / 2 < 200 else "bottom" if (y1 + y2) / 2 > 800 else "middle",
+        "fullscreen": str(area >= 0.95),
+    }
+
+
+def _logit(p):
+    p = min(max(p, 1e-4), 1 - 1e-4)
+    return math.log(p / (1 - p))
+
+
+class ActionPrioritizer:
+    """
+    基于统计表的动作优先级模型。
+
+    对每个离散特征（区域类型、方向、长宽比、面积、位置等）以及 app 维护 Beta 平滑后的成功率，
+    按朴素贝叶斯的方式把各特征相对全局先验的 log-odds 偏移相加，得到每个候选区域的成功概率。
+    训练数据来自 SwipeBench 与历史探索报告。
+    """
+
+    def __init__(self, strength=10.0, app_weight=0.5):
+        self.strength = strength
+        self.app_weight = app_weight
+        self.total = [0, 0]          # [成功, 总数]
+        self.tables = {f: {} for f in _FEATURES}
+        self.apps = {}
+
+    # ==========================
+    # 训练
+    # ==========================
+
+    def add(self, features, success, app=None):
+        s = 1 if success else 0
+        self.total[0] += s
+        self.total[1] += 1
+        for f in _FEATURES:
+            cell = self.tables[f].setdefault(features[f], [0, 0])
+            cell[0] += s
+            cell[1] += 1
+        if app:
+            cell = self.apps.setdefault(app, [0, 0])
+            cell[0] += s
+            cell[1] += 1
+
+    def fit_swipebench(self, items):
+        for item in items:
+            a = item["action_data"]
+            kind = "click" if a["action"] == "tap" else "slide"
+            region = {"bbox": a["bbox"], "direction": a.get("direction"), "description": a.get("instruction", "")}
+            app = item["img_filename"].rsplit("_", 1)[0]
+            self.add(region_features(region, kind), a.get("success", False), app)
+        return self
+
+    def fit_reports(self, logs_dir):
+        for path in Path(logs_dir).glob("report_tree_*.json"):
+            with open(path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+            app = report.get("app_package")
+            for group in ("l1_slides", "l1_clicks"):
+                for res in report.get("results", {}).get(group, []):
+                    for r in [res] + list(res.get("l2_exploration") or []):
+                        if not r.get("region_info"):
+                            continue
+                        kind = "click" if r["type"] == "tap" else "slide"
+                        self.add(region_features(r["region_info"], kind), r.get("has_changed", False), app)
+        return self
+
+    # ==========================
+    # 预测
+    # ==========================
+
+    def _rate(self, cell, prior):
+        s, n = cell if cell else (0, 0)
+        return (s + self.strength * prior) / (n + self.strength)
+
+    def predict(self, region, kind, app=None):
+        """估计执行该区域动作后屏幕发生变化的概率"""
+        if not self.total[1]:
+            return 0.5
+        prior = (self.total[0] + 1) / (self.total[1] + 2)
+        base = _logit(prior)
+        score = base
+        feats = region_features(region, kind)
+        for f in _FEATURES:
+            score += _logit(self._rate(self.tables[f].get(feats[f]), prior)) - base
+        if app and app in self.apps:
+            score += self.app_weight * (_logit(self._rate(self.apps[app], prior)) - base)
+        return 1 / (1 + math.exp(-score))
+
+    def rank(self, regions, kind, app=None, min_prob=0.0, keep=None, min_keep=1):
+        """
+        按预测成功率从高到低排序，去掉低于 min_prob 的区域（至少保留 min_keep 个），
+        再截断到 keep 个。每个区域会被写入 '_priority' 字段，便于在报告中追溯。
+        kind 为 None 时点击和滑动混排，按每个区域的 '_act_type' 预测。
+        """
+        scored = []
+        for r in regions:
+            r["_priority"] = round(self.predict(r, kind or r["_act_type"], app), 4)
+            scored.append(r)
+        scored.sort(key=lambda r: -r["_priority"])
+        kept = [r for r in scored if r["_priority"] >= min_prob]
+        if len(kept) < min_keep:
+            kept = scored[:min_keep]
+        if keep is not None:
+            kept = kept[:keep]
+        pruned = len(regions) - len(kept)
+        if pruned:
+            label = {"click": "点击", "slide": "滑动"}.get(kind, "")
+            print(f"  [Prioritizer] 剪枝 {pruned} 个低收益{label}区域")
+        return kept
+
+    # ==========================
+    # 持久化
+    # ==========================
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"strength": self.strength, "app_weight": self.app_weight, "total": self.total,
+                       "tables": self.tables, "apps": self.apps}, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        model = cls(data["strength"], data["app_weight"])
+        model.total = data["total"]
+        model.tables = data["tables"]
+        model.apps = data["apps"]
+        return model
+
+
+def _leave_one_app_out(items, threshold):
+    """按 app 留一验证：阈值剪枝能省掉多少失败动作、损失多少成功动作"""
+    apps = sorted({it["img_filename"].rsplit("_", 1)[0] for it in items})
+    pruned_fail = pruned_ok = total_fail = total_ok = 0
+    for app in apps:
+        train = [it for it in items if not it["img_filename"].startswith(app + "_")]
+        test = [it for it in items if it["img_filename"].startswith(app + "_")]
+        model = ActionPrioritizer().fit_swipebench(train)
+        for it in test:
+            a = it["action_data"]
+            kind = "click" if a["action"] == "tap" else "slide"
+            region = {"bbox": a["bbox"], "direction": a.get("direction"), "description": a.get("instruction", "")}
+            p = model.predict(region, kind)
+            ok = bool(a.get("success"))
+            total_ok += ok
+            total_fail += not ok
+            if p < threshold:
+                pruned_ok += ok
+                pruned_fail += not ok
+    return {
+        "threshold": threshold,
+        "failures_pruned": f"{pruned_fail}/{total_fail}",
+        "successes_lost": f"{pruned_ok}/{total_ok}",
+    }
+
+
+def main():
+    import argparse
+    from swipebench import load_swipebench
+
+    parser = argparse.ArgumentParser(description="Train the action prioritizer from SwipeBench and reports")
+    parser.add_argument("--logs", default=None, help="额外使用该目录下的探索报告训练")
+    parser.add_argument("--out", default="logs/prioritizer.json")
+    parser.add_argument("--eval-thresholds", nargs="*", type=float, default=[0.3, 0.4, 0.5])
+    args = parser.parse_args()
+
+    items = load_swipebench()
+    for t in args.eval_thresholds:
+        print(_leave_one_app_out(items, t))
+
+    model = ActionPrioritizer().fit_swipebench(items)
+    if args.logs:
+        model.fit_reports(args.logs)
+    Path(args.out).parent.mkdir(exist_ok=True)
+    model.save(args.out)
+    print(f"训练样本 {model.total[1]} 条（成功 {model.total[0]}），模型已保存: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# action_table.py
+import json
+import numpy as np
+
+NORM_SIZE = 1000.0
+
+ACTIONS = ["tap", "swipe", "drag"]
+DIRECTIONS = ["", "up", "down", "left", "right"]   # 0 表示无方向（tap / drag）
+SPEEDS = ["", "slow", "fast"]
+
+_ACTION_CODE = {name: i for i, name in enumerate(ACTIONS)}
+_DIRECTION_CODE = {name: i for i, name in enumerate(DIRECTIONS)}
+_SPEED_CODE = {name: i for i, name in enumerate(SPEEDS)}
+
+ACTION_DTYPE = np.dtype([
+    ("action", "u1"),
+    ("start", "i2", (2,)),       # tap 时为点击位置
+    ("end", "i2", (2,)),
+    ("duration", "f4"),          # 毫秒
+    ("bbox", "i2", (4,)),
+    ("has_bbox", "?"),
+    ("direction", "u1"),
+    ("angle", "f4"),             # drag 的弧度 [0, 2π)，其余为 0
+    ("distance", "i4"),
+    ("speed", "u1"),
+    ("success", "?"),
+    ("timestamp", "f8"),
+])
+
+
+def normalize_points(x, y, width, height):
+    """与 DataFormatter._normalize 一致：round 到整数并裁剪到 [0, 1000]"""
+    nx = np.round(np.asarray(x, dtype=np.float64) / width * NORM_SIZE)
+    ny = np.round(np.asarray(y, dtype=np.float64) / height * NORM_SIZE)
+    return np.stack([np.clip(nx, 0, NORM_SIZE), np.clip(ny, 0, NORM_SIZE)], axis=-1).astype(np.int16)
+
+
+class ActionTable:
+    """
+    列式动作表：所有数值字段存放在 numpy 结构化数组里，归一化和衍生参数
+    （距离 / 方向 / 角度 / 速度）一次向量化计算；文本意图单独存成列表。
+    与 DataFormatter 生成的 dict 以及 SwipeBench 的 action_data 可以互相转换。
+    """
+
+    def __init__(self, data=None, intents=None):
+        self.data = data if data is not None else np.zeros(0, dtype=ACTION_DTYPE)
+        self.intents = intents if intents is not None else [""] * len(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    # ==========================
+    # 构造
+    # ==========================
+
+    @classmethod
+    def from_pixels(cls, action, start_xy, end_xy, duration_ms, width, height,
+                    bbox=None, intents=None, success=None):
+        """
+        从像素坐标批量构造。width / height 可以是标量，也可以是每条动作各自的屏幕尺寸。
+        action: 动作名列表或字符串；bbox: (N, 4) 像素坐标，没有 bbox 的行可填 NaN
+        """
+        start_xy = np.asarray(start_xy, dtype=np.float64).reshape(-1, 2)
+        n = len(start_xy)
+        end_xy = np.asarray(end_xy, dtype=np.float64).reshape(-1, 2)
+        width = np.broadcast_to(np.asarray(width, dtype=np.float64), (n,))
+        height = np.broadcast_to(np.asarray(height, dtype=np.float64), (n,))
+
+        data = np.zeros(n, dtype=ACTION_DTYPE)
+        if isinstance(action, str):
+            data["action"] = _ACTION_CODE[action]
+        else:
+            data["action"] = [_ACTION_CODE[a] for a in action]
+        data["start"] = normalize_points(start_xy[:, 0], start_xy[:, 1], width, height)
+        data["end"] = normalize_points(end_xy[:, 0], end_xy[:, 1], width, height)
+        data["duration"] = np.broadcast_to(np.asarray(duration_ms, dtype=np.float32), (n,))
+        if bbox is not None:
+            bbox = np.asarray(bbox, dtype=np.float64).reshape(-1, 4)
+            has = ~np.isnan(bbox).any(axis=1)
+            b = np.nan_to_num(bbox)
+            data["bbox"][:, :2] = normalize_points(b[:, 0], b[:, 1], width, height)
+            data["bbox"][:, 2:] = normalize_points(b[:, 2], b[:, 3], width, height)
+            data["has_bbox"] = has
+            data["bbox"][~has] = 0
+        if success is not None:
+            data["success"] = success
+
+        table = cls(data, list(intents) if intents is not None else None)
+        table.derive()
+        return table
+
+    @classmethod
+    def from_dicts(cls, actions):
+        """从 DataFormatter 输出或 SwipeBench action_data 的 dict 列表构造"""
+        actions = list(actions)
+        n = len(actions)
+        data = np.zeros(n, dtype=ACTION_DTYPE)
+        intents = []
+        for i, a in enumerate(actions):
+            row = data[i]
+            name = a.get("action", "tap")
+            row["action"] = _ACTION_CODE[name]
+            bbox = a.get("bbox")
+            if bbox:
+                row["bbox"] = bbox
+                row["has_bbox"] = True
+            if name == "tap":
+                pos = a.get("position")
+                if pos is None and bbox:
+                    # SwipeBench 的 tap 只有 bbox，取中心点
+                    pos = [(bbox[0] + bbox[2]) // 2, (bbox[1] + bbox[3]) // 2]
+                row["start"] = row["end"] = pos or [0, 0]
+            else:
+                row["start"] = a["start"]
+                row["end"] = a["end"]
+                row["duration"] = a.get("duration", 300)
+            row["success"] = bool(a.get("success", False))
+            row["timestamp"] = a.get("timestamp") or 0.0
+            intents.append(a.get("intent", a.get("instruction", "")) or "")
+        table = cls(data, intents)
+        table.derive()
+        return table
+
+    # ==========================
+    # 向量化衍生参数
+    # ==========================
+
+    def derive(self):
+        """根据 start / end / duration 计算 distance、direction、angle、speed（与 DataFormatter 规则一致）"""
+        d = self.data
+        delta = (d["end"].astype(np.int32) - d["start"].astype(np.int32))
+        dx, dy = delta[:, 0], delta[:, 1]
+        is_tap = d["action"] == _ACTION_CODE["tap"]
+        is_drag = d["action"] == _ACTION_CODE["drag"]
+        is_swipe = ~(is_tap | is_drag)
+
+        distance = np.sqrt(dx.astype(np.float64) ** 2 + dy.astype(np.float64) ** 2).astype(np.int32)
+        d["distance"] = np.where(is_tap, 0, distance)
+
+        horizontal = np.abs(dx) > np.abs(dy)
+        direction = np.where(
+            horizontal,
+            np.where(dx > 0, _DIRECTION_CODE["right"], _DIRECTION_CODE["left"]),
+            np.where(dy > 0, _DIRECTION_CODE["down"], _DIRECTION_CODE["up"])
+        )
+        d["direction"] = np.where(is_swipe, direction, 0)
+
+        angle = np.mod(np.arctan2(dy, dx), 2 * np.pi)
+        d["angle"] = np.where(is_drag, np.round(angle, 4), 0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            velocity = distance / (d["duration"].astype(np.float64) / 1000.0)
+        speed = np.where(velocity > 1000, _SPEED_CODE["fast"], _SPEED_CODE["slow"])
+        d["speed"] = np.where(is_tap, 0, speed)
+        return self
+
+    # ==========================
+    # 导出
+    # ==========================
+
+    def to_dicts(self, schema="formatter"):
+        """
+        schema="formatter": 与 DataFormatter.format_tap / format_swipe 相同的字段
+        schema="swipebench": SwipeBench action_data 字段（instruction 代替 intent，不含 distance/speed）
+        """
+        d = self.data
+        cols = {name: d[name].tolist() for name in d.dtype.names}
+        out = []
+        for i in range(len(d)):
+            action = ACTIONS[cols["action"][i]]
+            bbox = cols["bbox"][i] if cols["has_bbox"][i] else None
+            intent = self.intents[i]
+            if schema == "swipebench":
+                item = {"action": action, "bbox": bbox, "instruction": intent, "success": cols["success"][i]}
+                if action != "tap":
+                    item.update({
+                        "start": cols["start"][i],
+                        "end": cols["end"][i],
+                        "duration": int(cols["duration"][i]),
+                        "direction": self._direction_value(action, cols, i)
+                    })
+            elif action == "tap":
+                item = {
+                    "action": "tap",
+                    "position": cols["start"][i],
+                    "bbox": bbox,
+                    "intent": intent,
+                    "timestamp": cols["timestamp"][i] or None,
+                    "success": cols["success"][i]
+                }
+            else:
+                item = {
+                    "action": action,
+                    "start": cols["start"][i],
+                    "end": cols["end"][i],
+                    "duration": int(cols["duration"][i]),
+                    "direction": self._direction_value(action, cols, i),
+                    "distance": cols["distance"][i],
+                    "speed": SPEEDS[cols["speed"][i]],
+                    "bbox": bbox,
+                    "intent": intent,
+                    "success": cols["success"][i]
+                }
+            out.append(item)
+        return out
+
+    @staticmethod
+    def _direction_value(action, cols, i):
+        if action == "drag":
+            return round(cols["angle"][i], 4)
+        return DIRECTIONS[cols["direction"][i]]
+
+    # ==========================
+    # 统计
+    # ==========================
+
+    def summary(self, distance_bins=(0, 100, 200, 400, 600, 800, 1000, 1500)):
+        """一次向量化遍历得到方向 / 速度 / 距离直方图和各类动作成功率"""
+        d = self.data
+        n = len(d)
+        non_tap = d["action"] != _ACTION_CODE["tap"]
+
+        def hist(codes, names, mask=None):
+            codes = codes if mask is None else codes[mask]
+            counts = np.bincount(codes, minlength=len(names))
+            return {names[i] or "none": int(c) for i, c in enumerate(counts)}
+
+        def success_rate(codes, names):
+            total = np.bincount(codes, minlength=len(names))
+            ok = np.bincount(codes, weights=d["success"].astype(np.float64), minlength=len(names))
+            return {names[i] or "none": round(float(ok[i] / total[i]), 4) for i in range(len(names)) if total[i]}
+
+        dist_counts, edges = np.histogram(d["distance"][non_tap], bins=np.asarray(distance_bins))
+        return {
+            "count": n,
+            "success_rate": round(float(d["success"].mean()), 4) if n else 0.0,
+            "action_hist": hist(d["action"], ACTIONS),
+            "direction_hist": hist(d["direction"], DIRECTIONS, non_tap),
+            "speed_hist": hist(d["speed"], SPEEDS, non_tap),
+            "distance_hist": {f"{int(edges[i])}-{int(edges[i + 1])}": int(c) for i, c in enumerate(dist_counts)},
+            "success_by_action": success_rate(d["action"], ACTIONS),
+            "success_by_direction": success_rate(d["direction"], DIRECTIONS),
+        }
+
+
+def main():
+    """对 SwipeBench 做一次向量化统计"""
+    from swipebench import load_swipebench
+
+    items = load_swipebench()
+    table = ActionTable.from_dicts(item["action_data"] for item in items)
+    print(json.dumps(table.summary(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
 import time
 import os
 import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from PIL import Image
 from detect import ExplorationDetector
-from device_controller import UIAutomatorController
+from device_controller import UIAutomatorController, changed_regions, frame_dhash, hamming
+from hierarchy import HierarchyRegionProposer
+from frame_store import FrameStore
+from action_prioritizer import ActionPrioritizer
+from region_cache import RegionCache
 from data_utils import DataFormatter, json_safe
+from scroll_estimator import estimate_scroll
+from swipebench import bbox_iou
+import tracing
 
 class InteractionTester:
     def __init__(self, controller: UIAutomatorController, app_package: str):
@@ -22,6 +32,31 @@ class InteractionTester:
             bbox_norm_1000[3] / 1000 * h
         ]
 
+    @tracing.traced("tester.estimate_scroll")
+    def _estimate_scroll(self, before, after, bbox_pixel, axis, expected):
+        """
+        在滑动区域内用相位相关估计内容位移。截图可能是降采样采集的，
+        先把窗口坐标换算到截图坐标，结果再换算回窗口像素。
+        """
+        try:
+            w, _ = self.controller.get_window_size()
+            scale = before.size[0] / w
+            scroll = estimate_scroll(
+                before, after,
+                bbox=[v * scale for v in bbox_pixel],
+                axis=axis,
+                expected=expected * scale
+            )
+        except Exception as e:
+            print(f"滚动位移估计失败: {e}")
+            return None
+        for k in ('dx', 'dy', 'offset'):
+            scroll[k] = round(scroll[k] / scale, 1)
+        print(f"滚动位移: {scroll['offset']}px (置信度 {scroll['confidence']})"
+              + (" -> 已到尽头" if scroll['end_of_list'] else ""))
+        return scroll
+
+    @tracing.traced("tester.click_test")
     def run_click_test(self, region, name_prefix, auto_back=True):
         """
         执行点击测试
@@ -29,7 +64,8 @@ class InteractionTester:
         """
         print(f"Testing Click: {name_prefix} | {region.get('description', '')}")
         
-        before_res = self.controller.take_screenshot(f"{name_prefix}_before")
+        # 上一个动作的 after 帧仍是当前屏幕时直接复用，避免重复截图
+        before_res = self.controller.current_frame(f"{name_prefix}_before")
         if not before_res: return None
         
         # 计算坐标
@@ -82,9 +118,12 @@ class InteractionTester:
             'action_data': action_data,
             'screenshot_before': before_res['filename'],
             'screenshot_after': after_res['filename'] if after_res else None,
+            'frame_before': before_res.get('frame_hash'),
+            'frame_after': after_res.get('frame_hash') if after_res else None,
             'region_info': region
         }
 
+    @tracing.traced("tester.slide_test")
     def run_slide_test(self, region, name_prefix, auto_back=True):
         """
         执行滑动测试
@@ -92,7 +131,8 @@ class InteractionTester:
         """
         print(f"Testing Slide: {name_prefix} | {region.get('description', '')}")
         
-        before_res = self.controller.take_screenshot(f"{name_prefix}_before")
+        # 上一个动作的 after 帧仍是当前屏幕时直接复用，避免重复截图
+        before_res = self.controller.current_frame(f"{name_prefix}_before")
         if not before_res: return None
         
         bbox_pixel = self._get_pixel_bbox(region['bbox'])
@@ -127,6 +167,7 @@ class InteractionTester:
         
         # --- 全屏变动检测 ---
         has_changed = False
+        scroll = None
         if after_res:
             has_changed = self.controller.calculate_image_diff(
                 before_res['filename'], 
@@ -134,8 +175,13 @@ class InteractionTester:
                 bbox=None,
                 threshold=5e-3  # 0.5% 的像素变动即认为发生变化
             )
+            # 区域内容实际滚动的距离，判断是否已经到了列表尽头
+            axis = 'horizontal' if 'horiz' in direction else 'vertical'
+            expected = abs(end_x - start_x) if axis == 'horizontal' else abs(end_y - start_y)
+            scroll = self._estimate_scroll(before_res['image'], after_res['image'], bbox_pixel, axis, expected)
             
         action_data['success'] = has_changed
+        action_data['scroll_offset'] = scroll['offset'] if scroll else None
         
         # 如果滑动导致了页面切换（例如全屏翻页），在 auto_back=True 时尝试返回
         # 注意：滑动的 Back 行为不一定能复原（比如 Feed 流下滑），但尝试 Back 是通用的回退策略
@@ -147,24 +193,203 @@ class InteractionTester:
         return {
             'type': 'swipe',
             'has_changed': has_changed,
+            'scroll': scroll,
+            'end_of_list': bool(scroll and scroll['end_of_list']),
             'action_data': action_data,
             'screenshot_before': before_res['filename'],
             'screenshot_after': after_res['filename'] if after_res else None,
+            'frame_before': before_res.get('frame_hash'),
+            'frame_after': after_res.get('frame_hash') if after_res else None,
             'region_info': region
         }
 
 
 class AppExplorer:
     def __init__(self, device_serial=None, model_path="", app_package="", 
-                 screenshot_dir="screenshots", logs_dir="logs"):
-        self.controller = UIAutomatorController(device_serial, screenshot_dir)
+                 screenshot_dir="screenshots", logs_dir="logs", region_source="vlm", frame_format=None,
+                 prioritizer=None, min_priority=0.0, trace=False, speculative=True, region_cache=False,
+                 partial_detect=True, partial_max_area=0.6):
+        """
+        :param region_source: "vlm" 只用模型检测；"hybrid" 先用 UI 层次结构提议区域，
+                              只有 WebView / 自绘页面才调用 VLM
+        :param frame_format: None 按时间戳保存每张截图；"png" / "webp" 启用按内容去重的帧存储
+        :param prioritizer: ActionPrioritizer 实例或其模型文件路径；设置后候选区域按预测成功率排序，
+                            低于 min_priority 的区域不再执行
+        :param trace: 记录客户端与推理服务端的 span，探索结束后导出 logs/trace_*.json（Chrome trace 格式）
+        :param speculative: L1 检测请求在途时先执行不依赖模型输出的首页全屏滑动，
+                            拿到检测结果后确认已回到首页再执行检测出的区域
+        :param region_cache: 按画面指纹缓存检测结果，相同页面不再请求模型。默认关闭；
+                             "run" 只在本次运行内缓存，True 持久化到 logs/region_cache.json 跨运行复用
+                             （App 更新后相似页面可能复用到旧的检测结果，版本变化时删掉该文件）
+        :param partial_detect: L1 操作只改变了页面的一部分时，沿用父页面未变化部分的检测结果，
+                               只把变化区域裁剪后交给 VLM；变化区域超过屏幕 partial_max_area 时仍整页检测
+        """
+        frame_store = FrameStore(Path(screenshot_dir) / "objects", fmt=frame_format) if frame_format else None
+        self.controller = UIAutomatorController(device_serial, screenshot_dir, frame_store=frame_store)
         self.detector = ExplorationDetector(model_path)
         self.app_package = app_package
         self.tester = InteractionTester(self.controller, app_package)
         self.logs_dir = Path(logs_dir)
         self.logs_dir.mkdir(exist_ok=True)
+        self.region_source = region_source
+        self.proposer = None
+        if region_source == "hybrid":
+            w, h = self.controller.get_window_size()
+            self.proposer = HierarchyRegionProposer(w, h)
+        if isinstance(prioritizer, (str, Path)):
+            prioritizer = ActionPrioritizer.load(prioritizer)
+        self.prioritizer = prioritizer
+        self.min_priority = min_priority
+        self.skipped_slides = 0
+        self.trace = trace or os.environ.get("SWIPER_TRACE") == "1"
+        self.speculative = speculative
+        self.region_cache = None
+        if region_cache:
+            self.region_cache = RegionCache(None if region_cache == "run" else self.logs_dir / "region_cache.json")
+        self.speculation_stats = {}
+        self.partial_detect = partial_detect
+        self.partial_max_area = partial_max_area
+        self.partial_stats = {'partial': 0, 'full': 0, 'carried_regions': 0, 'crop_area': 0.0}
+
+    @staticmethod
+    def _slide_axis(region):
+        return 'horizontal' if 'horiz' in (region.get('direction') or '').lower() else 'vertical'
+
+    def _is_exhausted(self, region, exhausted, iou_threshold=0.5):
+        """同一页面上，和已经滑到尽头的区域同轴且高度重叠的滑动不再执行"""
+        axis = self._slide_axis(region)
+        for done in exhausted:
+            if self._slide_axis(done) == axis and bbox_iou(region['bbox'], done['bbox']) >= iou_threshold:
+                self.skipped_slides += 1
+                print(f"  [Scroll] 区域已滑到尽头，跳过: {region.get('description', '')}")
+                return True
+        return False
+
+    def _prioritize(self, regions, kind, keep=None):
+        """按预测成功率排序并剪枝；未配置 prioritizer 时保持检测顺序"""
+        if self.prioritizer is None:
+            return regions[:keep] if keep is not None else regions
+        return self.prioritizer.rank(regions, kind, app=self.app_package,
+                                     min_prob=self.min_priority, keep=keep)
+
+    @tracing.traced("explorer.detect_regions")
+    def _detect_regions(self, image_path, hierarchy=None, parent=None):
+        """
+        检测当前页面的可交互区域，画面与缓存中的某一帧几乎相同时直接复用缓存结果。
+        hybrid 模式下未传入 hierarchy 时从设备读取，此时设备必须仍停留在 image_path 对应的页面上。
+        :param parent: (父页面截图路径, 父页面检测结果)；只有部分画面变化时做局部检测
+        """
+        key = None
+        if self.region_cache is not None:
+            with Image.open(image_path) as img:
+                key = self.region_cache.key(img)
+            cached = self.region_cache.get(self.app_package, key)
+            if cached is not None:
+                print(f"  [RegionCache] 页面与已检测过的帧相同，复用检测结果 "
+                      f"(点击 {len(cached.get('clickable_regions', []))}, 滑动 {len(cached.get('slidable_regions', []))})")
+                return cached
+
+        regions = self._detect_partial(image_path, parent) if parent is not None else None
+        if regions is None:
+            regions = self._detect_uncached(image_path, hierarchy)
+        if key is not None:
+            self.region_cache.put(self.app_package, key, regions)
+        return regions
+
+    @staticmethod
+    def _overlaps(a, b):
+        return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+    @staticmethod
+    def _union(a, b):
+        return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
 
-    def _process_l2_exploration(self, parent_res, l1_index, prefix_type, max_interactions):
+    @tracing.traced("explorer.detect_partial")
+    def _detect_partial(self, image_path, parent, status_bar=40):
+        """
+        父页面检测结果 + 变化区域的局部检测。返回 None 表示不适用（变化过大、无变化或 hybrid 模式），由调用方整页检测。
+        hybrid 模式下层次结构本身不需要模型调用，交给 _detect_uncached 处理。
+        """
+        if not self.partial_detect or self.proposer is not None:
+            return None
+        parent_path, parent_regions = parent
+        with Image.open(parent_path) as before, Image.open(image_path) as after:
+            # 状态栏（时钟、信号）总在变，不计入
+            changes = [c for c in changed_regions(before, after) if c[1] >= status_bar or c[3] > status_bar]
+        if not changes:
+            return None
+
+        crop = changes[0]
+        for c in changes[1:]:
+            crop = self._union(crop, c)
+        parent_list = [(kind, r) for kind in ('clickable_regions', 'slidable_regions')
+                       for r in parent_regions.get(kind, [])]
+
+        def is_container(r):
+            # 整页滚动之类的大区域：局部变化不影响它，直接沿用
+            x1, y1, x2, y2 = r['bbox']
+            return (x2 - x1) * (y2 - y1) / 1e6 > self.partial_max_area
+
+        # 与裁剪区域部分重叠的父区域整体并入裁剪区域，由模型重新检测，避免区域被截断
+        for _ in range(3):
+            grown = crop
+            for _, r in parent_list:
+                if not is_container(r) and self._overlaps(r['bbox'], grown):
+                    grown = self._union(grown, r['bbox'])
+            if grown == crop:
+                break
+            crop = grown
+        area = (crop[2] - crop[0]) * (crop[3] - crop[1]) / 1e6
+        if area > self.partial_max_area:
+            self.partial_stats['full'] += 1
+            return None
+
+        carried = {'clickable_regions': [], 'slidable_regions': []}
+        for kind, r in parent_list:
+            if is_container(r) or not self._overlaps(r['bbox'], crop):
+                carried[kind].append({k: v for k, v in r.items() if not k.startswith('_')})
+        n_carried = len(carried['clickable_regions']) + len(carried['slidable_regions'])
+        print(f"  [Partial] 变化区域 {crop} 占屏幕 {area:.0%}，沿用父页面 {n_carried} 个区域，仅检测变化部分")
+        detected = self.detector.analyze_image(image_path, crop=crop)
+        self.partial_stats['partial'] += 1
+        self.partial_stats['carried_regions'] += n_carried
+        self.partial_stats['crop_area'] += area
+        return {
+            'clickable_regions': carried['clickable_regions'] + detected.get('clickable_regions', []),
+            'slidable_regions': detected.get('slidable_regions', []) + carried['slidable_regions']
+        }
+
+    def _detect_uncached(self, image_path, hierarchy=None):
+        if self.proposer is None:
+            return self.detector.analyze_image(image_path)
+
+        try:
+            proposal = self.proposer.propose(hierarchy or self.controller.get_ui_hierarchy())
+        except Exception as e:
+            print(f"获取 UI 层次结构失败，回退到 VLM: {e}")
+            return self.detector.analyze_image(image_path)
+
+        if proposal['informative']:
+            print(f"  [Hierarchy] 原生页面，跳过 VLM "
+                  f"(点击 {len(proposal['clickable_regions'])}, 滑动 {len(proposal['slidable_regions'])})")
+            return proposal
+
+        webviews = proposal['webview_regions']
+        native = proposal['clickable_regions'] + proposal['slidable_regions']
+        if len(webviews) == 1 and native and proposal['webview_ratio'] < 0.9:
+            # 原生外壳 + 单个 WebView：只把 WebView 部分交给 VLM，和原生区域合并
+            print("  [Hierarchy] 混合页面，仅对 WebView 区域调用 VLM")
+            vlm = self.detector.analyze_image(image_path, crop=webviews[0]['bbox'])
+            return {
+                'clickable_regions': proposal['clickable_regions'] + vlm['clickable_regions'],
+                'slidable_regions': vlm['slidable_regions'] + proposal['slidable_regions']
+            }
+
+        print("  [Hierarchy] 层次结构信息不足 (WebView / 自绘界面)，调用 VLM")
+        return self.detector.analyze_image(image_path)
+
+    @tracing.traced("explorer.l2_exploration")
+    def _process_l2_exploration(self, parent_res, l1_index, prefix_type, max_interactions, parent=None):
         """
         处理二级页面探索的通用逻辑
         
@@ -172,6 +397,7 @@ class AppExplorer:
         :param l1_index: L1 操作的序号
         :param prefix_type: 'Click' 或 'Slide'，用于日志前缀
         :param max_interactions: L2 最大操作数
+        :param parent: (L1 截图路径, L1 检测结果)，用于只重新检测变化的部分
         """
         # 初始化 L2 结果
         parent_res['l2_exploration'] = None
@@ -187,7 +413,7 @@ class AppExplorer:
         if not l2_image_path: return
 
         print("  [Level 2] 分析二级页面...")
-        l2_regions = self.detector.analyze_image(l2_image_path)
+        l2_regions = self._detect_regions(l2_image_path, parent=parent)
         
         # 选取 L2 的动作 (混合点击和滑动)
         l2_actions = []
@@ -200,10 +426,14 @@ class AppExplorer:
             r['_act_type'] = 'click'
             l2_actions.append(r)
         
+        # 点击和滑动放在一起按预测成功率排序，设备时间留给最可能改变页面的操作
+        l2_actions = self._prioritize(l2_actions, None)
+
         # 截断数量
         l2_actions = l2_actions[:max_interactions]
         
         l2_results = []
+        exhausted = []
         if l2_actions:
             print(f"  [Level 2] 执行 {len(l2_actions)} 个子操作...")
             
@@ -212,7 +442,11 @@ class AppExplorer:
                 
                 # L2 的操作我们设置 auto_back=True，因为只做2层，不再深入
                 if sub_region['_act_type'] == 'slide':
+                    if self._is_exhausted(sub_region, exhausted):
+                        continue
                     sub_res = self.tester.run_slide_test(sub_region, sub_prefix, auto_back=True)
+                    if sub_res and sub_res['end_of_list']:
+                        exhausted.append(sub_region)
                 else:
                     sub_res = self.tester.run_click_test(sub_region, sub_prefix, auto_back=True)
                 
@@ -227,12 +461,84 @@ class AppExplorer:
         print("  <<< Level 2 结束，回退到首页")
         self.controller.back(self.app_package)
 
+    def _run_l1_slide(self, i, region, exhausted, results_tree, max_l2_interactions, parent=None):
+        print(f"\n--- 处理 L1 滑动 #{i} ---")
+        if self._is_exhausted(region, exhausted):
+            return
+        with tracing.span("explorer.l1_slide", index=i, description=region.get('description', '')):
+            # auto_back=False，允许我们观察滑动后的状态并进入L2
+            res = self.tester.run_slide_test(region, f"L1_Slide_{i}", auto_back=False)
+
+            if res:
+                if res['end_of_list']:
+                    exhausted.append(region)
+                # 尝试进入 L2
+                self._process_l2_exploration(res, i, "Slide", max_l2_interactions, parent)
+                results_tree['l1_slides'].append(res)
+
+    def _detect_l1_async(self, pool, screenshot):
+        """
+        在后台线程中检测 L1 截图，返回 Future。hybrid 模式下 UI 层次结构必须在设备离开首页之前读取，
+        所以先在当前线程取层次结构，只把模型调用放到后台；读取失败时不做推测执行。
+        """
+        hierarchy = None
+        if self.proposer is not None:
+            try:
+                hierarchy = self.controller.get_ui_hierarchy()
+            except Exception as e:
+                print(f"获取 UI 层次结构失败，不做推测执行: {e}")
+                return None
+        # 复制 contextvars，后台线程里的 span 仍挂在当前 trace 下
+        ctx = contextvars.copy_context()
+        return pool.submit(ctx.run, self._detect_regions, screenshot['filename'], hierarchy)
+
+    @tracing.traced("explorer.ensure_l1_state")
+    def _ensure_l1_state(self, l1_screenshot, l1_regions, max_hamming=6):
+        """
+        确认设备停留在 l1_screenshot 对应的页面上，否则重启 App 回到首页。
+        重启后首页仍与截图不一致（内容动态变化）时，检测结果已经对不上，重新检测当前首页。
+        返回 (检测结果, 与之对应的首页截图路径)
+        """
+        target = frame_dhash(l1_screenshot['image'])
+        frame = self.controller.current_frame("L1_verify")
+        if frame and hamming(frame_dhash(frame['image']), target) <= max_hamming:
+            self.speculation_stats['l1_restore'] = 'in_place'
+            return l1_regions, l1_screenshot['filename']
+
+        print("  [Speculative] 设备已离开首页，重启 App 回到 L1")
+        self.controller.reset_app_state(self.app_package)
+        time.sleep(1.5)
+        frame = self.controller.take_screenshot("L1_verify")
+        if frame and hamming(frame_dhash(frame['image']), target) <= max_hamming:
+            self.speculation_stats['l1_restore'] = 'reset'
+            return l1_regions, l1_screenshot['filename']
+
+        print("  [Speculative] 重启后首页与检测时不同，重新检测")
+        self.speculation_stats['l1_restore'] = 'redetect'
+        if not frame:
+            return l1_regions, l1_screenshot['filename']
+        return self._detect_regions(frame['filename']), frame['filename']
+
     def explore_app(self, max_l1_clicks=5, max_l2_interactions=3):
         """
         深度为2的树状探索
         """
+        if not self.trace:
+            return self._explore_app(max_l1_clicks, max_l2_interactions)
+        tracing.reset()
+        tracing.enable(f"explorer:{self.app_package}")
+        try:
+            with tracing.span("explorer.explore_app", app=self.app_package):
+                return self._explore_app(max_l1_clicks, max_l2_interactions)
+        finally:
+            tracing.export(self.logs_dir / f"trace_{self.app_package}_{int(time.time())}.json")
+            tracing.disable()
+
+    def _explore_app(self, max_l1_clicks, max_l2_interactions):
         print(f"开始Depth-2应用探索: {self.app_package}")
         print("=" * 60)
+        self.speculation_stats = {}
+        self.partial_stats = {'partial': 0, 'full': 0, 'carried_regions': 0, 'crop_area': 0.0}
         
         # 1. 初始化 App
         if not self.controller.reset_app_state(self.app_package): return
@@ -254,39 +560,62 @@ class AppExplorer:
             'description': '在首页向左滑动发现更多内容'
         }
         
-        print("\n[Level 1] 分析首页交互区域...")
-        l1_regions = self.detector.analyze_image(l1_screenshot['filename'])
-        l1_clicks = l1_regions['clickable_regions'][:max_l1_clicks]
-        l1_slides = [region_home_v, region_home_h] + l1_regions['slidable_regions']
-        
         results_tree = {
             'l1_slides': [],
             'l1_clicks': []
         }
+        exhausted = []
+        home_slides = self._prioritize([region_home_v, region_home_h], 'slide')
+
+        print("\n[Level 1] 分析首页交互区域...")
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="l1-detect") as pool:
+            pending = self._detect_l1_async(pool, l1_screenshot) if self.speculative else None
+            if pending is not None and home_slides:
+                # --- 3a. 检测请求在途时，先执行不依赖模型输出的首页全屏滑动 ---
+                print(f"\n[Level 1] 检测进行中，先执行首页全屏滑动 ({len(home_slides)}个)...")
+                t0 = time.time()
+                for i, region in enumerate(home_slides):
+                    self._run_l1_slide(i, region, exhausted, results_tree, max_l2_interactions)
+                t1 = time.time()
+                l1_regions = pending.result()
+                self.speculation_stats = {
+                    'speculative_actions': len(home_slides),
+                    'speculative_time_s': round(t1 - t0, 2),
+                    'detect_wait_s': round(time.time() - t1, 2),
+                }
+                # 检测结果对应最初的首页截图，使用前确认设备已回到该页面
+                l1_regions, l1_path = self._ensure_l1_state(l1_screenshot, l1_regions)
+                detected_slides = self._prioritize(l1_regions['slidable_regions'], 'slide')
+            else:
+                if pending is not None:
+                    l1_regions = pending.result()
+                else:
+                    l1_regions = self._detect_regions(l1_screenshot['filename'])
+                detected_slides = self._prioritize(
+                    [region_home_v, region_home_h] + l1_regions['slidable_regions'], 'slide')
+                home_slides = []
+                l1_path = l1_screenshot['filename']
+        l1_clicks = self._prioritize(l1_regions['clickable_regions'], 'click', keep=max_l1_clicks)
+        # L2 页面与首页对比，未变化部分沿用首页的检测结果
+        parent = (l1_path, l1_regions)
 
         # --- 3. L1 滑动测试 (现在支持触发 L2) ---
-        print(f"\n[Level 1] 执行滑动测试 ({len(l1_slides)}个)...")
-        for i, region in enumerate(l1_slides):
-            print(f"\n--- 处理 L1 滑动 #{i} ---")
-            # auto_back=False，允许我们观察滑动后的状态并进入L2
-            res = self.tester.run_slide_test(region, f"L1_Slide_{i}", auto_back=False)
-            
-            if res:
-                # 尝试进入 L2
-                self._process_l2_exploration(res, i, "Slide", max_l2_interactions)
-                results_tree['l1_slides'].append(res)
+        print(f"\n[Level 1] 执行滑动测试 ({len(detected_slides)}个)...")
+        for i, region in enumerate(detected_slides, start=len(home_slides)):
+            self._run_l1_slide(i, region, exhausted, results_tree, max_l2_interactions, parent)
 
         # --- 4. L1 点击测试 ---
         print(f"\n[Level 1] 执行点击测试 ({len(l1_clicks)}个)...")
         for i, region in enumerate(l1_clicks):
             print(f"\n--- 处理 L1 点击 #{i} ---")
-            # auto_back=False，允许进入L2
-            res = self.tester.run_click_test(region, f"L1_Click_{i}", auto_back=False)
-            
-            if res:
-                # 尝试进入 L2
-                self._process_l2_exploration(res, i, "Click", max_l2_interactions)
-                results_tree['l1_clicks'].append(res)
+            with tracing.span("explorer.l1_click", index=i, description=region.get('description', '')):
+                # auto_back=False，允许进入L2
+                res = self.tester.run_click_test(region, f"L1_Click_{i}", auto_back=False)
+
+                if res:
+                    # 尝试进入 L2
+                    self._process_l2_exploration(res, i, "Click", max_l2_interactions, parent)
+                    results_tree['l1_clicks'].append(res)
 
         # 5. 保存报告
         self._save_tree_report(results_tree)
@@ -306,12 +635,29 @@ class AppExplorer:
         print("探索完成！")
         print(f"L1 点击: {l1_clicks}, L1 滑动: {l1_slides}")
         print(f"L2 子操作总数: {count_l2}")
+        print(f"截图: 新截 {self.controller.capture_stats['captured']} 张, "
+              f"复用 {self.controller.capture_stats['reused']} 次")
+        print(f"因已滑到尽头跳过的滑动: {self.skipped_slides}")
+        if self.speculation_stats:
+            print(f"推测执行: {self.speculation_stats}")
+        if self.region_cache is not None:
+            self.region_cache.save()
+            print(f"区域缓存: 命中 {self.region_cache.stats['hits']}, 未命中 {self.region_cache.stats['misses']}")
+        if self.partial_stats['partial'] or self.partial_stats['full']:
+            print(f"局部检测: {self.partial_stats['partial']} 次, 变化过大整页检测 {self.partial_stats['full']} 次")
         
         report = {
             'app_package': self.app_package,
             'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
             'structure': 'depth_2_tree',
             'device': self.controller.get_device_info(),
+            'capture_stats': dict(self.controller.capture_stats),
+            'skipped_exhausted_slides': self.skipped_slides,
+            'speculation': self.speculation_stats,
+            'region_cache': dict(self.region_cache.stats) if self.region_cache is not None else None,
+            'partial_detect': dict(self.partial_stats,
+                                   mean_crop_area=round(self.partial_stats['crop_area'] / self.partial_stats['partial'], 3)
+                                   if self.partial_stats['partial'] else None),
             'results': results
         }
 
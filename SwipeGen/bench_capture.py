@@ -0,0 +1,73 @@
+# bench_capture.py
+"""
+截图延迟基准：uiautomator2 截图 vs adb screencap 原始帧。
+
+    python bench_capture.py --serial <serial> -n 20
+    python bench_capture.py --record frame.raw   # 录制一帧原始数据，供 screencap.py 离线解析
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import uiautomator2 as u2
+
+from screencap import RawScreencapBackend, parse_screencap_raw, frame_to_image
+
+
+def _time(fn, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.mean(samples), 1),
+        "p50_ms": round(samples[len(samples) // 2], 1),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screenshot capture latency benchmark")
+    parser.add_argument("--serial", default=None)
+    parser.add_argument("-n", type=int, default=20)
+    parser.add_argument("--record", default=None, help="录制一帧原始 screencap 数据到该路径后退出")
+    args = parser.parse_args()
+
+    d = u2.connect(args.serial) if args.serial else u2.connect()
+    raw = RawScreencapBackend(d.serial)
+
+    if args.record:
+        Path(args.record).write_bytes(raw.capture_bytes())
+        print(f"已录制原始帧: {args.record}")
+        return
+
+    out_dir = Path(tempfile.mkdtemp(prefix="bench_capture_"))
+    out_png = out_dir / "frame.png"
+
+    cases = {
+        # 当前路径：设备端编码 -> 传输 -> 解码 -> 重新编码 PNG 保存
+        "u2 screenshot + save png": lambda: d.screenshot().save(out_png),
+        "u2 screenshot (no save)": lambda: d.screenshot(),
+        "raw screencap + save png": lambda: raw.capture().save(out_png),
+        "raw screencap (numpy only)": lambda: raw.capture_array(),
+        "raw screencap downsample=2": lambda: raw.capture_array(downsample=2),
+    }
+
+    buf = raw.capture_bytes()
+    print(f"原始帧大小: {len(buf) / 1e6:.1f} MB, 解析 {parse_screencap_raw(buf).shape}")
+    cases["parse only (recorded bytes)"] = lambda: parse_screencap_raw(buf)
+    cases["parse + to PIL (recorded bytes)"] = lambda: frame_to_image(parse_screencap_raw(buf))
+
+    print(f"\n{'case':<34} {'mean':>8} {'p50':>8} {'p95':>8}")
+    for name, fn in cases.items():
+        fn()  # 预热
+        r = _time(fn, args.n)
+        print(f"{name:<34} {r['mean_ms']:>7}ms {r['p50_ms']:>7}ms {r['p95_ms']:>7}ms")
+
+
+if __name__ == "__main__":
+    main()
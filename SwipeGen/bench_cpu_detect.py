@@ -0,0 +1,130 @@
+# bench_cpu_detect.py
+"""
+CPU 检测推理基准：对比改动前的加载方式（baseline：fp32、torch 默认线程数、不设 low_cpu_mem_usage）
+与 fp32 / bf16 / int8 / int4 模式的加载时间、峰值内存 (RSS) 和每张截图耗时。加速比以 baseline 为准。
+
+每种模式在独立子进程中运行，保证峰值 RSS 互不干扰:
+    python bench_cpu_detect.py /path/to/Qwen3-VL-8B-Instruct --modes baseline fp32 int8 --limit 10
+"""
+import argparse
+import importlib.util
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SWIPEBENCH_DIR = Path(__file__).resolve().parent.parent / "SwipeBench"
+
+# mode -> ExplorationDetector 的 CPU 参数
+MODES = {
+    "baseline": {"cpu_optimize": False},
+    "fp32": {"cpu_quant": None, "cpu_dtype": "fp32"},
+    "bf16": {"cpu_quant": None, "cpu_dtype": "bf16"},
+    "int8": {"cpu_quant": "int8", "cpu_dtype": "fp32"},
+    "int4": {"cpu_quant": "int4", "cpu_dtype": "bf16"},
+}
+
+
+def _load_detect_local():
+    # 文件名里带点，不能直接 import
+    path = Path(__file__).resolve().parent / "detect.local.py"
+    spec = importlib.util.spec_from_file_location("detect_local", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _peak_rss_mb():
+    # Linux 下 ru_maxrss 单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_single_mode(model_path, mode, images, threads):
+    """在当前进程中跑一种模式，返回统计结果"""
+    detect_local = _load_detect_local()
+
+    t0 = time.perf_counter()
+    kwargs = dict(MODES[mode])
+    if kwargs.get("cpu_optimize", True):
+        kwargs["num_threads"] = threads
+    elif threads:
+        # baseline 本身不设置线程数；显式传 --threads 时各模式统一按该值对比
+        import torch
+        torch.set_num_threads(threads)
+    detector = detect_local.ExplorationDetector(model_path, **kwargs)
+    load_time = time.perf_counter() - t0
+    rss_after_load = _peak_rss_mb()
+
+    latencies, n_regions = [], 0
+    for image_path in images:
+        t0 = time.perf_counter()
+        results = detector.analyze_image(str(image_path))
+        latencies.append(time.perf_counter() - t0)
+        n_regions += len(results["clickable_regions"]) + len(results["slidable_regions"])
+
+    return {
+        "mode": mode,
+        "cpu_config": detector.cpu_config,
+        "load_time_s": round(load_time, 2),
+        "rss_after_load_mb": round(rss_after_load, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "images": len(latencies),
+        "sec_per_screenshot": round(sum(latencies) / max(1, len(latencies)), 2),
+        "regions_found": n_regions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU detection benchmark on SwipeBench")
+    parser.add_argument("model_path")
+    parser.add_argument("--modes", nargs="+", default=["baseline", "int8"], choices=list(MODES))
+    parser.add_argument("--limit", type=int, default=10, help="使用的 SwipeBench 截图数量")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", default="logs/bench_cpu_detect.json")
+    parser.add_argument("--run-mode", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    images = sorted(SWIPEBENCH_DIR.glob("*.png"))[:args.limit]
+
+    if args.run_mode:
+        # 子进程：把结果作为最后一行 JSON 打印给父进程
+        result = run_single_mode(args.model_path, args.run_mode, images, args.threads)
+        print("BENCH_RESULT " + json.dumps(result))
+        return
+
+    results = []
+    for mode in args.modes:
+        print(f"=== 运行模式 {mode} ===")
+        cmd = [sys.executable, __file__, args.model_path, "--run-mode", mode, "--limit", str(args.limit)]
+        if args.threads:
+            cmd += ["--threads", str(args.threads)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("BENCH_RESULT ")]
+        if proc.returncode != 0 or not lines:
+            print(f"模式 {mode} 运行失败:\n{proc.stderr[-2000:]}")
+            continue
+        results.append(json.loads(lines[-1][len("BENCH_RESULT "):]))
+
+    if not results:
+        return
+
+    base = next((r for r in results if r["mode"] == "baseline"), results[0])
+    print()
+    for r in results:
+        print(f"{r['mode']:<8} 配置: {r['cpu_config']}")
+    print(f"\n{'mode':<8} {'load(s)':>8} {'peakRSS(MB)':>12} {'s/img':>7} {'speedup':>8} {'regions':>8}")
+    for r in results:
+        speedup = base["sec_per_screenshot"] / r["sec_per_screenshot"] if r["sec_per_screenshot"] else 0
+        print(f"{r['mode']:<8} {r['load_time_s']:>8} {r['peak_rss_mb']:>12} "
+              f"{r['sec_per_screenshot']:>7} {speedup:>7.2f}x {r['regions_found']:>8}")
+
+    Path(args.output).parent.mkdir(exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
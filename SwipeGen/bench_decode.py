@@ -0,0 +1,103 @@
+# bench_decode.py
+"""
+解码路径基准：对比默认 generate（动态 KV cache、不编译）与 FastDecode（静态 cache + torch.compile +
+prompt 档位 padding）的单 token 解码延迟。默认用一个小的纯文本模型，在 CPU 上几分钟内跑完:
+
+    python bench_decode.py --model HuggingFaceTB/SmolLM2-135M-Instruct --tokens 128 --threads 4
+
+单 token 解码延迟 = (生成 N 个 token 的耗时 - 只生成 1 个 token 的耗时) / (N - 1)，扣掉了 prefill。
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from fast_decode import FastDecode
+
+# 长度不同的几个 prompt，落在同一个 padding 档位内时 FastDecode 不需要重新编译
+PROMPTS = [
+    "List the clickable regions of a mobile settings screen as JSON.",
+    "Describe the slidable regions of a news feed screen with a top tab bar and a bottom navigation bar, as JSON.",
+    "Output a JSON list of UI elements for a login page.",
+]
+
+
+def _timed_generate(model, inputs, n_tokens):
+    t0 = time.perf_counter()
+    with torch.no_grad():
+        out = model.generate(**inputs, max_new_tokens=n_tokens, min_new_tokens=n_tokens, do_sample=False)
+    return time.perf_counter() - t0, out
+
+
+def measure(model, tokenizer, n_tokens, repeats):
+    """返回 (prefill_s, ms_per_token)，取 repeats 次的中位数"""
+    prefill, total = [], []
+    for _ in range(repeats):
+        for prompt in PROMPTS:
+            inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+            prefill.append(_timed_generate(model, inputs, 1)[0])
+            total.append(_timed_generate(model, inputs, n_tokens)[0])
+    p, t = statistics.median(prefill), statistics.median(total)
+    return p, 1000 * (t - p) / (n_tokens - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-token decode latency: default vs FastDecode")
+    parser.add_argument("--model", default="HuggingFaceTB/SmolLM2-135M-Instruct")
+    parser.add_argument("--tokens", type=int, default=128)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--no-compile", action="store_true", help="只测静态 cache + padding，不编译")
+    parser.add_argument("--output", default="logs/bench_decode.json")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model, torch_dtype=torch.float32)
+    model.eval()
+
+    print(f"=== 默认 generate ({args.model}, {args.tokens} tokens) ===")
+    base_prefill, base_tok = measure(model, tokenizer, args.tokens, args.repeats)
+    print(f"prefill {base_prefill * 1000:.1f} ms, 解码 {base_tok:.2f} ms/token")
+
+    decoder = FastDecode(model, tokenizer, compile=not args.no_compile).install()
+    print("=== FastDecode：编译预热 ===")
+    t0 = time.perf_counter()
+    for prompt in PROMPTS:
+        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+        _timed_generate(model, inputs, args.tokens)
+        _timed_generate(model, inputs, 1)
+    warmup_s = time.perf_counter() - t0
+    print(f"预热 {warmup_s:.1f}s")
+
+    fast_prefill, fast_tok = measure(model, tokenizer, args.tokens, args.repeats)
+    print(f"prefill {fast_prefill * 1000:.1f} ms, 解码 {fast_tok:.2f} ms/token")
+
+    result = {
+        "model": args.model,
+        "tokens": args.tokens,
+        "threads": torch.get_num_threads(),
+        "compile": not args.no_compile,
+        "baseline": {"prefill_ms": round(base_prefill * 1000, 2), "ms_per_token": round(base_tok, 3)},
+        "fast": {"prefill_ms": round(fast_prefill * 1000, 2), "ms_per_token": round(fast_tok, 3),
+                 "warmup_s": round(warmup_s, 2)},
+        # 累计统计含预热编译，ms_per_token 与上面的测量值不是一回事，单独放
+        "decoder": decoder.snapshot(),
+        "speedup": round(base_tok / fast_tok, 2) if fast_tok > 0 else None,
+    }
+    print(f"\n单 token 解码: {base_tok:.2f} -> {fast_tok:.2f} ms ({result['speedup']}x)，"
+          f"编译档位 {result['decoder']['compiled_shapes']}")
+
+    Path(args.output).parent.mkdir(exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
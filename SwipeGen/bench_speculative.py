@@ -0,0 +1,98 @@
+# bench_speculative.py
+"""
+推测解码基准：同一组区域检测风格的 prompt，分别用普通贪心解码和推测解码生成，
+检查输出逐 token 一致，并报告接受率和端到端加速比。默认用小的纯文本模型，CPU 上可跑:
+
+    python bench_speculative.py --model HuggingFaceTB/SmolLM2-360M-Instruct --mode prompt_lookup
+    python bench_speculative.py --model HuggingFaceTB/SmolLM2-360M-Instruct --mode draft \\
+        --draft HuggingFaceTB/SmolLM2-135M-Instruct
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from speculative import Speculator, speculation
+
+# 输出是结构重复的 JSON，与真实的区域检测响应相近
+PROMPTS = [
+    "Output a JSON list of 12 clickable regions of a mobile settings screen. "
+    "Each item has keys \"bbox\" ([x1, y1, x2, y2], 0-1000), \"type\" and \"label\".",
+    "Output a JSON object with keys \"slidable_regions\" and \"clickable_regions\" for a news feed screen "
+    "with a top tab bar and a bottom navigation bar. Each region has \"bbox\" and \"description\".",
+    "Output a JSON list of 10 UI elements of a login page, each with \"bbox\", \"type\" and \"text\".",
+]
+
+
+def _generate(model, tokenizer, prompt, max_new_tokens):
+    messages = [{"role": "user", "content": prompt}]
+    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    inputs = tokenizer(text, return_tensors="pt").to(model.device)
+    t0 = time.perf_counter()
+    with torch.no_grad():
+        out = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False)
+    return time.perf_counter() - t0, out[0, inputs.input_ids.shape[1]:].tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative decoding: output equality and speedup")
+    parser.add_argument("--model", default="HuggingFaceTB/SmolLM2-360M-Instruct")
+    parser.add_argument("--mode", choices=["prompt_lookup", "draft"], default="prompt_lookup")
+    parser.add_argument("--draft", default="HuggingFaceTB/SmolLM2-135M-Instruct")
+    parser.add_argument("--tokens", type=int, default=384)
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", default="logs/bench_speculative.json")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model, torch_dtype=torch.float32).eval()
+    draft = None
+    if args.mode == "draft":
+        draft = AutoModelForCausalLM.from_pretrained(args.draft, torch_dtype=torch.float32).eval()
+    spec = Speculator(model, mode=args.mode, draft=draft).install()
+
+    base_t, spec_t, mismatches = [], [], 0
+    for prompt in PROMPTS:
+        for _ in range(args.repeats):
+            with speculation(False):
+                t, base_ids = _generate(model, tokenizer, prompt, args.tokens)
+            base_t.append(t)
+            t, spec_ids = _generate(model, tokenizer, prompt, args.tokens)
+            spec_t.append(t)
+            if base_ids != spec_ids:
+                mismatches += 1
+                print(f"输出不一致: {prompt[:40]}...")
+        print(f"{prompt[:50]}... 基线 {statistics.median(base_t[-args.repeats:]):.2f}s, "
+              f"推测 {statistics.median(spec_t[-args.repeats:]):.2f}s")
+
+    stats = spec.snapshot()
+    result = {
+        "model": args.model,
+        "mode": args.mode,
+        "draft": args.draft if args.mode == "draft" else None,
+        "threads": torch.get_num_threads(),
+        "baseline_s": round(sum(base_t), 3),
+        "speculative_s": round(sum(spec_t), 3),
+        "speedup": round(sum(base_t) / sum(spec_t), 2) if sum(spec_t) > 0 else None,
+        "mismatches": mismatches,
+        **{k: stats[k] for k in ("acceptance_rate", "tokens_per_target_step", "generated_tokens", "target_steps",
+                                "proposed_tokens")},
+    }
+    print(f"\n加速 {result['speedup']}x，接受率 {result['acceptance_rate']}，"
+          f"每次目标 forward {result['tokens_per_target_step']} token，不一致 {mismatches} 条")
+
+    Path(args.output).parent.mkdir(exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
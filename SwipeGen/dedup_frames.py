@@ -0,0 +1,344 @@
+# dedup_frames.py
+"""
+离线近重复帧去重，用于整理训练数据。
+
+1. 特征：每帧计算 64 位 dHash、64 位 pHash（32x32 DCT 低频）和 16x16 灰度低分辨率 embedding，
+   在进程池中并行；结果缓存在 features.npz，重新运行时只处理新增或改动过的文件
+2. 候选：pHash 按 multi-index hashing 切成 max_hamming+1 段，由抽屉原理，
+   汉明距离不超过 max_hamming 的两帧至少有一段完全相同，按段分桶即可找全候选对
+3. 校验：候选对再要求 pHash / dHash 距离与 embedding 余弦相似度都满足阈值
+4. 聚类：对通过校验的帧对求连通分量，每个簇保留路径排序最靠前的一帧
+
+全部步骤基于 numpy 数组批量计算，内存与帧数线性相关（每帧约 0.5 KB），可处理百万级帧。
+
+    python dedup_frames.py ../SwipeBench screenshots/ --out-dir logs/dedup --workers 8
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp"}
+EMBED_SIZE = 16
+
+# 32x32 DCT-II 矩阵，pHash 用
+_N = 32
+_DCT = np.cos(np.pi / _N * (np.arange(_N)[:, None]) * (np.arange(_N)[None, :] + 0.5))
+
+
+# ==========================
+# 特征提取
+# ==========================
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+
+def frame_features(path):
+    """返回 (dhash, phash, embedding)；图片无法读取时返回 None"""
+    try:
+        with Image.open(path) as img:
+            # JPEG 可在解码时直接降采样；PNG 解码后先整数倍缩小，减少后续 resize 的开销
+            img.draft("L", (64, 64))
+            img = img.convert("L")
+            factor = min(img.size) // 64
+            if factor > 1:
+                img = img.reduce(factor)
+    except Exception:
+        return None
+
+    small = np.asarray(img.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    dhash = _bits_to_int(small[:, 1:] > small[:, :-1])
+
+    pixels = np.asarray(img.resize((_N, _N), Image.BILINEAR), dtype=np.float32)
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8]
+    phash = _bits_to_int(low > np.median(low))
+
+    emb = np.asarray(img.resize((EMBED_SIZE, EMBED_SIZE), Image.BOX), dtype=np.float32).flatten()
+    emb -= emb.mean()
+    norm = np.linalg.norm(emb)
+    # 纯色画面没有结构，embedding 记为零向量，只能靠哈希相等判重
+    emb = emb / norm if norm > 1e-6 else np.zeros_like(emb)
+    return dhash, phash, emb.astype(np.float16)
+
+
+def _features_chunk(paths):
+    return [frame_features(p) for p in paths]
+
+
+def list_frames(inputs):
+    paths = []
+    for inp in inputs:
+        p = Path(inp)
+        if p.is_file():
+            paths.append(str(p))
+        else:
+            paths.extend(str(f) for f in p.rglob("*") if f.suffix.lower() in IMAGE_SUFFIXES)
+    return sorted(set(paths))
+
+
+class FeatureTable:
+    """所有帧的特征，按路径排序存放在连续数组中"""
+
+    def __init__(self, paths, sizes, mtimes, dhash, phash, emb):
+        self.paths = list(paths)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.mtimes = np.asarray(mtimes, dtype=np.float64)
+        self.dhash = np.asarray(dhash, dtype=np.uint64)
+        self.phash = np.asarray(phash, dtype=np.uint64)
+        self.emb = np.asarray(emb, dtype=np.float16).reshape(len(self.paths), EMBED_SIZE * EMBED_SIZE)
+
+    def save(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, paths=np.array(self.paths), sizes=self.sizes, mtimes=self.mtimes,
+                 dhash=self.dhash, phash=self.phash, emb=self.emb)
+
+    @classmethod
+    def load(cls, path):
+        d = np.load(path)
+        return cls(d["paths"].tolist(), d["sizes"], d["mtimes"], d["dhash"], d["phash"], d["emb"])
+
+    @classmethod
+    def build(cls, paths, workers=None, cache=None, chunk_size=256):
+        """计算特征；cache 中大小与修改时间都没变的文件直接复用"""
+        stats = [os.stat(p) for p in paths]
+        sizes = [s.st_size for s in stats]
+        mtimes = [s.st_mtime for s in stats]
+        n = len(paths)
+        dhash = np.zeros(n, dtype=np.uint64)
+        phash = np.zeros(n, dtype=np.uint64)
+        emb = np.zeros((n, EMBED_SIZE * EMBED_SIZE), dtype=np.float16)
+        valid = np.ones(n, dtype=bool)
+
+        todo = list(range(n))
+        if cache is not None:
+            old = {p: i for i, p in enumerate(cache.paths)}
+            todo = []
+            for i, p in enumerate(paths):
+                j = old.get(p)
+                if j is not None and cache.sizes[j] == sizes[i] and cache.mtimes[j] == mtimes[i]:
+                    dhash[i], phash[i], emb[i] = cache.dhash[j], cache.phash[j], cache.emb[j]
+                else:
+                    todo.append(i)
+        print(f"特征: {n} 帧, 复用缓存 {n - len(todo)}, 需计算 {len(todo)}")
+
+        chunks = [todo[k:k + chunk_size] for k in range(0, len(todo), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for done, (idx, feats) in enumerate(
+                    zip(chunks, pool.map(_features_chunk, [[paths[i] for i in c] for c in chunks])), 1):
+                for i, f in zip(idx, feats):
+                    if f is None:
+                        valid[i] = False
+                    else:
+                        dhash[i], phash[i], emb[i] = f
+                if done % 100 == 0:
+                    print(f"  {done * chunk_size}/{len(todo)}")
+
+        if not valid.all():
+            print(f"跳过 {int((~valid).sum())} 个无法读取的文件")
+        keep = np.flatnonzero(valid)
+        return cls([paths[i] for i in keep], np.take(sizes, keep), np.take(mtimes, keep),
+                   dhash[keep], phash[keep], emb[keep])
+
+
+# ==========================
+# 近重复检索
+# ==========================
+
+if hasattr(np, "bitwise_count"):
+    def popcount(x):
+        return np.bitwise_count(x).astype(np.int64)
+else:
+    _POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+    def popcount(x):
+        return _POP8[np.ascontiguousarray(x).view(np.uint8)].reshape(len(x), 8).sum(1)
+
+
+def _segments(max_hamming, bits=64):
+    """把 64 位切成 max_hamming+1 段，返回 [(shift, mask)]"""
+    m = max_hamming + 1
+    widths = [bits // m + (1 if k < bits % m else 0) for k in range(m)]
+    segs, shift = [], 0
+    for w in widths:
+        segs.append((shift, (1 << w) - 1))
+        shift += w
+    return segs
+
+
+def candidate_pairs(hashes, max_hamming, block=1 << 16):
+    """
+    multi-index hashing：逐段排序分桶，同一桶内的帧两两构成候选对，
+    再用完整 pHash 的汉明距离过滤；按 block 个帧一批展开，控制峰值内存。
+    返回去重后的 (i, j) 数组，i < j。
+    """
+    n = len(hashes)
+    found = []
+    for shift, mask in _segments(max_hamming):
+        keys = (hashes >> np.uint64(shift)) & np.uint64(mask)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        # 每个帧所在桶的范围 [lo, hi)
+        lo = np.searchsorted(sorted_keys, keys, "left")
+        hi = np.searchsorted(sorted_keys, keys, "right")
+        for start in range(0, n, block):
+            idx = np.arange(start, min(n, start + block))
+            counts = hi[idx] - lo[idx]
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            src = np.repeat(idx, counts)
+            offs = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            dst = order[np.repeat(lo[idx], counts) + offs]
+            keep = src < dst
+            src, dst = src[keep], dst[keep]
+            keep = popcount(hashes[src] ^ hashes[dst]) <= max_hamming
+            found.append(np.stack([src[keep], dst[keep]], 1))
+    if not found:
+        return np.zeros((0, 2), dtype=np.int64)
+    pairs = np.concatenate(found)
+    return np.unique(pairs, axis=0) if len(pairs) else pairs
+
+
+def connected_components(n, pairs):
+    """标签传播 + 指针跳跃求连通分量；每个分量的标签是其中最小的下标"""
+    labels = np.arange(n)
+    if len(pairs) == 0:
+        return labels
+    a, b = pairs[:, 0], pairs[:, 1]
+    while True:
+        m = np.minimum(labels[a], labels[b])
+        new = labels.copy()
+        np.minimum.at(new, a, m)
+        np.minimum.at(new, b, m)
+        # 指针跳跃：直接指向根，收敛只需对数轮
+        while True:
+            jumped = new[new]
+            if np.array_equal(jumped, new):
+                break
+            new = jumped
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def cluster(table, max_hamming=4, max_dhash=10, min_sim=0.95):
+    """
+    返回每帧的簇标签（簇内路径最靠前那一帧的下标）以及统计信息。
+    pHash 与 dHash 都完全相同的帧先合并为一行，避免大量完全相同的帧在同一个桶里两两展开。
+    """
+    t0 = time.perf_counter()
+    n = len(table.paths)
+    keys = np.stack([table.phash, table.dhash], 1)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    # 按首次出现的位置重排唯一行，这样行号越小的行对应的路径越靠前
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    reps = first[order]
+    row_of_frame = rank[inverse]
+
+    pairs = candidate_pairs(table.phash[reps], max_hamming)
+    n_candidates = len(pairs)
+    if len(pairs):
+        a, b = reps[pairs[:, 0]], reps[pairs[:, 1]]
+        ok = popcount(table.dhash[a] ^ table.dhash[b]) <= max_dhash
+        sim = (table.emb[a].astype(np.float32) * table.emb[b].astype(np.float32)).sum(1)
+        ok &= sim >= min_sim
+        pairs = pairs[ok]
+
+    row_labels = connected_components(len(reps), pairs)
+    labels = reps[row_labels[row_of_frame]]
+    return labels, {
+        "frames": n,
+        "exact_hash_groups": len(reps),
+        "candidate_pairs": int(n_candidates),
+        "verified_pairs": int(len(pairs)),
+        "cluster_time_s": round(time.perf_counter() - t0, 3),
+    }
+
+
+# ==========================
+# 输出
+# ==========================
+
+def _group_name(path):
+    # com.foo.bar_003.png -> com.foo.bar；其他文件按所在目录统计
+    stem = Path(path).stem
+    return stem.rsplit("_", 1)[0] if "_" in stem and stem.rsplit("_", 1)[1].isdigit() else str(Path(path).parent)
+
+
+def write_outputs(table, labels, info, out_dir, top=20):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    n = len(labels)
+    kept = np.flatnonzero(labels == np.arange(n))
+    removed = np.flatnonzero(labels != np.arange(n))
+
+    members = {}
+    for i in removed:
+        members.setdefault(int(labels[i]), []).append(table.paths[i])
+
+    with open(out_dir / "manifest.jsonl", "w", encoding="utf-8") as f:
+        for i in kept:
+            dups = members.get(int(i), [])
+            f.write(json.dumps({"path": table.paths[i], "cluster_size": 1 + len(dups), "duplicates": dups},
+                               ensure_ascii=False) + "\n")
+    with open(out_dir / "removed.txt", "w", encoding="utf-8") as f:
+        for i in removed:
+            f.write(table.paths[i] + "\n")
+
+    by_group = Counter(_group_name(table.paths[i]) for i in removed)
+    total_by_group = Counter(_group_name(p) for p in table.paths)
+    largest = sorted(members.items(), key=lambda kv: -len(kv[1]))[:top]
+    report = dict(info, kept=len(kept), removed=len(removed),
+                  removed_ratio=round(len(removed) / n, 4) if n else 0.0,
+                  clusters_with_duplicates=len(members),
+                  removed_by_group={g: {"removed": c, "total": total_by_group[g]} for g, c in by_group.most_common()},
+                  largest_clusters=[{"keep": table.paths[k], "size": 1 + len(v), "examples": v[:5]}
+                                    for k, v in largest])
+    with open(out_dir / "report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate frame deduplication")
+    parser.add_argument("inputs", nargs="+", help="图片目录或文件")
+    parser.add_argument("--out-dir", default="logs/dedup")
+    parser.add_argument("--cache", default=None, help="特征缓存 npz，默认 <out-dir>/features.npz")
+    parser.add_argument("--max-hamming", type=int, default=4, help="pHash 汉明距离上限 (64 位)")
+    parser.add_argument("--max-dhash", type=int, default=10, help="dHash 汉明距离上限 (64 位)")
+    parser.add_argument("--min-sim", type=float, default=0.95, help="低分辨率 embedding 的余弦相似度下限")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    cache_path = Path(args.cache or Path(args.out_dir) / "features.npz")
+    t0 = time.perf_counter()
+    paths = list_frames(args.inputs)
+    cache = FeatureTable.load(cache_path) if cache_path.exists() else None
+    table = FeatureTable.build(paths, workers=args.workers, cache=cache)
+    table.save(cache_path)
+    feature_time = time.perf_counter() - t0
+
+    labels, info = cluster(table, args.max_hamming, args.max_dhash, args.min_sim)
+    info.update(feature_time_s=round(feature_time, 3), max_hamming=args.max_hamming,
+                max_dhash=args.max_dhash, min_sim=args.min_sim)
+    report = write_outputs(table, labels, info, args.out_dir)
+
+    print(f"帧 {report['frames']}，保留 {report['kept']}，移除 {report['removed']} "
+          f"({report['removed_ratio']:.1%})，有重复的簇 {report['clusters_with_duplicates']}")
+    print(f"候选对 {report['candidate_pairs']}，通过校验 {report['verified_pairs']}；"
+          f"特征 {report['feature_time_s']}s，聚类 {report['cluster_time_s']}s")
+    print(f"清单: {Path(args.out_dir) / 'manifest.jsonl'}，报告: {Path(args.out_dir) / 'report.json'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,19 +7,94 @@ from typing import List, Dict
 import sys
 import os
 
+from resolution import ResolutionPolicy
+
+
+def _cpu_supports_bf16() -> bool:
+    """CPU 是否有原生 bf16 指令（AVX512-BF16 / AMX），没有的话 bf16 反而比 fp32 慢"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def _available_cpus() -> int:
+    """本进程实际可用的 CPU 数：考虑 taskset / cgroup cpuset 的亲和性，以及 cgroup v2 的 cpu.max 配额"""
+    try:
+        n = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS / Windows 没有 sched_getaffinity
+        n = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            n = min(n, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, n)
+
+
+def quantize_cpu_model(model, mode: str):
+    """CPU 权重量化：int8 用 torch 动态量化，int4 用 torchao 的 CPU int4 布局"""
+    if mode == "int8":
+        # 动态量化只支持 fp32 权重，Linear 权重转 int8，激活在运行时量化
+        return torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    if mode == "int4":
+        try:
+            from torchao.quantization import quantize_, Int4WeightOnlyConfig
+            from torchao.dtypes import Int4CPULayout
+        except ImportError:
+            raise RuntimeError("int4 量化需要安装 torchao>=0.9: pip install torchao")
+        quantize_(model, Int4WeightOnlyConfig(group_size=128, layout=Int4CPULayout()))
+        return model
+    raise ValueError(f"不支持的量化方式: {mode}")
+
+
 class ExplorationDetector:
-    def __init__(self, model_path: str):
-        """初始化交互区域检测器"""
+    def __init__(self, model_path: str, cpu_quant: str = None, cpu_dtype: str = "auto", num_threads: int = None,
+                 resolution=None, cpu_optimize: bool = True):
+        """
+        初始化交互区域检测器
+
+        resolution: ResolutionPolicy 或预设字符串（见 resolution.py），默认使用原图分辨率
+
+        仅在没有 CUDA 时生效的 CPU 选项:
+        - cpu_quant: None / "int8" / "int4"
+        - cpu_dtype: "auto" / "fp32" / "bf16"，auto 在 CPU 支持 bf16 时使用 bf16
+        - num_threads: torch 计算线程数，默认使用本进程可用的 CPU 数（亲和性 / cgroup 配额）
+        - cpu_optimize: False 时按改动前的方式加载（fp32、torch 默认线程数、不量化），作为基准对照
+        """
         print(f"正在加载模型: {model_path}")
+        self.resolution = ResolutionPolicy.parse(resolution)
         
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         print(f"使用设备: {self.device}")
-        
+
+        self.cpu_config = None
+        load_kwargs = {}
+        if torch.cuda.is_available():
+            dtype = torch.float16
+            load_kwargs["low_cpu_mem_usage"] = True
+        elif cpu_optimize:
+            dtype = self._configure_cpu(cpu_quant, cpu_dtype, num_threads)
+            load_kwargs["low_cpu_mem_usage"] = True
+        else:
+            dtype = torch.float32
+            cpu_quant = None
+            self.cpu_config = {"mode": "baseline", "dtype": "fp32", "threads": torch.get_num_threads(),
+                               "quant": None}
+            print(f"CPU 配置: {self.cpu_config}")
+
         self.model = AutoModelForImageTextToText.from_pretrained(
             model_path,
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+            torch_dtype=dtype,
             device_map="auto" if torch.cuda.is_available() else None,
-            trust_remote_code=True
+            trust_remote_code=True,
+            **load_kwargs
         )
         
         self.processor = AutoProcessor.from_pretrained(
@@ -29,13 +104,40 @@ class ExplorationDetector:
         
         if not torch.cuda.is_available():
             self.model = self.model.to(self.device)
+            if cpu_quant:
+                print(f"CPU 权重量化: {cpu_quant}")
+                self.model = quantize_cpu_model(self.model, cpu_quant)
+        self.model.eval()
             
         print("模型加载完成!")
+
+    def _configure_cpu(self, cpu_quant, cpu_dtype, num_threads):
+        """设置 CPU 线程数并选择加载精度；实际生效的配置记录在 self.cpu_config 并打印"""
+        if num_threads is None:
+            num_threads = _available_cpus()
+        torch.set_num_threads(num_threads)
+
+        if cpu_quant == "int8":
+            dtype, reason = torch.float32, "int8 动态量化需要 fp32 权重"
+        elif cpu_quant == "int4":
+            dtype, reason = torch.bfloat16, "int4 CPU 布局使用 bf16 激活"
+        elif cpu_dtype == "bf16":
+            dtype, reason = torch.bfloat16, "cpu_dtype=bf16"
+        elif cpu_dtype == "auto" and _cpu_supports_bf16():
+            dtype, reason = torch.bfloat16, "cpu_dtype=auto，CPU 支持 AVX512-BF16 / AMX，自动切换为 bf16"
+        else:
+            dtype, reason = torch.float32, f"cpu_dtype={cpu_dtype}"
+        self.cpu_config = {"mode": "optimized", "dtype": "bf16" if dtype == torch.bfloat16 else "fp32",
+                           "dtype_reason": reason, "threads": num_threads, "quant": cpu_quant}
+        print(f"CPU 配置: {self.cpu_config}")
+        return dtype
     
     def analyze_image(self, image_path: str) -> Dict[str, List]:
         """分析图片中的可交互区域（可滑动和可点击）"""
         try:
-            image = Image.open(image_path)
+            image = Image.open(image_path).convert("RGB")
+            if self.resolution is not None:
+                image = self.resolution.apply(image)
             print(f"成功加载图片: {image_path}, 尺寸: {image.size}")
         except Exception as e:
             print(f"无法打开图片: {e}")
@@ -186,75 +288,34 @@ class ExplorationDetector:
         
         return True
     
-    def visualize_results(self, image_path: str, results: Dict[str, List], save_path: str = None):
-        """可视化检测结果"""
-        try:
-            from PIL import ImageDraw, ImageFont
-        except ImportError:
-            print("请安装Pillow库以可视化结果: pip install pillow")
-            return
-        
-        image = Image.open(image_path)
-        draw = ImageDraw.Draw(image)
+    def visualize_results(self, image_path, results: Dict[str, List], save_path: str = None):
+        """
+        可视化检测结果。image_path 也可以直接传入已打开的 PIL.Image，避免重复读图；
+        批量渲染整个数据集请用 render_gallery.py
+        """
+        from render_gallery import draw_regions
+
+        image = image_path.copy() if isinstance(image_path, Image.Image) else Image.open(image_path)
+        image = image.convert("RGB")
         width, height = image.size
-        
-        # 颜色设置
-        colors = {
-            'clickable': 'green',
-            'slidable_horizontal': 'blue',
-            'slidable_vertical': 'red',
-            'slidable_both': 'purple'
-        }
-        
-        try:
-            font = ImageFont.truetype("arial.ttf", 20)
-        except:
-            font = ImageFont.load_default()
-        
+
         print(f"\n检测结果统计:")
         print(f"可点击区域: {len(results['clickable_regions'])} 个")
         print(f"可滑动区域: {len(results['slidable_regions'])} 个")
         print("-" * 50)
-        
-        all_regions = results['clickable_regions'] + results['slidable_regions']
-        
-        for i, region in enumerate(all_regions):
-            bbox = region['bbox']
-            # 转换坐标到实际像素
-            bbox = [
-                bbox[0] / 1000 * width,
-                bbox[1] / 1000 * height,
-                bbox[2] / 1000 * width,
-                bbox[3] / 1000 * height
-            ]
-            
-            # 确定颜色
-            if region in results['clickable_regions']:
-                color = colors['clickable']
-                label = f"C{i+1}"
-            else:
-                direction = region.get('direction', '').lower()
-                if 'horiz' in direction:
-                    color = colors['slidable_horizontal']
-                elif 'vert' in direction:
-                    color = colors['slidable_vertical']
-                else:
-                    color = colors['slidable_both']
-                label = f"S{i+1-len(results['clickable_regions'])}"
-            
-            # 绘制边界框
-            draw.rectangle(bbox, outline=color, width=3)
-            
-            # 添加标签
-            draw.text((bbox[0], bbox[1] - 25), label, fill=color, font=font)
-            
-            # 打印信息
-            category = "可点击" if region in results['clickable_regions'] else "可滑动"
-            print(f"{label} [{category}]: {region.get('type', '未知')}")
-            print(f"  位置: [{bbox[0]:.1f}, {bbox[1]:.1f}, {bbox[2]:.1f}, {bbox[3]:.1f}]")
-            print(f"  描述: {region.get('description', '无')}")
-            print("-" * 50)
-        
+
+        for prefix, key, category in (("C", "clickable_regions", "可点击"), ("S", "slidable_regions", "可滑动")):
+            for i, region in enumerate(results[key]):
+                bbox = region['bbox']
+                bbox = [bbox[0] / 1000 * width, bbox[1] / 1000 * height,
+                        bbox[2] / 1000 * width, bbox[3] / 1000 * height]
+                print(f"{prefix}{i+1} [{category}]: {region.get('type', '未知')}")
+                print(f"  位置: [{bbox[0]:.1f}, {bbox[1]:.1f}, {bbox[2]:.1f}, {bbox[3]:.1f}]")
+                print(f"  描述: {region.get('description', '无')}")
+                print("-" * 50)
+
+        draw_regions(image, results)
+
         if save_path:
             image.save(save_path)
             print(f"\n可视化结果已保存到: {save_path}")
@@ -266,12 +327,19 @@ class ExplorationDetector:
 
 def main():
     """主函数"""
-    if len(sys.argv) < 2:
-        print("用法: python detect.py <图片路径> [模型路径]")
-        sys.exit(1)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="检测截图中的可交互区域")
+    parser.add_argument("image_path", help="图片路径")
+    parser.add_argument("model_path", nargs="?", default="/home/xiyuan/data/model/Qwen3-VL-8B-Instruct")
+    parser.add_argument("--cpu-quant", choices=["int8", "int4"], default=None, help="无 CUDA 时的权重量化方式")
+    parser.add_argument("--cpu-dtype", choices=["auto", "fp32", "bf16"], default="auto")
+    parser.add_argument("--threads", type=int, default=None, help="CPU 推理线程数")
+    parser.add_argument("--resolution", default=None, help="分辨率策略，如 full / low / tokens:800 / scale:0.5")
+    args = parser.parse_args()
     
-    image_path = sys.argv[1]
-    MODEL_PATH = sys.argv[2] if len(sys.argv) > 2 else "/home/xiyuan/data/model/Qwen3-VL-8B-Instruct"
+    image_path = args.image_path
+    MODEL_PATH = args.model_path
     
     if not os.path.exists(MODEL_PATH):
         print(f"错误: 模型路径不存在: {MODEL_PATH}")
@@ -282,7 +350,13 @@ def main():
         sys.exit(1)
     
     try:
-        detector = ExplorationDetector(MODEL_PATH)
+        detector = ExplorationDetector(
+            MODEL_PATH,
+            cpu_quant=args.cpu_quant,
+            cpu_dtype=args.cpu_dtype,
+            num_threads=args.threads,
+            resolution=args.resolution
+        )
     except Exception as e:
         print(f"初始化检测器失败: {e}")
         sys.exit(1)
@@ -3,29 +3,53 @@ import base64
 import io
 import json
 import re
-import requests
 from PIL import Image
 from typing import List, Dict
 
+import tracing
+from inference_client import InferenceClient
+from resolution import ResolutionPolicy
+
 
 class ExplorationDetector:
-    def __init__(self, server_url: str):
+    def __init__(self, server_url, resolution=None, client=None, model=None):
         """
         server_url 示例:
         - http://127.0.0.1:8000
+        - 多个推理节点: ["http://10.0.0.1:8000", "http://10.0.0.2:8000"] 或用逗号分隔的字符串
+        - 同机 worker: local:///tmp/swipegen_worker.sock（见 local_worker.py），截图经共享内存传递
+
+        resolution: ResolutionPolicy 或预设字符串（见 resolution.py），
+        默认沿用原来的固定 0.5 缩放（尺寸与原来完全相同，如 1080x2400 -> 540x1200）
+        client: 可选的 InferenceClient，多个 detector 可共享同一个客户端（连接池、熔断状态）
+        model: 服务端模型注册表中的模型名（见 model_registry.py），None 使用服务端默认模型
+        """
+        if client is None and isinstance(server_url, str) and server_url.startswith("local://"):
+            from local_worker import LocalWorkerClient
+            client = LocalWorkerClient(server_url)
+        self.client = client or InferenceClient(server_url)
+        self.local = str(getattr(self.client, "url", "")).startswith("local://")
+        self.server_url = self.client.url if self.local else self.client.endpoints[0].url
+        self.resolution = ResolutionPolicy.parse(resolution) or ResolutionPolicy(scale=0.5)
+        self.model = model
+
+    def analyze_image(self, image_path: str, crop=None) -> Dict[str, List]:
         """
-        self.server_url = server_url.rstrip("/")
+        crop: 可选的 0-1000 归一化区域 [x1, y1, x2, y2]，只把这部分发给模型，
+        返回的 bbox 会映射回整张截图的 0-1000 坐标
+        """
+        with tracing.span("detector.analyze_image", crop=crop) as sp:
+            result = self._analyze_image(image_path, crop)
+            sp.set(clickable=len(result["clickable_regions"]), slidable=len(result["slidable_regions"]))
+            return result
 
-    def analyze_image(self, image_path: str) -> Dict[str, List]:
+    def _analyze_image(self, image_path, crop):
         try:
             image = Image.open(image_path).convert("RGB")
-            # ===== 缩放到 0.5 =====
-            scale = 0.5
-            new_size = (
-                int(image.width * scale),
-                int(image.height * scale)
-            )
-            image = image.resize(new_size, Image.BILINEAR)
+            if crop is not None:
+                image = image.crop(self._crop_box(crop, image.size))
+            # ===== 按分辨率策略缩放，视觉 token 数决定 prefill 开销 =====
+            image = self.resolution.apply(image)
             print(f"Loaded image: {image_path}, size={image.size}")
         except Exception as e:
             print(f"Failed to load image: {e}")
@@ -46,26 +70,32 @@ class ExplorationDetector:
 只输出JSON格式，不要有其他文字说明。
 """
 
-        payload = {
-            "prompt": prompt,
-            "image_base64": self._encode_image(image)
-        }
+        with tracing.span("detector.encode", size=list(image.size)):
+            payload = {"prompt": prompt}
+            if self.local:
+                # 同机 worker：原始像素写入共享内存，不做 PNG 编码和 base64
+                payload["image"] = image
+            else:
+                payload["image_base64"] = self._encode_image(image)
+            if self.model:
+                payload["model"] = self.model
 
         print("Sending inference request...")
-        resp = requests.post(
-            f"{self.server_url}/infer",
-            json=payload,
-            timeout=180
-        )
-        resp.raise_for_status()
+        with tracing.span("detector.http_infer") as sp:
+            # 负载均衡 / 重试 / 熔断 / 对冲都在 InferenceClient 中完成；
+            # traceparent 让服务端的 span 挂在这次 HTTP 调用下面
+            body = self.client.post("/infer", payload, headers=tracing.inject_headers())
+            tracing.merge_remote(body.get("trace"), parent=sp)
 
-        response_text = resp.json()["text"]
+        response_text = body["text"]
 
         print("Model response:")
         print(response_text)
         print("=" * 50)
 
         all_regions = self._parse_response(response_text)
+        if crop is not None:
+            all_regions = [self._remap_region(r, crop) for r in all_regions]
 
         clickable, slidable = [], []
         for region in all_regions:
@@ -91,6 +121,29 @@ class ExplorationDetector:
     # Utilities
     # ==========================
 
+    @staticmethod
+    def _crop_box(crop, size):
+        w, h = size
+        return (
+            int(crop[0] / 1000 * w),
+            int(crop[1] / 1000 * h),
+            int(round(crop[2] / 1000 * w)),
+            int(round(crop[3] / 1000 * h))
+        )
+
+    @staticmethod
+    def _remap_region(region, crop):
+        """把裁剪图内的 0-1000 坐标映射回整图的 0-1000 坐标"""
+        cw, ch = crop[2] - crop[0], crop[3] - crop[1]
+        x1, y1, x2, y2 = region["bbox"]
+        region["bbox"] = [
+            round(crop[0] + x1 / 1000 * cw, 1),
+            round(crop[1] + y1 / 1000 * ch, 1),
+            round(crop[0] + x2 / 1000 * cw, 1),
+            round(crop[1] + y2 / 1000 * ch, 1)
+        ]
+        return region
+
     def _encode_image(self, image: Image.Image) -> str:
         buf = io.BytesIO()
         image.save(buf, format="PNG")
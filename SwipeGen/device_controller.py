@@ -5,12 +5,123 @@ from PIL import Image
 import numpy as np
 import math
 
+try:
+    import cv2
+except ImportError:  # 没有 OpenCV 时用纯 numpy 的投影切分代替连通域
+    cv2 = None
+
+import tracing
+from screencap import RawScreencapBackend
+
+
+def frame_dhash(image, size=8):
+    """差分哈希 (dHash)：缩成 (size+1) x size 灰度图，比较相邻像素，返回 size*size 位整数"""
+    small = np.asarray(image.convert('L').resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+# 帧新鲜度探测用的原始帧降采样步长（1080x2400 -> 135x300，每次约 160KB）
+PROBE_DOWNSAMPLE = 8
+
+
+def probe_signature(image, step=1):
+    """按步长取样的灰度数组；与 screencap 的 downsample 取样方式一致，两者可逐像素比较"""
+    return np.asarray(image.convert('L'), dtype=np.int16)[::step, ::step]
+
+
+def _dilate(mask, r):
+    """二值膨胀（(2r+1) 方形核），把相邻的文字、图标变化连成一片"""
+    if r <= 0:
+        return mask
+    if cv2 is not None:
+        return cv2.dilate(mask.astype(np.uint8), np.ones((2 * r + 1, 2 * r + 1), np.uint8)).astype(bool)
+    # 积分图求窗口和，窗口内有任意变化像素即为 True
+    h, w = mask.shape
+    ii = np.pad(mask.astype(np.int32), ((r + 1, r), (r + 1, r))).cumsum(0).cumsum(1)
+    k = 2 * r + 1
+    return (ii[k:k + h, k:k + w] - ii[:h, k:k + w] - ii[k:k + h, :w] + ii[:h, :w]) > 0
+
+
+def _runs(line):
+    """一维布尔数组中连续 True 段的 [start, end) 列表"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], line.astype(np.int8), [0]))))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def _xy_cut(mask, y0=0, x0=0, depth=0):
+    """按行、列投影递归切分，返回各块的外接框；对膨胀后的变化掩码与连通域结果接近"""
+    boxes = []
+    for ya, yb in _runs(mask.any(1)):
+        band = mask[ya:yb]
+        cols = _runs(band.any(0))
+        for xa, xb in cols:
+            sub = band[:, xa:xb]
+            rows = _runs(sub.any(1))
+            if (len(rows) > 1 or len(cols) > 1) and depth < 4:
+                boxes.extend(_xy_cut(sub, y0 + ya, x0 + xa, depth + 1))
+            else:
+                boxes.append((x0 + xa, y0 + ya + rows[0][0], x0 + xb, y0 + ya + rows[-1][1]))
+    return boxes
+
+
+def changed_regions(img1, img2, pixel_threshold=10, min_area=0.0005, dilate=0.01, scale=4):
+    """
+    两帧之间发生变化的区域，返回 0-1000 归一化的 [x1, y1, x2, y2] 列表（按面积从大到小）。
+    :param pixel_threshold: 灰度差超过该值的像素视为变化（与 calculate_image_diff 一致）
+    :param min_area: 小于屏幕面积该比例的变化块忽略（光标闪烁、噪点）
+    :param dilate: 膨胀半径占屏幕宽度的比例，相邻的零散变化合并成一个区域
+    :param scale: 先按该倍数缩小再比较
+    """
+    a = img1.convert('L')
+    b = img2.convert('L')
+    if b.size != a.size:
+        b = b.resize(a.size)
+    w, h = a.size
+    size = (max(1, w // scale), max(1, h // scale))
+    a = np.asarray(a.resize(size, Image.BILINEAR), dtype=np.int16)
+    b = np.asarray(b.resize(size, Image.BILINEAR), dtype=np.int16)
+    mask = _dilate(np.abs(a - b) > pixel_threshold, int(round(dilate * size[0])))
+    if not mask.any():
+        return []
+
+    if cv2 is not None:
+        n, _, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+        boxes = [(x, y, x + bw, y + bh) for x, y, bw, bh, _ in stats[1:n]]
+    else:
+        boxes = _xy_cut(mask)
+
+    sh, sw = mask.shape
+    out = []
+    for x1, y1, x2, y2 in boxes:
+        if (x2 - x1) * (y2 - y1) < min_area * sw * sh:
+            continue
+        out.append([round(x1 * 1000 / sw), round(y1 * 1000 / sh), round(x2 * 1000 / sw), round(y2 * 1000 / sh)])
+    out.sort(key=lambda r: -(r[2] - r[0]) * (r[3] - r[1]))
+    return out
+
 
 class UIAutomatorController:
     """UI自动化控制器，封装uiautomator2操作和屏幕处理逻辑"""
     
-    def __init__(self, device_serial=None, screenshot_dir="screenshots"):
-        """初始化控制器，连接设备"""
+    def __init__(self, device_serial=None, screenshot_dir="screenshots",
+                 capture_backend="u2", capture_downsample=1, frame_max_age=10.0, frame_probe=True,
+                 unprobed_max_age=1.0, frame_store=None):
+        """
+        初始化控制器，连接设备
+
+        :param capture_backend: "u2" 使用 uiautomator2 截图；"raw" 通过 adb screencap 读取原始帧
+        :param capture_downsample: raw 模式下的整数降采样步长
+        :param frame_max_age: 当前帧可被复用的最长时间（秒）
+        :param frame_probe: 复用前是否用低分辨率原始帧探测确认画面未变。探测总是走 adb screencap
+                            (downsample=PROBE_DOWNSAMPLE)，与截图后端无关
+        :param unprobed_max_age: 关闭探测或探测失败时，当前帧只在这么短的时间内复用（秒）
+        :param frame_store: 可选的 FrameStore，启用后截图按内容去重存储，结果中附带 frame_hash
+        """
         try:
             if device_serial:
                 self.d = u2.connect(device_serial)
@@ -25,34 +136,114 @@ class UIAutomatorController:
         # 截图目录管理
         self.screenshot_dir = Path(screenshot_dir)
         self.screenshot_dir.mkdir(exist_ok=True)
+
+        self.capture_downsample = capture_downsample
+        self.raw_capture = None
+        if capture_backend == "raw":
+            self.raw_capture = RawScreencapBackend(self.d.serial)
+        elif capture_backend != "u2":
+            raise ValueError(f"未知的截图后端: {capture_backend}")
+
+        # 当前帧：最近一次截图，在任何输入操作后失效
+        self.frame_max_age = frame_max_age
+        self.unprobed_max_age = unprobed_max_age
+        self.frame_probe = bool(frame_probe)
+        # 轮播图、懒加载图片、加载动画会在没有任何输入的情况下改变画面，复用前必须确认；
+        # u2 后端也用原始帧探测，省掉设备端的 JPEG 编码
+        self._probe_capture = None
+        if self.frame_probe:
+            self._probe_capture = self.raw_capture or RawScreencapBackend(self.d.serial)
+        self._current_frame = None
+        self.frame_store = frame_store
+        self.capture_stats = {'captured': 0, 'reused': 0, 'probe_rejected': 0}
+
+    @tracing.traced("controller.grab_frame")
+    def grab_frame(self):
+        """从当前截图后端获取一帧 PIL 图像"""
+        if self.raw_capture is not None:
+            return self.raw_capture.capture(downsample=self.capture_downsample)
+        return self.d.screenshot()
     
     def get_window_size(self):
         """获取设备窗口大小"""
         return self.d.window_size()
     
+    @tracing.traced("controller.take_screenshot")
     def take_screenshot(self, prefix="screen"):
         """截取屏幕并保存到文件"""
         try:
             timestamp = int(time.time() * 1000)
-            filename = self.screenshot_dir / f"{prefix}_{timestamp}.png"
-            
-            image = self.d.screenshot()
-            image.save(filename)
-            print(f"截图已保存: {filename}")
+            image = self.grab_frame()
+
+            frame_hash = None
+            if self.frame_store is not None:
+                frame_hash, filename, is_new = self.frame_store.put(image)
+                print(f"截图已保存: {filename}" if is_new else f"截图与已有帧相同: {filename}")
+            else:
+                filename = self.screenshot_dir / f"{prefix}_{timestamp}.png"
+                image.save(filename)
+                print(f"截图已保存: {filename}")
             
-            return {
+            res = {
                 'image': image,
                 'filename': str(filename),
-                'timestamp': timestamp
+                'timestamp': timestamp,
+                'frame_hash': frame_hash
             }
+            self.capture_stats['captured'] += 1
+            # 原始帧后端已按 capture_downsample 取样，这里补足剩余步长，使签名与探测帧的网格对齐
+            step = PROBE_DOWNSAMPLE // self.capture_downsample if self.raw_capture is not None else PROBE_DOWNSAMPLE
+            self._current_frame = dict(res, signature=probe_signature(image, max(1, step)))
+            return res
         except Exception as e:
             print(f"截图失败: {e}")
             return None
     
+    def invalidate_frame(self):
+        """屏幕可能已变化，丢弃当前帧"""
+        self._current_frame = None
+
+    @tracing.traced("controller.current_frame")
+    def current_frame(self, prefix="screen", max_changed=0.002):
+        """
+        返回屏幕的当前帧：如果上一次截图之后没有执行过任何操作、未超过 frame_max_age，
+        且低分辨率探测确认画面未变，直接复用它，否则重新截图。
+        无法探测时只在 unprobed_max_age 内复用。
+
+        :param max_changed: 探测帧与当前帧灰度差超过 10 的像素比例上限（与 calculate_image_diff 的判定一致，
+                            阈值远低于其 0.02，只容忍 JPEG 噪声）
+        """
+        frame = self._current_frame
+        if frame is not None:
+            age = time.time() - frame['timestamp'] / 1000
+            probe = self._probe_signature() if age <= self.frame_max_age else None
+            if probe is not None:
+                fresh = probe.shape == frame['signature'].shape and \
+                    np.mean(np.abs(probe - frame['signature']) > 10) <= max_changed
+            else:
+                fresh = age <= self.unprobed_max_age
+            if fresh:
+                self.capture_stats['reused'] += 1
+                print(f"复用当前帧: {frame['filename']}")
+                return {k: v for k, v in frame.items() if k != 'signature'}
+            if probe is not None:
+                self.capture_stats['probe_rejected'] += 1
+        return self.take_screenshot(prefix)
+
+    def _probe_signature(self):
+        """低分辨率原始帧的签名；关闭探测或 adb 不可用时返回 None"""
+        if self._probe_capture is None:
+            return None
+        try:
+            return probe_signature(self._probe_capture.capture(downsample=PROBE_DOWNSAMPLE))
+        except Exception as e:
+            print(f"帧探测失败，只在 {self.unprobed_max_age}s 内复用当前帧: {e}")
+            return None
+
     def take_screenshot_with_path(self, filepath):
         """截取屏幕并保存到指定路径"""
         try:
-            image = self.d.screenshot()
+            image = self.grab_frame()
             image.save(filepath)
             print(f"截图已保存: {filepath}")
             return str(filepath)
@@ -60,32 +251,44 @@ class UIAutomatorController:
             print(f"截图失败: {e}")
             return None
     
+    @tracing.traced("controller.click")
     def click(self, x, y):
         """点击指定坐标"""
         print(f"点击坐标: ({x}, {y})")
+        self.invalidate_frame()
         self.d.click(x, y)
     
+    @tracing.traced("controller.swipe")
     def swipe(self, start_x, start_y, end_x, end_y, duration=0.3):
         """滑动操作"""
         print(f"滑动从 ({start_x}, {start_y}) 到 ({end_x}, {end_y})，持续时间: {duration}s")
+        self.invalidate_frame()
         self.d.swipe(start_x, start_y, end_x, end_y, duration=duration)
     
+    @tracing.traced("controller.press_back")
     def press_back(self):
         """按返回键"""
+        self.invalidate_frame()
         self.d.press("back")
     
+    @tracing.traced("controller.app_stop")
     def app_stop(self, package_name):
         """停止应用"""
+        self.invalidate_frame()
         self.d.app_stop(package_name)
     
+    @tracing.traced("controller.app_start")
     def app_start(self, package_name):
         """启动应用"""
+        self.invalidate_frame()
         self.d.app_start(package_name)
     
+    @tracing.traced("controller.back")
     def back(self, package_name):
         if self.get_current_package() != package_name:
             self.app_start(package_name)
 
+    @tracing.traced("controller.reset_app_state")
     def reset_app_state(self, package_name, stop_wait=1, start_wait=3):
         """重置应用到初始状态"""
         print("重置应用到初始状态...")
@@ -107,6 +310,7 @@ class UIAutomatorController:
             print(f"启动应用失败: {e}")
             return False
     
+    @tracing.traced("controller.calculate_image_diff")
     def calculate_image_diff(self, img1_path, img2_path, bbox=None, threshold=0.02):
         """计算两张图片的差异，支持指定区域检测"""
         try:
@@ -178,18 +382,24 @@ class UIAutomatorController:
         width, height = self.get_window_size()
         return width // 2, height // 2
     
+    @tracing.traced("controller.long_click")
     def long_click(self, x, y, duration=1.0):
         """长按指定坐标"""
+        self.invalidate_frame()
         self.d.long_click(x, y, duration=duration)
     
+    @tracing.traced("controller.drag")
     def drag(self, start_x, start_y, end_x, end_y, duration=0.5):
         """拖拽操作"""
+        self.invalidate_frame()
         self.d.drag(start_x, start_y, end_x, end_y, duration=duration)
     
+    @tracing.traced("controller.get_current_package")
     def get_current_package(self):
         """获取当前活动应用的包名"""
         return self.d.app_current()['package']
     
+    @tracing.traced("controller.get_ui_hierarchy")
     def get_ui_hierarchy(self):
         """获取当前UI层次结构"""
         return self.d.dump_hierarchy()
@@ -0,0 +1,299 @@
+# export_dataset.py
+"""
+把探索日志 logs/report_tree_*.json 导出为训练数据：
+
+- SwipeBench 目录布局: <pkg>_NNN.png + <pkg>_summary.json + all_apps_summary_<name>.json
+- 固定大小的 tar / NPZ 分片 + index.json，训练时可按分片顺序读取
+
+报告逐个流式读取；图片拷贝/缩放在进程池中完成；
+进度记录在 export_state.json 中，中断后重新运行会从上次完成的位置继续。
+
+    python export_dataset.py logs/ generated_data/ --only-success --shard-size 1000 --workers 8
+"""
+import argparse
+import io
+import json
+import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from action_table import ActionTable
+
+
+# ==========================
+# 报告展开
+# ==========================
+
+def _to_swipebench_action(res):
+    """把 InteractionTester 的结果转换为 SwipeBench 的 action_data"""
+    a = res["action_data"]
+    region = res.get("region_info") or {}
+    item = {
+        "action": a["action"],
+        "bbox": a.get("bbox"),
+        "instruction": region.get("description") or a.get("intent", ""),
+        "success": bool(a.get("success", False))
+    }
+    if a["action"] != "tap":
+        item.update({
+            "start": a["start"],
+            "end": a["end"],
+            "duration": a["duration"],
+            "direction": a["direction"]
+        })
+    return item
+
+
+def iter_report_samples(report_path):
+    """展开一份报告的 L1 / L2 树，逐条产出样本"""
+    with open(report_path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    pkg = report["app_package"]
+    results = report.get("results", {})
+    for group in ("l1_slides", "l1_clicks"):
+        for res in results.get(group, []):
+            yield pkg, 1, res
+            for sub in res.get("l2_exploration") or []:
+                yield pkg, 2, sub
+
+
+# ==========================
+# 进程池任务
+# ==========================
+
+def _process_image(task):
+    """拷贝/缩放一张截图；需要 NPZ 分片时同时返回固定尺寸的 uint8 数组"""
+    src, dst, max_side, npz_size = task
+    try:
+        image = Image.open(src).convert("RGB")
+    except Exception as e:
+        return dst, None, f"{src}: {e}"
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.BILINEAR)
+    image.save(dst)
+    arr = None
+    if npz_size:
+        arr = np.asarray(image.resize(npz_size, Image.BILINEAR), dtype=np.uint8)
+    return dst, arr, None
+
+
+def _load_array(task):
+    path, npz_size = task
+    return np.asarray(Image.open(path).convert("RGB").resize(npz_size, Image.BILINEAR), dtype=np.uint8)
+
+
+# ==========================
+# 导出器
+# ==========================
+
+class DatasetExporter:
+    def __init__(self, out_dir, name="export", only_success=False, max_side=None,
+                 shard_size=1000, npz_size=None, workers=None, batch_size=256):
+        self.out_dir = Path(out_dir)
+        self.image_dir = self.out_dir / "images"
+        self.shard_dir = self.out_dir / "shards"
+        self.image_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_dir.mkdir(exist_ok=True)
+        self.name = name
+        self.only_success = only_success
+        self.max_side = max_side
+        self.shard_size = shard_size
+        self.npz_size = npz_size
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+
+        self.state_path = self.out_dir / "export_state.json"
+        self.summary_journal = self.out_dir / "summary_journal.jsonl"
+        self.state = self._load_state()
+        # 挂起样本对应的 NPZ 数组不落盘在 state 里，恢复时从已导出的图片重新生成
+        self._pending_arrays = {}
+
+    # ---------- 状态 ----------
+
+    def _load_state(self):
+        if self.state_path.exists():
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"done_reports": [], "counters": {}, "pending": [], "shards": [], "skipped": 0}
+
+    def _save_state(self):
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    # ---------- 主流程 ----------
+
+    def export(self, report_paths):
+        done = set(self.state["done_reports"])
+        batch, batch_reports, batch_skipped = [], [], 0
+        with ProcessPoolExecutor(self.workers) as pool:
+            for path in report_paths:
+                path = str(path)
+                if path in done:
+                    continue
+                try:
+                    samples = list(iter_report_samples(path))
+                except Exception as e:
+                    print(f"跳过损坏的报告 {path}: {e}")
+                    self.state["done_reports"].append(path)
+                    continue
+                for pkg, level, res in samples:
+                    if not res.get("screenshot_before") or not res.get("action_data"):
+                        continue
+                    action = _to_swipebench_action(res)
+                    if self.only_success and not action["success"]:
+                        # 与 done_reports 一起在 _flush_batch 中提交，中断续跑时不会重复计数
+                        batch_skipped += 1
+                        continue
+                    batch.append({"pkg": pkg, "level": level, "src": res["screenshot_before"],
+                                  "action_data": action, "report": path})
+                batch_reports.append(path)
+                if len(batch) >= self.batch_size:
+                    self._flush_batch(pool, batch, batch_reports, batch_skipped)
+                    batch, batch_reports, batch_skipped = [], [], 0
+            if batch or batch_reports:
+                self._flush_batch(pool, batch, batch_reports, batch_skipped)
+            self._write_shards(pool, final=True)
+
+        self._write_all_apps_summary()
+        self._write_index()
+        print(f"导出完成: {sum(s['count'] for s in self.state['shards'])} 条样本, "
+              f"{len(self.state['shards'])} 个分片, 过滤 {self.state['skipped']} 条")
+
+    def _flush_batch(self, pool, batch, batch_reports, skipped=0):
+        counters = self.state["counters"]
+        tasks = []
+        for s in batch:
+            counters[s["pkg"]] = counters.get(s["pkg"], 0) + 1
+            s["img_filename"] = f"{s['pkg']}_{counters[s['pkg']]:03d}.png"
+            tasks.append((s["src"], str(self.image_dir / s["img_filename"]), self.max_side, self.npz_size))
+
+        ok = []
+        for s, (dst, arr, err) in zip(batch, pool.map(_process_image, tasks, chunksize=8)):
+            if err:
+                print(f"图片处理失败: {err}")
+                continue
+            if arr is not None:
+                self._pending_arrays[s["img_filename"]] = arr
+            ok.append(s)
+
+        self._append_app_summaries(ok)
+        self.state["pending"].extend(ok)
+        self.state["done_reports"].extend(batch_reports)
+        self.state["skipped"] += skipped
+        self._write_shards(pool)
+        self._save_state()
+        print(f"已处理 {len(self.state['done_reports'])} 份报告, 本批 {len(ok)} 条样本")
+
+    # ---------- SwipeBench 布局 ----------
+
+    def _append_app_summaries(self, samples):
+        """本批样本追加到日志文件，导出结束时由 _write_all_apps_summary 一次性写出各 App 的 summary"""
+        with open(self.summary_journal, "a", encoding="utf-8") as f:
+            for s in samples:
+                f.write(json.dumps({"pkg": s["pkg"], "img_filename": s["img_filename"],
+                                    "action_data": s["action_data"]}, ensure_ascii=False) + "\n")
+
+    def _write_all_apps_summary(self):
+        by_pkg = {}
+        if self.summary_journal.exists():
+            with open(self.summary_journal, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    it = json.loads(line)
+                    # 恢复时同一批可能被重复处理，按文件名去重，后写的为准
+                    by_pkg.setdefault(it.pop("pkg"), {})[it["img_filename"]] = it
+        merged = []
+        for pkg in sorted(by_pkg):
+            items = list(by_pkg[pkg].values())
+            with open(self.image_dir / f"{pkg.replace('.', '_')}_summary.json", "w", encoding="utf-8") as f:
+                json.dump(items, f, ensure_ascii=False, indent=2)
+            merged.extend(items)
+        with open(self.image_dir / f"all_apps_summary_{self.name}.json", "w", encoding="utf-8") as f:
+            json.dump(merged, f, ensure_ascii=False, indent=2)
+
+    # ---------- 分片 ----------
+
+    def _write_shards(self, pool, final=False):
+        pending = self.state["pending"]
+        while len(pending) >= self.shard_size or (final and pending):
+            chunk, pending = pending[:self.shard_size], pending[self.shard_size:]
+            shard_id = len(self.state["shards"])
+            self.state["shards"].append(self._write_shard(pool, shard_id, chunk))
+            self.state["pending"] = pending
+            self._save_state()
+
+    def _write_shard(self, pool, shard_id, samples):
+        stem = f"shard-{shard_id:05d}"
+        tar_path = self.shard_dir / f"{stem}.tar"
+        with tarfile.open(tar_path, "w") as tar:
+            for s in samples:
+                key = Path(s["img_filename"]).stem
+                tar.add(self.image_dir / s["img_filename"], arcname=f"{key}.png")
+                meta = json.dumps({"img_filename": s["img_filename"], "action_data": s["action_data"],
+                                   "level": s["level"]}, ensure_ascii=False).encode("utf-8")
+                info = tarfile.TarInfo(f"{key}.json")
+                info.size = len(meta)
+                tar.addfile(info, io.BytesIO(meta))
+
+        entry = {"id": shard_id, "tar": tar_path.name, "count": len(samples),
+                 "keys": [Path(s["img_filename"]).stem for s in samples]}
+
+        if self.npz_size:
+            missing = [s for s in samples if s["img_filename"] not in self._pending_arrays]
+            if missing:
+                # 断点恢复后内存里没有这些数组，从已导出的图片重新生成
+                tasks = [(str(self.image_dir / s["img_filename"]), self.npz_size) for s in missing]
+                for s, arr in zip(missing, pool.map(_load_array, tasks)):
+                    self._pending_arrays[s["img_filename"]] = arr
+            images = np.stack([self._pending_arrays.pop(s["img_filename"]) for s in samples])
+            table = ActionTable.from_dicts(s["action_data"] for s in samples)
+            npz_path = self.shard_dir / f"{stem}.npz"
+            np.savez(npz_path, images=images, actions=table.data,
+                     instructions=np.array(table.intents), keys=np.array(entry["keys"]))
+            entry["npz"] = npz_path.name
+        print(f"写入分片 {stem} ({len(samples)} 条)")
+        return entry
+
+    def _write_index(self):
+        index = {
+            "name": self.name,
+            "shard_size": self.shard_size,
+            "npz_image_size": self.npz_size,
+            "total": sum(s["count"] for s in self.state["shards"]),
+            "shards": self.state["shards"]
+        }
+        with open(self.out_dir / "index.json", "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export exploration reports to SwipeBench layout and shards")
+    parser.add_argument("logs_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--name", default="export")
+    parser.add_argument("--only-success", action="store_true")
+    parser.add_argument("--max-side", type=int, default=None, help="导出图片的最长边，默认不缩放")
+    parser.add_argument("--shard-size", type=int, default=1000)
+    parser.add_argument("--npz-size", default=None, help="NPZ 分片中的图片尺寸 WxH，如 448x1000；不设则只写 tar")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    npz_size = tuple(int(v) for v in args.npz_size.lower().split("x")) if args.npz_size else None
+    reports = sorted(Path(args.logs_dir).glob("report_tree_*.json"))
+    print(f"发现 {len(reports)} 份报告")
+
+    exporter = DatasetExporter(args.out_dir, name=args.name, only_success=args.only_success,
+                               max_side=args.max_side, shard_size=args.shard_size,
+                               npz_size=npz_size, workers=args.workers)
+    exporter.export(reports)
+
+
+if __name__ == "__main__":
+    main()
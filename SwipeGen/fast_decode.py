@@ -0,0 +1,221 @@
+# fast_decode.py
+"""
+稳态推理的快速解码路径（可选）：
+
+- 静态 KV cache：按 (prompt 长度档位 + 生成长度预算) 预分配，形状固定，transformers 在多次 generate 之间复用
+- torch.compile 编译 forward（解码步），形状固定后只在第一次遇到某个档位时编译
+- prompt 左侧 padding 到固定档位，避免每个新长度都触发重新编译
+- 生成长度预算：按 prompt 统计历史输出长度，用 p99 * margin 向上取到固定档位（256/512/1024/上限）
+  代替固定的 MAX_NEW_TOKENS；档位固定，输出长度漂移不会产生新的 cache 长度、触发重新编译。
+  输出触顶（没有遇到 EOS）时用完整上限重跑一次，保证结果与原路径一致
+- 编译的形状数 = prompt 档位数 x 预算档位数，install() 会把 dynamo 的重编译上限调到能容纳全部组合，
+  否则超出上限的形状会静默退回 eager
+
+静态 cache 和 CUDA graph 在多次 generate 之间复用，同一模型上的 generate 会被串行化；
+remote_server 单进程模式下并发请求在这里排队（多 worker 模式每个进程本来就一次只处理一个请求）。
+
+    decoder = FastDecode(model, tokenizer).install()   # 替换 model.generate
+    with decode_task(prompt):                           # 可选：启用按 prompt 的长度预算
+        model.generate(**inputs, max_new_tokens=1600)
+"""
+import bisect
+import contextvars
+import hashlib
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import torch
+
+PROMPT_BUCKETS = (128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096, 6144, 8192)
+BUDGET_TIERS = (256, 512, 1024)
+
+_task = contextvars.ContextVar("decode_task", default=None)
+
+
+@contextmanager
+def decode_task(prompt):
+    """声明接下来的 generate 属于哪一类 prompt，用于统计输出长度；未安装 FastDecode 时无影响"""
+    key = hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).hexdigest() if prompt else None
+    token = _task.set(key)
+    try:
+        yield
+    finally:
+        _task.reset(token)
+
+
+class LengthBudget:
+    """
+    每类 prompt 的生成长度预算：样本数达到 min_samples 后，取近期输出长度的 quantile 分位数乘以 margin，
+    向上取到 tiers 中的档位；超过所有档位时用调用方给的上限。预算只会是这几个值之一，
+    静态 cache 的长度不会随观测到的长度漂移。
+    """
+
+    def __init__(self, quantile=0.99, margin=1.25, min_samples=8, tiers=BUDGET_TIERS, window=256):
+        self.quantile = quantile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.tiers = tuple(sorted(tiers))
+        self._lengths = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def budget(self, key, max_new_tokens):
+        if key is None:
+            return max_new_tokens
+        with self._lock:
+            lengths = sorted(self._lengths[key])
+        if len(lengths) < self.min_samples:
+            return max_new_tokens
+        q = lengths[min(len(lengths) - 1, int(len(lengths) * self.quantile))]
+        return min(max_new_tokens, _bucket(math.ceil(q * self.margin), self.tiers + (max_new_tokens,)))
+
+    def observe(self, key, n_tokens):
+        if key is not None:
+            with self._lock:
+                self._lengths[key].append(n_tokens)
+
+
+def _bucket(n, buckets):
+    i = bisect.bisect_left(buckets, n)
+    return buckets[i] if i < len(buckets) else n
+
+
+class FastDecode:
+    """
+    :param tokenizer: 用于取 pad / eos token id（可以传 processor）
+    :param compile: 是否 torch.compile 模型 forward
+    :param static_cache: 是否使用静态 KV cache
+    :param buckets: prompt 长度档位；超过最大档位时不做 padding
+    """
+
+    def __init__(self, model, tokenizer, compile=True, static_cache=True, buckets=PROMPT_BUCKETS,
+                 budget=None, compile_mode="reduce-overhead"):
+        tok = getattr(tokenizer, "tokenizer", tokenizer)
+        self.model = model
+        self.eos_token_id = tok.eos_token_id
+        self.pad_token_id = tok.pad_token_id if tok.pad_token_id is not None else tok.eos_token_id
+        self.compile = compile
+        self.compile_mode = compile_mode
+        self.static_cache = static_cache
+        self.buckets = tuple(sorted(buckets))
+        self.budget = budget or LengthBudget()
+        self._original = None
+        self._shapes = set()
+        self._lock = threading.Lock()
+        # 静态 KV cache / CUDA graph 是模型级的共享状态，同一时间只能有一个 generate 使用
+        self._generate_lock = threading.Lock()
+        self.stats = {"calls": 0, "budget_hits": 0, "budget_misses": 0, "new_shapes": 0,
+                      "generated_tokens": 0, "decode_time_s": 0.0}
+
+    def install(self):
+        if self._original is not None:
+            return self
+        self._original = self.model.generate
+        if self.compile:
+            # 形状固定（静态 cache + 档位 padding），dynamic=False 让每个档位生成一份专用图。
+            # 每个 (prompt 档位, 预算档位) 组合的 prefill 和解码步各一份图，默认上限 8 远远不够
+            shapes = 2 * len(self.buckets) * (len(getattr(self.budget, "tiers", ())) + 1)
+            dynamo = torch._dynamo.config
+            for name in ("recompile_limit", "cache_size_limit"):
+                if hasattr(dynamo, name):
+                    setattr(dynamo, name, max(getattr(dynamo, name), shapes))
+            self.model.forward = torch.compile(self.model.forward, mode=self.compile_mode, dynamic=False)
+        self.model.generate = self._generate
+        return self
+
+    # ==========================
+    # padding
+    # ==========================
+
+    def _pad(self, input_ids, attention_mask, kwargs):
+        """左侧 padding 到档位长度；与 input_ids 同形状的其他逐 token 张量一起补 0。返回补的列数"""
+        length = input_ids.shape[1]
+        pad = _bucket(length, self.buckets) - length
+        if pad <= 0:
+            return input_ids, attention_mask, kwargs, 0
+        b = input_ids.shape[0]
+        ids = torch.cat([input_ids.new_full((b, pad), self.pad_token_id), input_ids], 1)
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        mask = torch.cat([attention_mask.new_zeros((b, pad)), attention_mask], 1)
+        padded = {}
+        for k, v in kwargs.items():
+            if torch.is_tensor(v) and v.dim() >= 2 and v.shape[:2] == input_ids.shape:
+                v = torch.cat([v.new_zeros((b, pad) + tuple(v.shape[2:])), v], 1)
+            padded[k] = v
+        return ids, mask, padded, pad
+
+    def _truncated(self, new_tokens, budget):
+        """生成长度达到预算且最后没有 EOS：输出可能被截断"""
+        if new_tokens.shape[1] < budget:
+            return False
+        eos = self.eos_token_id if isinstance(self.eos_token_id, (list, tuple)) else [self.eos_token_id]
+        return not all(any(t in eos for t in row.tolist()) for row in new_tokens)
+
+    # ==========================
+    # generate
+    # ==========================
+
+    def _run(self, input_ids, attention_mask, max_new_tokens, kwargs):
+        ids, mask, kw, pad = self._pad(input_ids, attention_mask, kwargs)
+        if self.static_cache:
+            kw.setdefault("cache_implementation", "static")
+        shape = (ids.shape[0], ids.shape[1], max_new_tokens)
+        with self._lock:
+            if shape not in self._shapes:
+                self._shapes.add(shape)
+                self.stats["new_shapes"] += 1
+        out = self._original(input_ids=ids, attention_mask=mask, max_new_tokens=max_new_tokens, **kw)
+        # 去掉补的列，调用方按原始 prompt 长度切分输出
+        return out[:, pad:] if pad else out
+
+    def _generate(self, input_ids=None, attention_mask=None, max_new_tokens=None, **kwargs):
+        if input_ids is None or kwargs.get("do_sample") or kwargs.get("num_beams", 1) > 1:
+            # 只优化贪心解码；其他情况走原路径
+            return self._original(input_ids=input_ids, attention_mask=attention_mask,
+                                  max_new_tokens=max_new_tokens, **kwargs)
+        max_new_tokens = max_new_tokens or 1600
+        key = _task.get()
+        budget = self.budget.budget(key, max_new_tokens)
+        prompt_len = input_ids.shape[1]
+
+        with self._generate_lock:
+            t0 = time.perf_counter()
+            out = self._run(input_ids, attention_mask, budget, dict(kwargs))
+            new_tokens = out[:, prompt_len:]
+            if budget < max_new_tokens:
+                if self._truncated(new_tokens, budget):
+                    with self._lock:
+                        self.stats["budget_misses"] += 1
+                    out = self._run(input_ids, attention_mask, max_new_tokens, dict(kwargs))
+                    new_tokens = out[:, prompt_len:]
+                else:
+                    with self._lock:
+                        self.stats["budget_hits"] += 1
+
+        n = self._generated_length(new_tokens)
+        self.budget.observe(key, n)
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["generated_tokens"] += n
+            self.stats["decode_time_s"] += time.perf_counter() - t0
+        return out
+
+    def _generated_length(self, new_tokens):
+        """到第一个 EOS（含）为止的最长生成长度"""
+        eos = set(self.eos_token_id if isinstance(self.eos_token_id, (list, tuple)) else [self.eos_token_id])
+        longest = 0
+        for row in new_tokens.tolist():
+            n = next((i + 1 for i, t in enumerate(row) if t in eos), len(row))
+            longest = max(longest, n)
+        return longest
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats, compiled_shapes=len(self._shapes))
+        out["decode_time_s"] = round(out["decode_time_s"], 3)
+        out["ms_per_token"] = round(1000 * out["decode_time_s"] / out["generated_tokens"], 2) \
+            if out["generated_tokens"] else None
+        return out
@@ -0,0 +1,230 @@
+# frame_store.py
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from PIL import Image
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{32}$")
+_EXTS = {"png": ".png", "webp": ".webp"}
+
+
+class FrameStore:
+    """
+    按内容寻址的截图存储：以像素内容的哈希为键，每个不同的画面只落盘一次。
+    objects/ab/ab12....png（或 .webp 无损）；重复帧只做一次哈希，不再编码写盘。
+    """
+
+    def __init__(self, root="screenshots/objects", fmt="png", webp_method=1):
+        if fmt not in _EXTS:
+            raise ValueError(f"不支持的存储格式: {fmt}")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.fmt = fmt
+        self.webp_method = webp_method
+        self.stats = {'written': 0, 'deduplicated': 0}
+
+    @staticmethod
+    def digest(image):
+        """对解码后的像素（含尺寸和模式）做哈希，与文件编码方式无关"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode())
+        h.update(image.tobytes())
+        return h.hexdigest()
+
+    def path_for(self, digest):
+        for ext in (_EXTS[self.fmt],) + tuple(e for e in _EXTS.values() if e != _EXTS[self.fmt]):
+            p = self.root / digest[:2] / f"{digest}{ext}"
+            if p.exists():
+                return p
+        return self.root / digest[:2] / f"{digest}{_EXTS[self.fmt]}"
+
+    def put(self, image):
+        """保存一帧，返回 (digest, path, is_new)"""
+        digest = self.digest(image)
+        path = self.path_for(digest)
+        if path.exists():
+            self.stats['deduplicated'] += 1
+            return digest, path, False
+
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        if self.fmt == "webp":
+            image.save(tmp, format="WEBP", lossless=True, method=self.webp_method)
+        else:
+            image.save(tmp, format="PNG")
+        os.replace(tmp, path)
+        self.stats['written'] += 1
+        return digest, path, True
+
+    def objects(self):
+        for p in self.root.glob("*/*"):
+            if _DIGEST_RE.match(p.stem) and p.suffix in _EXTS.values():
+                yield p
+
+    def usage(self):
+        files = list(self.objects())
+        return len(files), sum(p.stat().st_size for p in files)
+
+
+# ==========================
+# 报告引用扫描 / GC / 压缩
+# ==========================
+
+def _walk_strings(obj):
+    if isinstance(obj, dict):
+        for v in obj.values():
+            yield from _walk_strings(v)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from _walk_strings(v)
+    elif isinstance(obj, str):
+        yield obj
+
+
+def referenced_digests(logs_dir):
+    """收集所有报告中引用的帧哈希（frame_* 字段或指向 store 的截图路径）"""
+    refs = set()
+    for report in Path(logs_dir).glob("report_tree_*.json"):
+        with open(report, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for s in _walk_strings(data):
+            stem = Path(s).stem
+            if _DIGEST_RE.match(s):
+                refs.add(s)
+            elif _DIGEST_RE.match(stem):
+                refs.add(stem)
+    return refs
+
+
+def gc(store, logs_dir, dry_run=False, min_age=3600):
+    """删除没有被任何报告引用的对象；min_age 秒内写入的对象可能属于还没保存报告的探索，保留"""
+    refs = referenced_digests(logs_dir)
+    removed, freed = 0, 0
+    now = time.time()
+    for p in store.objects():
+        if p.stem not in refs and now - p.stat().st_mtime > min_age:
+            removed += 1
+            freed += p.stat().st_size
+            if not dry_run:
+                p.unlink()
+    print(f"GC: 引用 {len(refs)} 帧, 删除 {removed} 个对象, 释放 {freed / 1e6:.1f} MB"
+          + (" (dry run)" if dry_run else ""))
+    return removed, freed
+
+
+def _norm(path, base=None):
+    """规范化为绝对路径，用于比较报告里写法不同（相对 / 绝对 / ./ 前缀）的同一文件"""
+    p = Path(path)
+    if not p.is_absolute() and base is not None:
+        p = Path(base) / p
+    return os.path.normpath(os.path.abspath(p))
+
+
+def compact(store, screenshot_dir, logs_dir, dry_run=False):
+    """
+    把旧的 prefix_timestamp.png 截图迁移进 store：
+    相同画面只保留一份，报告里的路径改写为 store 路径并补上 frame 哈希。
+    原文件只在报告中的引用已改写、或没有任何报告引用它时才删除。
+    报告中的相对路径按当前目录和 logs 目录的上级目录两种基准解析。
+    """
+    screenshot_dir = Path(screenshot_dir)
+    logs_dir = Path(logs_dir)
+    mapping = {}
+    before = 0
+    for p in sorted(screenshot_dir.glob("*.png")):
+        before += p.stat().st_size
+        with Image.open(p) as im:
+            image = im.convert("RGB") if im.mode not in ("RGB", "RGBA") else im.copy()
+        if dry_run:
+            mapping[_norm(p)] = (store.digest(image), None)
+        else:
+            digest, path, _ = store.put(image)
+            mapping[_norm(p)] = (digest, str(path))
+
+    unique = len({d for d, _ in mapping.values()})
+    print(f"压缩: {len(mapping)} 张截图 -> {unique} 个不同画面")
+    if dry_run:
+        return mapping
+
+    bases = (None, logs_dir.resolve().parent)
+    rewritten = set()
+    unresolved = set()   # 报告中引用了、但没能对应到 mapping 的文件名
+
+    def lookup(v):
+        for base in bases:
+            key = _norm(v, base)
+            if key in mapping:
+                return key
+        return None
+
+    def rewrite(obj):
+        if isinstance(obj, dict):
+            out = {}
+            for k, v in obj.items():
+                out[k] = rewrite(v)
+                if k.startswith("screenshot_") and isinstance(v, str):
+                    key = lookup(v)
+                    if key is not None:
+                        out["frame_" + k[len("screenshot_"):]] = mapping[key][0]
+            return out
+        if isinstance(obj, list):
+            return [rewrite(v) for v in obj]
+        if isinstance(obj, str) and obj.lower().endswith(".png"):
+            key = lookup(obj)
+            if key is None:
+                unresolved.add(Path(obj).name)
+                return obj
+            rewritten.add(key)
+            return mapping[key][1]
+        return obj
+
+    for report in logs_dir.glob("report_tree_*.json"):
+        with open(report, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        tmp = report.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rewrite(data), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, report)
+
+    kept = 0
+    for src in mapping:
+        if src in rewritten or Path(src).name not in unresolved:
+            os.remove(src)
+        else:
+            kept += 1
+    if kept:
+        print(f"保留 {kept} 张仍被报告以无法解析的路径引用的截图")
+    _, after = store.usage()
+    print(f"磁盘占用: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    return mapping
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Content-addressed screenshot store maintenance")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_gc = sub.add_parser("gc", help="删除未被报告引用的帧")
+    p_gc.add_argument("--store", default="screenshots/objects")
+    p_gc.add_argument("--logs", default="logs")
+    p_gc.add_argument("--dry-run", action="store_true")
+    p_gc.add_argument("--min-age", type=float, default=3600, help="只回收早于该秒数写入的对象")
+    p_c = sub.add_parser("compact", help="把旧截图迁移进 store 并改写报告")
+    p_c.add_argument("--store", default="screenshots/objects")
+    p_c.add_argument("--screenshots", default="screenshots")
+    p_c.add_argument("--logs", default="logs")
+    p_c.add_argument("--format", choices=list(_EXTS), default="png")
+    p_c.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if args.cmd == "gc":
+        gc(FrameStore(args.store), args.logs, args.dry_run, args.min_age)
+    else:
+        compact(FrameStore(args.store, fmt=args.format), args.screenshots, args.logs, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# guiswiper.py
+"""
+GUISwiper 动作预测：输入 (截图, 指令)，输出 SwipeBench action_data 格式的动作。
+
+    tap:   {"action": "tap", "position": [x, y]}
+    swipe: {"action": "swipe", "start": [x, y], "end": [x, y], "direction": "up", "duration": 300}
+
+坐标均归一化到 0-1000。三种模型：
+- "heuristic": 只看指令文本的规则模型，不加载 torch，只用于测试服务 / 评测的传输链路
+- "tiny": 随机初始化的微型 Qwen2-VL（vlm_backend.build_tiny_vlm），CPU 上跑通真实的图文批量推理路径；
+  输出是随机 token，几乎全部解析为 invalid，评测数字只反映吞吐
+- 其他值按模型路径加载 VLM（GUISwiper 权重或任意 Qwen-VL 系列模型）。GUISwiper 需要看截图，
+  只接受 config 中带 vision_config 的图文 checkpoint，用 AutoModelForImageTextToText 加载
+
+BatchedPredictor 把并发到来的请求攒成批次交给模型，服务端 (guiswiper_server.py)
+与评测脚本 (score_guiswiper.py) 共用。
+"""
+import json
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_DURATION = 300
+
+PROMPT = """You are a mobile GUI agent. Given the screenshot and the instruction, output the single action to perform.
+Coordinates are normalized to 0-1000 (x to the right, y downward).
+
+Instruction: {instruction}
+
+Output only one JSON object, either
+{{"action": "tap", "position": [x, y]}}
+or
+{{"action": "swipe", "start": [x1, y1], "end": [x2, y2], "direction": "up|down|left|right", "duration": 300}}"""
+
+
+# ==========================
+# 动作解析 / 规范化
+# ==========================
+
+def _point(v):
+    if not isinstance(v, (list, tuple)) or len(v) != 2:
+        return None
+    try:
+        return [int(round(min(1000.0, max(0.0, float(c))))) for c in v]
+    except (TypeError, ValueError):
+        return None
+
+
+def _duration(v):
+    """毫秒数；模型可能写成 "300ms"、[300] 等，取不到正数时用默认值"""
+    if isinstance(v, (list, tuple)) and len(v) == 1:
+        v = v[0]
+    if isinstance(v, str):
+        m = re.search(r"\d+(?:\.\d+)?", v)
+        v = m.group(0) if m else None
+    try:
+        ms = int(round(float(v)))
+    except (TypeError, ValueError, OverflowError):
+        return DEFAULT_DURATION
+    return ms if ms > 0 else DEFAULT_DURATION
+
+
+def swipe_direction(start, end):
+    """手指移动的方向：起点 (500, 900) 到终点 (500, 100) 为 up"""
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    if abs(dx) > abs(dy):
+        return "right" if dx > 0 else "left"
+    return "down" if dy > 0 else "up"
+
+
+def parse_action(text):
+    """
+    从模型输出中取出第一个 JSON 对象并规范化为 action_data；解析失败返回 {"action": "invalid", "raw": text}
+    """
+    match = re.search(r"\{.*\}", text or "", re.S)
+    try:
+        data = json.loads(match.group(0)) if match else None
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        return {"action": "invalid", "raw": text}
+
+    action = str(data.get("action", "")).lower()
+    if action in ("click", "press"):
+        action = "tap"
+    if action in ("scroll", "slide", "drag"):
+        action = "swipe"
+
+    if action == "tap":
+        pos = _point(data.get("position") or data.get("point") or data.get("start"))
+        if pos is None:
+            return {"action": "invalid", "raw": text}
+        return {"action": "tap", "position": pos}
+
+    if action == "swipe":
+        start, end = _point(data.get("start")), _point(data.get("end"))
+        if start is None or end is None:
+            return {"action": "invalid", "raw": text}
+        return {
+            "action": "swipe",
+            "start": start,
+            "end": end,
+            # 以坐标为准，模型写的 direction 可能与坐标矛盾
+            "direction": swipe_direction(start, end),
+            "duration": _duration(data.get("duration")),
+        }
+
+    return {"action": "invalid", "raw": text}
+
+
+# ==========================
+# 模型
+# ==========================
+
+class HeuristicSwiper:
+    """
+    规则桩：根据指令中的关键词判断点击还是滑动、滑动方向和大致位置，不看截图。
+    输出与真实模型相同的 JSON 文本，走同一套解析逻辑；不经过 processor 和 generate，只用于测试传输。
+    """
+
+    name = "heuristic"
+    SWIPE_WORDS = ("swipe", "scroll", "slide", "carousel", "browse", "滑动", "滚动", "浏览")
+    HORIZONTAL_WORDS = ("horizontal", "carousel", "left or right", "left and right", "banner", "progress",
+                        "横向", "左右", "轮播")
+    # 点击位置：(关键词, x, y)，按顺序匹配第一个
+    TAP_ANCHORS = (
+        (("bottom navigation", "tab", "底部"), None, 955),
+        (("popup", "dialog", "allow", "deny", "弹窗"), None, 900),
+        (("menu", "avatar", "profile", "settings", "search", "back", "close", "title",
+          "菜单", "头像", "设置", "搜索", "返回"), None, 65),
+        (("start", "refresh", "center", "中间"), None, 540),
+    )
+
+    def predict_batch(self, images, instructions):
+        return [self._predict(text.lower()) for text in instructions]
+
+    def _predict(self, text):
+        if any(w in text for w in self.SWIPE_WORDS) and "button" not in text:
+            if any(w in text for w in self.HORIZONTAL_WORDS):
+                return json.dumps({"action": "swipe", "start": [900, 500], "end": [100, 500], "duration": 300})
+            return json.dumps({"action": "swipe", "start": [500, 900], "end": [500, 100], "duration": 300})
+
+        x, y = 500, 500
+        for words, ax, ay in self.TAP_ANCHORS:
+            if any(w in text for w in words):
+                x, y = ax or x, ay
+                break
+        if re.search(r"\bleft\b|左", text):
+            x = 80
+        elif re.search(r"\bright\b|右", text):
+            x = 910
+        return json.dumps({"action": "tap", "position": [x, y]})
+
+
+class VLMSwiper:
+    """按路径加载 VLM，批量生成动作 JSON"""
+
+    def __init__(self, model_path, max_new_tokens=64, device_map="auto"):
+        import torch
+        from vlm_backend import load_vlm, model_kind
+        if model_kind(model_path) != "vlm":
+            raise ValueError(f"{model_path} 的 config 没有 vision_config，是纯文本模型，不能根据截图预测动作")
+        dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+        self.name = model_path
+        self.model, self.processor = load_vlm(model_path, device_map=device_map, torch_dtype=dtype)
+        self.max_new_tokens = max_new_tokens
+
+    def predict_batch(self, images, instructions):
+        from vlm_backend import run_vlm_batch
+        prompts = [PROMPT.format(instruction=i) for i in instructions]
+        images = [im.convert("RGB") for im in images]
+        return run_vlm_batch(self.model, self.processor, images, prompts, self.max_new_tokens)
+
+
+TINY_MODEL_DIR = "logs/tiny_qwen2_vl"
+
+
+def load_model(name_or_path, **kwargs):
+    if name_or_path == "heuristic":
+        return HeuristicSwiper()
+    if name_or_path == "tiny":
+        from vlm_backend import build_tiny_vlm
+        kwargs.setdefault("device_map", "cpu")
+        return VLMSwiper(build_tiny_vlm(TINY_MODEL_DIR, corpus=[PROMPT]), **kwargs)
+    return VLMSwiper(name_or_path, **kwargs)
+
+
+# ==========================
+# 动态批处理
+# ==========================
+
+class BatchedPredictor:
+    """
+    请求进入队列，后台线程取出第一个请求后最多再等 max_wait_ms 凑满 max_batch 个，
+    整批交给模型。低负载时几乎不增加延迟，高负载时批次自然变大。
+    """
+
+    def __init__(self, model, max_batch=8, max_wait_ms=20):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "batches": 0, "invalid": 0, "model_time_s": 0.0}
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="guiswiper-batcher")
+        self._thread.start()
+
+    def submit(self, image, instruction):
+        """image 为 PIL.Image（可以是尚未解码的 Image.open 结果）；返回 Future，结果为规范化后的 action_data"""
+        fut = Future()
+        self._queue.put((image, instruction, fut))
+        return fut
+
+    def predict(self, image, instruction, timeout=None):
+        return self.submit(image, instruction).result(timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            t0 = time.perf_counter()
+            try:
+                texts = self.model.predict_batch([b[0] for b in batch], [b[1] for b in batch])
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            actions = []
+            for i in range(len(batch)):
+                # 单条输出异常不能让批处理线程退出，否则之后的请求全部挂起
+                try:
+                    actions.append(parse_action(texts[i]))
+                except Exception as e:
+                    actions.append({"action": "invalid", "raw": str(texts[i]) if i < len(texts) else None,
+                                    "error": str(e)})
+            with self._lock:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["invalid"] += sum(a["action"] == "invalid" for a in actions)
+                self.stats["model_time_s"] += time.perf_counter() - t0
+            for (_, _, fut), action in zip(batch, actions):
+                if not fut.done():
+                    fut.set_result(action)
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats, queued=self._queue.qsize(), max_batch=self.max_batch)
+        out["mean_batch_size"] = round(out["requests"] / out["batches"], 2) if out["batches"] else None
+        out["model_time_s"] = round(out["model_time_s"], 3)
+        return out
@@ -0,0 +1,130 @@
+# guiswiper_server.py
+"""
+GUISwiper 动作预测服务，并发请求在服务端动态攒批:
+
+    GUISWIPER_MODEL=tiny uvicorn guiswiper_server:app --port 8100         # CPU 上的微型随机 VLM
+    GUISWIPER_MODEL=/path/to/GUISwiper uvicorn guiswiper_server:app --port 8100
+
+POST /predict        {"image_base64": ..., "instruction": ...} -> {"action_data": {...}}
+POST /predict_batch  {"items": [{"image_base64", "instruction"}, ...]} -> {"actions": [...]}
+"""
+import base64
+import io
+import os
+import threading
+import time
+from typing import List
+
+from fastapi import FastAPI, HTTPException
+from PIL import Image
+from pydantic import BaseModel
+
+from guiswiper import BatchedPredictor, load_model
+
+GUISWIPER_MODEL = os.environ.get("GUISWIPER_MODEL", "anonymous-uiagent-weights/GUISwiper")
+MAX_BATCH = int(os.environ.get("GUISWIPER_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.environ.get("GUISWIPER_MAX_WAIT_MS", "20"))
+REQUEST_TIMEOUT = float(os.environ.get("GUISWIPER_TIMEOUT", "120"))
+
+predictor = None
+server_state = {"status": "starting", "error": None}
+metrics = {"process_start": time.time(), "load_time_s": None, "requests": 0, "failures": 0,
+           "total_latency_s": 0.0}
+_metrics_lock = threading.Lock()
+
+
+def _load_model_background():
+    global predictor
+    try:
+        server_state["status"] = "loading"
+        t0 = time.time()
+        predictor = BatchedPredictor(load_model(GUISWIPER_MODEL), max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS)
+        metrics["load_time_s"] = round(time.time() - t0, 3)
+        print(f"GUISwiper model {GUISWIPER_MODEL} loaded in {metrics['load_time_s']}s.")
+    except Exception as e:
+        server_state.update(status="failed", error=str(e))
+        print(f"Model loading failed: {e}")
+        return
+    server_state["status"] = "ready"
+
+
+app = FastAPI(title="GUISwiper Action Prediction Server")
+
+
+@app.on_event("startup")
+def start_model():
+    threading.Thread(target=_load_model_background, name="model-loader", daemon=True).start()
+
+
+@app.get("/health")
+def health():
+    if server_state["status"] == "failed":
+        raise HTTPException(status_code=500, detail=server_state["error"])
+    return {"status": server_state["status"]}
+
+
+@app.get("/ready")
+def ready():
+    if server_state["status"] != "ready":
+        raise HTTPException(status_code=503, detail=server_state["status"])
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+def get_metrics():
+    with _metrics_lock:
+        out = dict(metrics)
+    out["status"] = server_state["status"]
+    out["model"] = GUISWIPER_MODEL
+    out["mean_latency_s"] = round(out["total_latency_s"] / out["requests"], 3) if out["requests"] else None
+    if predictor is not None:
+        out["batching"] = predictor.snapshot()
+    return out
+
+
+class PredictRequest(BaseModel):
+    image_base64: str
+    instruction: str
+
+
+class PredictResponse(BaseModel):
+    action_data: dict
+
+
+class PredictBatchRequest(BaseModel):
+    items: List[PredictRequest]
+
+
+class PredictBatchResponse(BaseModel):
+    actions: List[dict]
+
+
+def _predict(items):
+    """items: [(image_base64, instruction)]；逐个提交给批处理器，由它和其他请求一起攒批"""
+    if server_state["status"] != "ready":
+        raise HTTPException(status_code=503, detail=f"model not ready: {server_state['status']}")
+    t0 = time.time()
+    try:
+        futures = [
+            predictor.submit(Image.open(io.BytesIO(base64.b64decode(b64))), instruction)
+            for b64, instruction in items
+        ]
+        actions = [f.result(REQUEST_TIMEOUT) for f in futures]
+    except Exception as e:
+        with _metrics_lock:
+            metrics["failures"] += 1
+        raise HTTPException(status_code=500, detail=str(e))
+    with _metrics_lock:
+        metrics["requests"] += len(items)
+        metrics["total_latency_s"] += time.time() - t0
+    return actions
+
+
+@app.post("/predict", response_model=PredictResponse)
+def predict(req: PredictRequest):
+    return PredictResponse(action_data=_predict([(req.image_base64, req.instruction)])[0])
+
+
+@app.post("/predict_batch", response_model=PredictBatchResponse)
+def predict_batch(req: PredictBatchRequest):
+    return PredictBatchResponse(actions=_predict([(i.image_base64, i.instruction) for i in req.items]))
@@ -0,0 +1,172 @@
+# hierarchy.py
+import io
+import re
+import xml.etree.ElementTree as ET
+
+_BOUNDS_RE = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+# 类名里出现这些关键字的可滚动控件按横向处理
+_HORIZONTAL_HINTS = ("horizontal", "viewpager", "tablayout", "carousel", "banner")
+_WEBVIEW_HINTS = ("webview",)
+
+
+def parse_bounds(text):
+    """'[x1,y1][x2,y2]' -> [x1, y1, x2, y2]，格式不对时返回 None"""
+    m = _BOUNDS_RE.match(text or "")
+    if not m:
+        return None
+    return [int(v) for v in m.groups()]
+
+
+class HierarchyRegionProposer:
+    """
+    基于 uiautomator2 dump_hierarchy 的区域提议器。
+
+    流式解析 XML，提取 scrollable / clickable 节点并转换为与 ExplorationDetector
+    相同格式的区域字典（bbox 为 0-1000 归一化坐标）。
+    当页面被 WebView 占据或节点过少（自绘 UI）时标记为 not informative，交给 VLM 处理。
+    """
+
+    def __init__(self, screen_width, screen_height, min_regions=2, webview_ratio=0.5,
+                 max_clickable=12, max_slidable=6, max_click_area=0.5, min_area=0.0005):
+        self.w = screen_width
+        self.h = screen_height
+        self.min_regions = min_regions
+        self.webview_ratio = webview_ratio
+        self.max_clickable = max_clickable
+        self.max_slidable = max_slidable
+        self.max_click_area = max_click_area
+        self.min_area = min_area
+
+    def propose(self, xml):
+        """
+        返回:
+        {
+            "clickable_regions": [...], "slidable_regions": [...],
+            "informative": bool, "webview_regions": [...], "webview_ratio": float
+        }
+        """
+        if isinstance(xml, str):
+            xml = xml.encode("utf-8")
+
+        clickable, slidable, webviews = [], [], []
+        seen = set()
+        try:
+            for event, elem in ET.iterparse(io.BytesIO(xml), events=("start", "end")):
+                if event == "end":
+                    # 节点属性在 start 时已处理，end 时释放内存
+                    elem.clear()
+                    continue
+                if elem.tag != "node":
+                    continue
+                region = self._node_to_region(elem.attrib)
+                if region is None:
+                    continue
+                key = (region["category"], tuple(region["bbox"]))
+                if key in seen:
+                    continue
+                seen.add(key)
+                if region["category"] == "webview":
+                    webviews.append(region)
+                elif region["category"] == "slidable":
+                    slidable.append(region)
+                else:
+                    clickable.append(region)
+        except ET.ParseError as e:
+            print(f"UI 层次结构解析失败: {e}")
+            return {"clickable_regions": [], "slidable_regions": [], "informative": False,
+                    "webview_regions": [], "webview_ratio": 0.0}
+
+        # 大的滚动容器优先；点击区域保持文档顺序（大致是从上到下）
+        slidable.sort(key=lambda r: -self._area(r["bbox"]))
+        slidable = slidable[:self.max_slidable]
+        clickable = clickable[:self.max_clickable]
+
+        webview_ratio = min(1.0, sum(self._area(r["bbox"]) for r in webviews))
+        informative = (
+            webview_ratio < self.webview_ratio
+            and len(clickable) + len(slidable) >= self.min_regions
+        )
+        return {
+            "clickable_regions": clickable,
+            "slidable_regions": slidable,
+            "informative": informative,
+            "webview_regions": webviews,
+            "webview_ratio": round(webview_ratio, 4)
+        }
+
+    # ==========================
+    # Utilities
+    # ==========================
+
+    @staticmethod
+    def _area(bbox_1000):
+        return max(0.0, bbox_1000[2] - bbox_1000[0]) * max(0.0, bbox_1000[3] - bbox_1000[1]) / 1e6
+
+    def _normalize_bbox(self, bounds):
+        x1, y1, x2, y2 = bounds
+        x1, x2 = max(0, x1), min(self.w, x2)
+        y1, y2 = max(0, y1), min(self.h, y2)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return [
+            round(x1 / self.w * 1000, 1),
+            round(y1 / self.h * 1000, 1),
+            round(x2 / self.w * 1000, 1),
+            round(y2 / self.h * 1000, 1)
+        ]
+
+    def _node_to_region(self, attrib):
+        if attrib.get("visible-to-user", "true") != "true":
+            return None
+        bounds = parse_bounds(attrib.get("bounds"))
+        if bounds is None:
+            return None
+        bbox = self._normalize_bbox(bounds)
+        if bbox is None or self._area(bbox) < self.min_area:
+            return None
+
+        cls = attrib.get("class", "")
+        cls_lower = cls.lower()
+        short_type = cls.rsplit(".", 1)[-1] or "View"
+        description = (attrib.get("text") or attrib.get("content-desc")
+                       or attrib.get("resource-id", "").rsplit("/", 1)[-1] or short_type)
+
+        if any(k in cls_lower for k in _WEBVIEW_HINTS):
+            return {"category": "webview", "type": short_type, "bbox": bbox, "description": description}
+
+        if attrib.get("scrollable") == "true":
+            return {
+                "category": "slidable",
+                "type": short_type,
+                "direction": self._infer_direction(cls_lower, bbox),
+                "bbox": bbox,
+                "description": description,
+                "interaction": "swipe",
+                "source": "hierarchy"
+            }
+
+        if attrib.get("clickable") == "true" or attrib.get("long-clickable") == "true":
+            # 覆盖大半个屏幕的可点击节点通常是容器，点它没有意义
+            if self._area(bbox) > self.max_click_area:
+                return None
+            return {
+                "category": "clickable",
+                "type": short_type,
+                "bbox": bbox,
+                "description": description,
+                "interaction": "click" if attrib.get("clickable") == "true" else "long_press",
+                "source": "hierarchy"
+            }
+        return None
+
+    def _infer_direction(self, cls_lower, bbox):
+        if any(k in cls_lower for k in _HORIZONTAL_HINTS):
+            return "horizontal"
+        if "scrollview" in cls_lower:
+            # (Nested)ScrollView 只能纵向滚动，HorizontalScrollView 已在上面处理
+            return "vertical"
+        # RecyclerView / ListView 等方向不确定，按像素长宽比判断，宽扁的视为横向
+        width_px = (bbox[2] - bbox[0]) * self.w / 1000
+        height_px = (bbox[3] - bbox[1]) * self.h / 1000
+        return "horizontal" if width_px > 2 * height_px else "vertical"
@@ -0,0 +1,218 @@
+# inference_client.py
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class NoHealthyEndpoint(requests.RequestException):
+    """所有推理节点的熔断器都处于打开状态"""
+
+
+class _Endpoint:
+    """一个推理节点：keep-alive 连接池 + 在途请求计数 + 熔断器状态"""
+
+    def __init__(self, url, pool_size):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.outstanding = 0
+        self.state = "closed"          # closed / open / half_open
+        self.failures = 0              # 连续失败次数
+        self.opened_at = 0.0
+        self.ewma_latency = None
+        self.stats = {"requests": 0, "failures": 0, "hedges": 0}
+
+    def snapshot(self):
+        return dict(self.stats, url=self.url, state=self.state, outstanding=self.outstanding,
+                    ewma_latency_s=round(self.ewma_latency, 3) if self.ewma_latency else None)
+
+
+class InferenceClient:
+    """
+    面向多个推理节点的 HTTP 客户端：
+
+    - 每个节点一个 requests.Session，复用 keep-alive 连接
+    - 选择在途请求最少的节点（相同时选 EWMA 延迟较低的）
+    - 连接错误 / 超时 / 5xx 时按带抖动的指数退避重试，优先换一个节点
+    - 连续失败 failure_threshold 次后熔断该节点，reset_timeout 秒后放一个探测请求（half-open）
+    - 请求耗时超过近期 p95 仍未返回时，向另一个节点发一个对冲请求，取先返回的结果
+    """
+
+    def __init__(self, urls, timeout=180, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 failure_threshold=3, reset_timeout=30.0, hedge=True, hedge_quantile=0.95,
+                 hedge_min_samples=20, pool_size=8):
+        if isinstance(urls, str):
+            urls = [u for u in urls.split(",") if u.strip()]
+        if not urls:
+            raise ValueError("至少需要一个推理节点地址")
+        self.endpoints = [_Endpoint(u.strip(), pool_size) for u in urls]
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.endpoints)),
+                                            thread_name_prefix="infer-client")
+
+    # ==========================
+    # 节点选择 / 熔断
+    # ==========================
+
+    def _available(self, ep, now):
+        if ep.state == "closed":
+            return True
+        if ep.state == "open" and now - ep.opened_at >= self.reset_timeout:
+            return True
+        # half_open 时只放行一个探测请求
+        return ep.state == "half_open" and ep.outstanding == 0
+
+    def _acquire(self, exclude=(), strict=False):
+        """
+        选出一个节点并占用一个在途名额；没有可用节点时返回 None。
+        exclude 中的节点只在没有其他选择且 strict=False 时才会被选中。
+        """
+        with self._lock:
+            now = time.time()
+            candidates = [ep for ep in self.endpoints if self._available(ep, now)]
+            preferred = [ep for ep in candidates if ep not in exclude]
+            if not preferred and not strict:
+                preferred = candidates
+            if not preferred:
+                return None
+            ep = min(preferred, key=lambda e: (e.outstanding, e.ewma_latency or 0.0, random.random()))
+            if ep.state == "open":
+                ep.state = "half_open"
+                print(f"[InferenceClient] {ep.url} 熔断超时，发送探测请求")
+            ep.outstanding += 1
+            ep.stats["requests"] += 1
+            return ep
+
+    def _release(self, ep, ok, latency=None):
+        with self._lock:
+            ep.outstanding -= 1
+            if ok:
+                ep.failures = 0
+                if ep.state != "closed":
+                    print(f"[InferenceClient] {ep.url} 恢复")
+                ep.state = "closed"
+                if latency is not None:
+                    ep.ewma_latency = latency if ep.ewma_latency is None else 0.8 * ep.ewma_latency + 0.2 * latency
+                    self._latencies.append(latency)
+                return
+            ep.failures += 1
+            ep.stats["failures"] += 1
+            if ep.state == "half_open" or ep.failures >= self.failure_threshold:
+                if ep.state != "open":
+                    print(f"[InferenceClient] {ep.url} 连续失败 {ep.failures} 次，熔断 {self.reset_timeout}s")
+                ep.state = "open"
+                ep.opened_at = time.time()
+
+    def _latency_quantile(self):
+        lat = sorted(self._latencies)
+        return lat[min(len(lat) - 1, int(len(lat) * self.hedge_quantile))] if lat else None
+
+    def _hedge_delay(self):
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            return self._latency_quantile()
+
+    # ==========================
+    # 请求
+    # ==========================
+
+    @staticmethod
+    def _retryable(exc):
+        if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+            return True
+        resp = getattr(exc, "response", None)
+        return resp is not None and (resp.status_code >= 500 or resp.status_code == 429)
+
+    def _send(self, ep, path, payload, headers):
+        t0 = time.time()
+        try:
+            resp = ep.session.post(f"{ep.url}{path}", json=payload, headers=headers, timeout=self.timeout)
+            resp.raise_for_status()
+            body = resp.json()
+        except Exception as e:
+            # 4xx 是请求本身的问题，不计入节点健康度
+            self._release(ep, ok=not self._retryable(e))
+            raise
+        self._release(ep, ok=True, latency=time.time() - t0)
+        return body
+
+    def _send_hedged(self, ep, path, payload, headers):
+        delay = self._hedge_delay() if self.hedge else None
+        if delay is None:
+            return self._send(ep, path, payload, headers)
+
+        primary = self._executor.submit(self._send, ep, path, payload, headers)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        backup_ep = self._acquire(exclude=(ep,), strict=True)
+        if backup_ep is None:
+            return primary.result()
+        backup_ep.stats["hedges"] += 1
+        print(f"[InferenceClient] {ep.url} 超过 p95 ({delay:.1f}s) 未返回，对冲到 {backup_ep.url}")
+        backup = self._executor.submit(self._send, backup_ep, path, payload, headers)
+
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    # 落后的请求无法中断，让它在后台完成并释放在途计数
+                    return f.result()
+                error = f.exception()
+        raise error
+
+    def post(self, path, payload, headers=None):
+        """向某个健康节点发送 POST 请求，返回 JSON；重试用尽后抛出最后一个异常"""
+        tried = []
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # full jitter：[0, min(max, base * 2^n)] 内均匀随机，避免多个 explorer 同时重试
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+            ep = self._acquire(exclude=tried)
+            if ep is None:
+                error = NoHealthyEndpoint("所有推理节点均已熔断")
+                continue
+            tried.append(ep)
+            try:
+                return self._send_hedged(ep, path, payload, headers)
+            except Exception as e:
+                if not self._retryable(e):
+                    raise
+                error = e
+                print(f"[InferenceClient] {ep.url}{path} 失败 (第 {attempt + 1} 次): {e}")
+        raise error
+
+    def stats(self):
+        with self._lock:
+            p = self._latency_quantile()
+            return {
+                "endpoints": [ep.snapshot() for ep in self.endpoints],
+                f"p{int(self.hedge_quantile * 100)}_latency_s": round(p, 3) if p is not None else None
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        for ep in self.endpoints:
+            ep.session.close()
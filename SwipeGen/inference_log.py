@@ -0,0 +1,148 @@
+# inference_log.py
+import gzip
+import hashlib
+import json
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+class InferenceLogWriter:
+    """
+    推理日志的后台写入器。
+
+    - 请求线程只做一次 put_nowait，队列满时直接丢弃并计数，绝不阻塞推理
+    - 后台线程按批写入，按大小 / 时间轮转，轮转后的文件 gzip 压缩
+    - prompt 只在 prompts.jsonl 中存一次，日志里只记录其哈希
+    """
+
+    def __init__(self, log_dir="logs", name="inference_log", max_queue=10000,
+                 batch_size=256, flush_interval=1.0,
+                 max_bytes=64 * 1024 * 1024, rotate_interval=24 * 3600):
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(exist_ok=True)
+        self.log_file = self.log_dir / f"{name}.jsonl"
+        self.prompt_file = self.log_dir / "prompts.jsonl"
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._known_prompts = self._load_prompt_hashes()
+        self._opened_at = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="inference-log", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def prompt_hash(prompt):
+        return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+    def log(self, prompt, response, meta=None):
+        """在请求线程中调用，只入队，不做任何 IO"""
+        entry = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "prompt": prompt,
+            "response": response,
+            "meta": meta or {}
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    # ==========================
+    # 后台线程
+    # ==========================
+
+    def _load_prompt_hashes(self):
+        known = set()
+        if self.prompt_file.exists():
+            with open(self.prompt_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        known.add(json.loads(line)["hash"])
+                    except (ValueError, KeyError):
+                        continue
+        return known
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._drain()
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    print(f"写入推理日志失败: {e}")
+            try:
+                self._maybe_rotate()
+            except Exception as e:
+                print(f"推理日志轮转失败: {e}")
+
+    def _drain(self):
+        """阻塞到第一条日志或 flush_interval 超时，然后尽量凑满一批"""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        log_lines, prompt_lines = [], []
+        for entry in batch:
+            prompt = entry.pop("prompt")
+            h = self.prompt_hash(prompt)
+            if h not in self._known_prompts:
+                self._known_prompts.add(h)
+                prompt_lines.append(json.dumps({"hash": h, "prompt": prompt}, ensure_ascii=False))
+            entry["prompt_hash"] = h
+            log_lines.append(json.dumps(entry, ensure_ascii=False))
+
+        # 先写 prompt 表，保证日志里引用的哈希总能查到
+        if prompt_lines:
+            with open(self.prompt_file, "a", encoding="utf-8") as f:
+                f.write("\n".join(prompt_lines) + "\n")
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write("\n".join(log_lines) + "\n")
+
+    def _maybe_rotate(self):
+        if not self.log_file.exists():
+            self._opened_at = time.time()
+            return
+        too_big = self.log_file.stat().st_size >= self.max_bytes
+        too_old = time.time() - self._opened_at >= self.rotate_interval
+        if not (too_big or too_old):
+            return
+
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        rotated = self.log_file.with_name(f"{self.log_file.stem}.{stamp}.jsonl")
+        n = 1
+        while Path(f"{rotated}.gz").exists():
+            rotated = self.log_file.with_name(f"{self.log_file.stem}.{stamp}_{n}.jsonl")
+            n += 1
+        self.log_file.rename(rotated)
+        self._opened_at = time.time()
+
+        with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        rotated.unlink()
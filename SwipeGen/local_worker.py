@@ -0,0 +1,331 @@
+# local_worker.py
+"""
+同机推理 worker：explorer 与模型在同一台机器上时，截图经共享内存环形缓冲区传给模型进程，
+连接上只传 (共享内存名, 偏移, 形状) 这样的小描述符，省掉 PNG 编码、base64 和 HTTP。
+
+    python local_worker.py --address /tmp/swipegen_worker.sock              # 启动 worker，加载默认模型
+    ExplorationDetector("local:///tmp/swipegen_worker.sock")                 # explorer 端
+
+连接走 multiprocessing 的 pickle 协议，拿到 authkey 就能在模型进程里执行任意代码，因此:
+- authkey 取环境变量 LOCAL_WORKER_AUTHKEY；未设置时 worker 启动时生成随机密钥，写入地址旁的 0600 文件
+  （Unix socket 为 <path>.key，TCP 为 ~/.swipegen/worker_<port>.key），同一用户的客户端从这里读取
+- TCP 地址只允许回环地址（127.0.0.1 / ::1 / localhost），跨机器请用 remote_server
+
+一个 worker 同时服务多个 explorer 进程：每个客户端进程创建自己的环形缓冲区，worker 按名字挂载，
+把槽位包装成 HxWx3 的 numpy 视图直接交给 processor（HF 图像处理器接受 numpy 数组），worker 端不拷贝像素。
+客户端写入槽位是唯一一次拷贝。BaseManager 为每个连接分配一个服务线程，
+请求在模型注册表上并发执行（与 remote_server 单进程模式相同）。
+"""
+import argparse
+import hashlib
+import ipaddress
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+
+import numpy as np
+
+# 一个槽位放一帧 RGB 原始像素，默认够 1440x3200
+DEFAULT_SLOT_BYTES = 1440 * 3200 * 3
+
+
+def _is_loopback(host):
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return bool(infos) and all(ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos)
+
+
+def parse_address(url):
+    """
+    local:///tmp/x.sock -> Unix socket 路径；local://127.0.0.1:50051 -> (host, port)。
+    TCP 只接受回环地址，否则抛出 ValueError
+    """
+    rest = url[len("local://"):] if url.startswith("local://") else url
+    if rest.startswith("/"):
+        return rest
+    host, port = rest.rsplit(":", 1)
+    host = host.strip("[]")
+    if not _is_loopback(host):
+        raise ValueError(f"本地 worker 只能监听 / 连接回环地址，{host} 不是；跨机器请用 remote_server")
+    return host, int(port)
+
+
+def key_path(address):
+    """address 对应的密钥文件：Unix socket 放在 socket 旁边，TCP 放在 ~/.swipegen 下"""
+    if isinstance(address, str):
+        return Path(address + ".key")
+    return Path.home() / ".swipegen" / f"worker_{address[1]}.key"
+
+
+def load_authkey(address):
+    """客户端：优先环境变量，其次 worker 写出的密钥文件"""
+    if os.environ.get("LOCAL_WORKER_AUTHKEY"):
+        return os.environ["LOCAL_WORKER_AUTHKEY"].encode()
+    path = key_path(address)
+    try:
+        return path.read_bytes().strip()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"找不到 worker 密钥 {path}：worker 未启动，或请设置 LOCAL_WORKER_AUTHKEY") from None
+
+
+def create_authkey(address):
+    """worker：使用环境变量中的密钥，未设置时生成随机密钥写入 0600 文件"""
+    if os.environ.get("LOCAL_WORKER_AUTHKEY"):
+        return os.environ["LOCAL_WORKER_AUTHKEY"].encode()
+    path = key_path(address)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    if path.exists():
+        path.unlink()
+    # O_EXCL + 0600：文件从创建起就只有当前用户可读，不存在先宽后收的窗口
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    print(f"[LocalWorker] 密钥已写入 {path}")
+    return key
+
+
+class WorkerManager(BaseManager):
+    pass
+
+
+# 客户端只需要名字；worker 进程在 serve() 中注册实际的服务对象
+WorkerManager.register("worker")
+
+
+# ======================
+# 客户端（explorer 进程）
+# ======================
+
+class FrameRing:
+    """
+    客户端进程私有的共享内存环形缓冲区。槽位数即该进程可同时在途的请求数，槽位用完时 write() 阻塞等待。
+    """
+
+    def __init__(self, slots=4, slot_bytes=DEFAULT_SLOT_BYTES):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self._free = queue.Queue()
+        for i in range(slots):
+            self._free.put(i)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @contextmanager
+    def write(self, image):
+        """把一帧写入空闲槽位，返回描述符；退出上下文后槽位归还（worker 必须已经用完这帧）"""
+        arr = image if isinstance(image, np.ndarray) else np.asarray(image.convert("RGB"))
+        if arr.dtype != np.uint8 or arr.ndim != 3 or arr.shape[2] != 3:
+            raise ValueError(f"只支持 HxWx3 的 uint8 RGB 帧: {arr.dtype} {arr.shape}")
+        if arr.nbytes > self.slot_bytes:
+            raise ValueError(f"帧大小 {arr.nbytes} 超过槽位 {self.slot_bytes} 字节，调大 slot_bytes")
+        slot = self._free.get()
+        try:
+            offset = slot * self.slot_bytes
+            dst = np.ndarray(arr.shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+            dst[...] = arr
+            del dst
+            yield {"shm": self.shm.name, "offset": offset, "shape": list(arr.shape)}
+        finally:
+            self._free.put(slot)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class LocalWorkerClient:
+    """
+    与 InferenceClient.post 接口相同，ExplorationDetector 不需要区分传输方式。
+    payload 中的 "image"（PIL.Image 或 HxWx3 uint8 数组）经共享内存传递，其余字段走连接。
+    """
+
+    def __init__(self, url, slots=4, slot_bytes=DEFAULT_SLOT_BYTES, authkey=None):
+        self.url = url
+        address = parse_address(url)
+        self._manager = WorkerManager(address=address, authkey=authkey or load_authkey(address))
+        self._manager.connect()
+        self._worker = self._manager.worker()
+        self.ring = FrameRing(slots, slot_bytes)
+        self._worker.attach(self.ring.name)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "frame_bytes": 0, "latency_s": 0.0}
+
+    def post(self, path, payload, headers=None):
+        if path not in ("/infer", "/infer_multi"):
+            raise ValueError(f"本地 worker 不支持 {path}")
+        payload = dict(payload)
+        image = payload.pop("image", None)
+        t0 = time.time()
+        if image is None:
+            result = self._worker.infer(None, payload)
+            nbytes = 0
+        else:
+            with self.ring.write(image) as frame:
+                result = self._worker.infer(frame, payload)
+            nbytes = int(np.prod(frame["shape"]))
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["frame_bytes"] += nbytes
+            self._stats["latency_s"] += time.time() - t0
+        return {"texts": result} if "prompts" in payload else {"text": result}
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, latency_s=round(self._stats["latency_s"], 3), url=self.url)
+
+    def close(self):
+        try:
+            self._worker.detach(self.ring.name)
+        except (EOFError, OSError):
+            pass
+        self.ring.close()
+
+
+# ======================
+# worker 进程
+# ======================
+
+def _attach(name):
+    """挂载客户端创建的共享内存；生命周期归客户端管，worker 退出时不能把它删掉"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 没有 track 参数
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class WorkerService:
+    """在 worker 进程内执行推理；所有客户端连接共享同一个实例"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._rings = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "failures": 0, "frame_bytes": 0, "total_latency_s": 0.0}
+
+    def attach(self, name):
+        with self._lock:
+            if name not in self._rings:
+                self._rings[name] = _attach(name)
+                print(f"[LocalWorker] 客户端已连接: {name} ({len(self._rings)} 个)")
+
+    def detach(self, name):
+        with self._lock:
+            shm = self._rings.pop(name, None)
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                # 仍有帧视图未释放，交给 GC
+                pass
+            print(f"[LocalWorker] 客户端已断开: {name}")
+
+    def infer(self, frame, payload):
+        """frame: FrameRing.write() 的描述符或 None（纯文本请求）；返回文本（prompts 时为列表）"""
+        t0 = time.time()
+        payload = dict(payload)
+        try:
+            if frame is not None:
+                with self._lock:
+                    shm = self._rings.get(frame["shm"])
+                if shm is None:
+                    raise ValueError(f"未 attach 的共享内存: {frame['shm']}")
+                h, w, _ = frame["shape"]
+                # 零拷贝：numpy 数组直接引用共享内存中的像素，只读防止模型端误改客户端的帧
+                view = np.ndarray((h, w, 3), dtype=np.uint8, buffer=shm.buf, offset=frame["offset"])
+                view.flags.writeable = False
+                payload["image"] = view
+                # 视觉缓存的键直接对共享内存中的像素求哈希
+                payload["image_key"] = f"{w}x{h}:{hashlib.blake2b(view, digest_size=16).hexdigest()}"
+                del view
+            result = self.registry.run(payload)
+        except Exception:
+            with self._lock:
+                self._stats["failures"] += 1
+            raise
+        finally:
+            # 返回后客户端会复用该槽位，这里不能再持有像素
+            payload.pop("image", None)
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["frame_bytes"] += h * w * 3 if frame is not None else 0
+            self._stats["total_latency_s"] += time.time() - t0
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self._stats, clients=len(self._rings))
+        out["total_latency_s"] = round(out["total_latency_s"], 3)
+        if hasattr(self.registry, "snapshot"):
+            out["registry"] = self.registry.snapshot()
+        return out
+
+
+class _StubRegistry:
+    """不加载模型，回显图片尺寸和 prompt，用于在 CPU 上测试传输"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def run(self, payload):
+        time.sleep(self.delay)
+        image = payload.get("image")
+        size = f"{image.shape[1]}x{image.shape[0]}" if image is not None else "-"
+        if "prompts" in payload:
+            return [f"[stub {size}] {p[:32]}" for p in payload["prompts"]]
+        return f"[stub {size}] {payload.get('prompt', '')[:32]}"
+
+
+def serve(address, registry, authkey=None):
+    authkey = authkey or create_authkey(address)
+    service = WorkerService(registry)
+    WorkerManager.register("worker", callable=lambda: service)
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)
+    server = WorkerManager(address=address, authkey=authkey).get_server()
+    print(f"[LocalWorker] 监听 {address}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Same-host inference worker with shared-memory frame transfer")
+    parser.add_argument("--address", default="/tmp/swipegen_worker.sock",
+                        help="Unix socket 路径，或 host:port")
+    parser.add_argument("--registry", default=os.environ.get("MODEL_REGISTRY"), help="模型注册表 JSON")
+    parser.add_argument("--model-path", default=os.environ.get("MODEL_PATH", "/data/model/Qwen3-VL-4B-Instruct"))
+    parser.add_argument("--vision-cache-mb", type=int, default=int(os.environ.get("VISION_CACHE_MB", "2048")))
+    parser.add_argument("--max-new-tokens", type=int, default=1600)
+    parser.add_argument("--stub", action="store_true", help="不加载模型，只测试传输")
+    args = parser.parse_args()
+
+    if args.stub:
+        registry = _StubRegistry()
+    else:
+        from model_registry import ModelRegistry
+
+        kwargs = {"vision_cache_mb": args.vision_cache_mb, "max_new_tokens": args.max_new_tokens}
+        if args.registry:
+            registry = ModelRegistry.from_file(args.registry, **kwargs)
+        else:
+            name = Path(args.model_path.rstrip("/")).name
+            registry = ModelRegistry({name: {"path": args.model_path, "kind": "vlm"}}, **kwargs)
+        registry.ensure_loaded(registry.default)
+    serve(parse_address(args.address), registry)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+# model_pool.py
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from model_registry import ModelBudgetExceeded, ModelNotFound, ModelRegistry
+
+# 这些异常原样传回路由端，由服务端映射成 404 / 503 / 400，其余异常只传回消息
+_PASSTHROUGH_ERRORS = (ModelNotFound, ModelBudgetExceeded, ValueError)
+
+
+# ======================
+# 工作进程
+# ======================
+
+def _make_handler(backend, worker_id, backend_kwargs):
+    """在工作进程内构造推理函数 handler(payload) -> text"""
+    if backend == "stub":
+        delay = float(backend_kwargs.get("delay", 0.05))
+
+        def handler(payload):
+            time.sleep(delay)
+            if "prompts" in payload:
+                return [f"[stub worker {worker_id}] {p[:32]}" for p in payload["prompts"]]
+            return f"[stub worker {worker_id}] {payload.get('prompt', '')[:32]}"
+        return handler
+
+    if backend == "vlm":
+        import torch
+
+        device_map = "auto"
+        if torch.cuda.is_available():
+            # CUDA_VISIBLE_DEVICES 已在父进程中设置，本进程只看得到一张卡
+            device_map = {"": 0}
+        kwargs = dict(backend_kwargs.get("registry") or {})
+        if "specs" not in kwargs:
+            name = Path(backend_kwargs["model_path"]).name
+            kwargs["specs"] = {name: {"path": backend_kwargs["model_path"], "kind": "vlm"}}
+            kwargs.setdefault("max_new_tokens", backend_kwargs.get("max_new_tokens", 1600))
+            kwargs.setdefault("vision_cache_mb", backend_kwargs.get("vision_cache_mb", 0))
+            kwargs.setdefault("vision_cache_offload", backend_kwargs.get("vision_cache_offload", False))
+        registry = ModelRegistry(device_map=device_map, **kwargs)
+        # 默认模型加载并预热完成后才向路由端报告 ready，其他模型按请求懒加载
+        registry.ensure_loaded(registry.default)
+        return registry.run
+
+    raise ValueError(f"未知的 backend: {backend}")
+
+
+def _worker_main(worker_id, conn, backend, backend_kwargs, cpu_ids, num_threads):
+    if cpu_ids and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpu_ids)
+    if num_threads:
+        try:
+            import torch
+            torch.set_num_threads(num_threads)
+        except ImportError:
+            pass
+
+    try:
+        handler = _make_handler(backend, worker_id, backend_kwargs)
+    except Exception as e:
+        conn.send(("error", None, f"worker init failed: {e}"))
+        return
+    conn.send(("ready", None, None))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        if msg is None:
+            return
+        kind, req_id, payload = msg
+        if kind == "ping":
+            conn.send(("pong", req_id, None))
+            continue
+        try:
+            conn.send(("ok", req_id, handler(payload)))
+        except _PASSTHROUGH_ERRORS as e:
+            conn.send(("error", req_id, e))
+        except Exception as e:
+            conn.send(("error", req_id, str(e)))
+
+
+# ======================
+# 路由端
+# ======================
+
+def _numa_cpu_sets():
+    """读取 /sys 下的 NUMA 节点 CPU 列表，读不到时返回单节点"""
+    nodes = []
+    for node_dir in sorted(Path("/sys/devices/system/node").glob("node[0-9]*")):
+        try:
+            text = (node_dir / "cpulist").read_text().strip()
+        except OSError:
+            continue
+        cpus = []
+        for part in text.split(","):
+            if "-" in part:
+                a, b = part.split("-")
+                cpus.extend(range(int(a), int(b) + 1))
+            elif part:
+                cpus.append(int(part))
+        if cpus:
+            nodes.append(cpus)
+    if not nodes and hasattr(os, "sched_getaffinity"):
+        nodes = [sorted(os.sched_getaffinity(0))]
+    return nodes
+
+
+def cpu_partitions(num_workers):
+    """把 CPU 按 NUMA 节点切成 num_workers 份，节点够多时一个 worker 独占一个节点"""
+    nodes = _numa_cpu_sets()
+    if not nodes:
+        return [None] * num_workers
+    if len(nodes) >= num_workers:
+        return nodes[:num_workers]
+    cpus = [c for node in nodes for c in node]
+    chunk = max(1, len(cpus) // num_workers)
+    return [cpus[i * chunk:(i + 1) * chunk] or cpus for i in range(num_workers)]
+
+
+class _Worker:
+    def __init__(self, worker_id, device, cpu_ids):
+        self.worker_id = worker_id
+        self.device = device
+        self.cpu_ids = cpu_ids
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.ready = False
+        self.outstanding = {}   # req_id -> (future, start_time)
+        self.last_pong = 0.0
+        self.restarts = 0
+        self.served = 0
+        self.ever_ready = False   # 本次启动后是否报告过 ready
+        self.init_failures = 0    # 连续的初始化失败次数（加载模型报错 / 就绪前进程退出）
+        self.retry_at = None      # 初始化失败后下次重启的时间
+        self.failed = False       # 连续失败次数达到上限，不再重启
+        self.last_error = None
+
+
+class ModelPool:
+    """
+    多进程模型池：每个 GPU（或每个 NUMA 节点的 CPU）一个工作进程，
+    前端按最少未完成请求数分发，后台线程做健康检查并重启挂掉的 worker。
+
+    初始化失败（模型路径错误、OOM 等）重启也没用：按 init_backoff 起步指数退避（上限 max_backoff 秒），
+    连续 max_init_failures 次后把 worker 标记为 failed，不再重启，错误见 stats()。
+    """
+
+    def __init__(self, num_workers, backend="vlm", backend_kwargs=None, devices=None,
+                 request_timeout=600, health_interval=5.0, max_init_failures=5, init_backoff=1.0,
+                 max_backoff=60.0):
+        self.backend = backend
+        self.backend_kwargs = backend_kwargs or {}
+        self.request_timeout = request_timeout
+        self.health_interval = health_interval
+        self.max_init_failures = max_init_failures
+        self.init_backoff = init_backoff
+        self.max_backoff = max_backoff
+        self._ctx = mp.get_context("spawn")
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        if devices is None:
+            devices = self._default_devices(num_workers)
+        cpu_sets = cpu_partitions(num_workers) if any(d == "cpu" for d in devices) else [None] * num_workers
+        self.workers = [
+            _Worker(i, devices[i], cpu_sets[i] if devices[i] == "cpu" else None)
+            for i in range(num_workers)
+        ]
+
+    def _default_devices(self, num_workers):
+        if self.backend == "vlm":
+            try:
+                import torch
+                n_gpu = torch.cuda.device_count()
+            except ImportError:
+                n_gpu = 0
+            if n_gpu:
+                return [f"cuda:{i % n_gpu}" for i in range(num_workers)]
+        return ["cpu"] * num_workers
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        for w in self.workers:
+            self._spawn(w)
+        self._collector = threading.Thread(target=self._collect_loop, name="pool-collector", daemon=True)
+        self._health = threading.Thread(target=self._health_loop, name="pool-health", daemon=True)
+        self._collector.start()
+        self._health.start()
+
+    def stop(self):
+        self._stop.set()
+        for w in self.workers:
+            try:
+                with w.send_lock:
+                    w.conn.send(None)
+            except Exception:
+                pass
+        for w in self.workers:
+            if w.process is not None:
+                w.process.join(5)
+                if w.process.is_alive():
+                    w.process.kill()
+
+    def _spawn(self, w):
+        parent_conn, child_conn = self._ctx.Pipe()
+        env_backup = os.environ.get("CUDA_VISIBLE_DEVICES")
+        if w.device.startswith("cuda"):
+            # spawn 出来的子进程继承当前环境，只暴露分配给它的那张卡
+            os.environ["CUDA_VISIBLE_DEVICES"] = w.device.split(":")[1]
+        num_threads = len(w.cpu_ids) if w.cpu_ids else None
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(w.worker_id, child_conn, self.backend, self.backend_kwargs, w.cpu_ids, num_threads),
+            name=f"model-worker-{w.worker_id}",
+            daemon=True
+        )
+        try:
+            proc.start()
+        finally:
+            if w.device.startswith("cuda"):
+                if env_backup is None:
+                    os.environ.pop("CUDA_VISIBLE_DEVICES", None)
+                else:
+                    os.environ["CUDA_VISIBLE_DEVICES"] = env_backup
+        child_conn.close()
+        w.process, w.conn = proc, parent_conn
+        w.ready = False
+        w.ever_ready = False
+        w.last_error = None
+        w.last_pong = time.time()
+        print(f"启动 worker {w.worker_id} (device={w.device}, pid={proc.pid})")
+
+    def _restart(self, w, reason):
+        print(f"重启 worker {w.worker_id}: {reason}")
+        with self._lock:
+            pending = list(w.outstanding.values())
+            w.outstanding.clear()
+            w.ready = False
+        for fut, _ in pending:
+            if not fut.done():
+                fut.set_exception(RuntimeError(f"worker {w.worker_id} failed: {reason}"))
+        if w.process.is_alive():
+            w.process.kill()
+        w.process.join(5)
+        try:
+            w.conn.close()
+        except Exception:
+            pass
+        w.restarts += 1
+        self._spawn(w)
+
+    # ---------- 请求分发 ----------
+
+    def submit(self, payload):
+        """把请求发给未完成请求最少的就绪 worker，返回 Future"""
+        fut = Future()
+        req_id = next(self._ids)
+        with self._lock:
+            candidates = [w for w in self.workers if w.ready and w.process.is_alive()]
+            if not candidates:
+                raise RuntimeError("没有可用的模型 worker")
+            w = min(candidates, key=lambda x: len(x.outstanding))
+            w.outstanding[req_id] = (fut, time.time())
+        try:
+            with w.send_lock:
+                w.conn.send(("infer", req_id, payload))
+        except Exception as e:
+            with self._lock:
+                w.outstanding.pop(req_id, None)
+            fut.set_exception(RuntimeError(f"发送到 worker {w.worker_id} 失败: {e}"))
+        return fut
+
+    def infer(self, payload, timeout=None):
+        return self.submit(payload).result(timeout or self.request_timeout)
+
+    def is_ready(self):
+        return any(w.ready for w in self.workers)
+
+    def _init_failed(self, w, now):
+        """
+        worker 在就绪前退出：第一次发现时计数并安排退避后的重启，返回是否已到重启时间。
+        达到 max_init_failures 时标记为 failed
+        """
+        if w.retry_at is None:
+            w.init_failures += 1
+            if w.init_failures >= self.max_init_failures:
+                w.failed = True
+                print(f"worker {w.worker_id} 连续 {w.init_failures} 次初始化失败，不再重启: {w.last_error}")
+                return False
+            delay = min(self.max_backoff, self.init_backoff * 2 ** (w.init_failures - 1))
+            w.retry_at = now + delay
+            print(f"worker {w.worker_id} 初始化失败 ({w.init_failures}/{self.max_init_failures})，"
+                  f"{delay:.1f}s 后重启: {w.last_error}")
+        if now < w.retry_at:
+            return False
+        w.retry_at = None
+        return True
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "worker_id": w.worker_id,
+                    "device": w.device,
+                    "pid": w.process.pid if w.process else None,
+                    "alive": bool(w.process and w.process.is_alive()),
+                    "ready": w.ready,
+                    "outstanding": len(w.outstanding),
+                    "served": w.served,
+                    "restarts": w.restarts,
+                    "init_failures": w.init_failures,
+                    "failed": w.failed,
+                    "last_error": w.last_error
+                }
+                for w in self.workers
+            ]
+
+    # ---------- 后台线程 ----------
+
+    def _collect_loop(self):
+        while not self._stop.is_set():
+            conns = {w.conn: w for w in self.workers if w.conn is not None and not w.conn.closed}
+            try:
+                ready = wait(list(conns), timeout=0.5)
+            except OSError:
+                continue
+            for conn in ready:
+                w = conns[conn]
+                try:
+                    kind, req_id, result = conn.recv()
+                except (EOFError, OSError):
+                    # 进程已退出，关掉管道避免空转，交给健康检查线程重启
+                    w.ready = False
+                    conn.close()
+                    continue
+                # 任何消息都说明 worker 还活着；只靠 pong 的话，加载 / 长请求刚结束的 worker 会被误判心跳超时
+                w.last_pong = time.time()
+                if kind == "ready":
+                    w.ready = True
+                    w.ever_ready = True
+                    w.init_failures = 0
+                    print(f"worker {w.worker_id} 就绪")
+                    continue
+                if kind == "pong":
+                    continue
+                with self._lock:
+                    entry = w.outstanding.pop(req_id, None)
+                    if kind == "ok":
+                        w.served += 1
+                if entry is None:
+                    if kind == "error":
+                        w.last_error = str(result)
+                        print(f"worker {w.worker_id} 错误: {result}")
+                    continue
+                fut, _ = entry
+                if kind == "ok":
+                    fut.set_result(result)
+                else:
+                    fut.set_exception(result if isinstance(result, Exception) else RuntimeError(result))
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            now = time.time()
+            for w in self.workers:
+                if w.failed:
+                    continue
+                if not w.process.is_alive():
+                    if not w.ever_ready:
+                        if w.last_error is None:
+                            w.last_error = f"就绪前进程退出 (exitcode={w.process.exitcode})"
+                        if not self._init_failed(w, now):
+                            continue
+                    self._restart(w, f"进程退出 (exitcode={w.process.exitcode})")
+                    continue
+                with self._lock:
+                    oldest = min((t for _, t in w.outstanding.values()), default=None)
+                    idle = not w.outstanding
+                if oldest is not None and now - oldest > self.request_timeout:
+                    self._restart(w, "请求超时")
+                    continue
+                if w.ready and idle:
+                    # 忙碌的 worker 不会回 ping，只对空闲的做心跳检查
+                    if now - w.last_pong > 3 * self.health_interval:
+                        self._restart(w, "心跳超时")
+                        continue
+                    try:
+                        with w.send_lock:
+                            w.conn.send(("ping", None, None))
+                    except Exception as e:
+                        self._restart(w, f"心跳发送失败: {e}")
+
+
+def main():
+    """CPU 上用 stub worker 做路由 / 重启的冒烟测试"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ModelPool smoke test with stub workers")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--kill-one", action="store_true", help="中途杀掉一个 worker 验证自动重启")
+    args = parser.parse_args()
+
+    pool = ModelPool(args.workers, backend="stub", backend_kwargs={"delay": args.delay}, health_interval=0.5)
+    pool.start()
+    while sum(w.ready for w in pool.workers) < args.workers:
+        time.sleep(0.05)
+
+    t0 = time.time()
+    futures = [pool.submit({"prompt": f"request {i}"}) for i in range(args.requests)]
+    if args.kill_one:
+        pool.workers[0].process.kill()
+    ok = failed = 0
+    for fut in futures:
+        try:
+            fut.result(30)
+            ok += 1
+        except Exception:
+            failed += 1
+    elapsed = time.time() - t0
+    print(f"完成 {ok} 个请求, 失败 {failed} 个, 用时 {elapsed:.2f}s, "
+          f"吞吐 {ok / elapsed:.1f} req/s (单 worker 理论值 {1 / args.delay:.1f} req/s)")
+
+    if args.kill_one:
+        deadline = time.time() + 10
+        while time.time() < deadline and not pool.workers[0].ready:
+            time.sleep(0.1)
+    for s in pool.stats():
+        print(s)
+    pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+# model_registry.py
+"""
+多模型注册表：按名字懒加载模型，在内存预算内保留常用模型，超出预算时卸载最久未使用的模型。
+
+配置是一个 JSON 文件（remote_server 通过 MODEL_REGISTRY 环境变量指定），例如:
+
+    {
+      "default": "qwen3-vl-4b",
+      "models": {
+        "qwen3-vl-4b": {"path": "/data/model/Qwen3-VL-4B-Instruct", "kind": "vlm"},
+        "qwen3-vl-8b": {"path": "/data/model/Qwen3-VL-8B-Instruct", "kind": "vlm", "max_new_tokens": 1024},
+        "guiswiper":   {"path": "anonymous-uiagent-weights/GUISwiper", "kind": "vlm", "fast_decode": true},
+        "qwen3-vl-8b-spec": {"path": "/data/model/Qwen3-VL-8B-Instruct", "kind": "vlm",
+                             "speculative": {"mode": "draft", "draft": "/data/model/Qwen3-VL-2B-Instruct"}}
+      }
+    }
+
+kind: "vlm" 为图文模型（可带图片，支持视觉缓存）；"causal_lm" 为纯文本模型。
+fast_decode: 启用静态 KV cache + torch.compile 的解码路径（见 fast_decode.py），不写时取注册表的默认值。
+speculative: 推测解码配置（见 speculative.py），{"mode": "draft", "draft": 草稿模型路径} 或 {"mode": "prompt_lookup"}；
+  与 fast_decode 的静态 cache 不兼容，两者同时配置时只启用推测解码。
+"""
+import base64
+import gc
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+KINDS = ("vlm", "causal_lm")
+
+
+class ModelNotFound(KeyError):
+    pass
+
+
+class ModelBudgetExceeded(RuntimeError):
+    """所有常驻模型都在使用中，腾不出足够的内存加载请求的模型"""
+
+
+def _weights_size(path):
+    """本地模型目录中权重文件的总大小，作为加载前的内存估计；远端 repo id 返回 0"""
+    p = Path(path)
+    if not p.is_dir():
+        return 0
+    return sum(f.stat().st_size for pattern in ("*.safetensors", "*.bin") for f in p.glob(pattern))
+
+
+def default_memory_budget():
+    """默认预算：所有 GPU 显存的 90%；无 GPU 时为物理内存的 80%"""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return int(0.9 * sum(torch.cuda.get_device_properties(i).total_memory
+                                 for i in range(torch.cuda.device_count())))
+    except ImportError:
+        pass
+    return int(0.8 * os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE"))
+
+
+class _Loaded:
+    def __init__(self, name, spec, model, processor, vision_cache, nbytes, decoder=None, speculator=None):
+        self.name = name
+        self.spec = spec
+        self.kind = spec["kind"]
+        self.model = model
+        self.processor = processor
+        self.vision_cache = vision_cache
+        self.decoder = decoder
+        self.speculator = speculator
+        self.nbytes = nbytes
+        self.in_use = 0
+        self.last_used = time.time()
+        self.loaded_at = time.time()
+        self.requests = 0
+        self.load_time_s = 0.0
+        self.warmup_time_s = 0.0
+
+
+class ModelRegistry:
+    """
+    :param specs: {name: {"path", "kind", 可选 "max_new_tokens", "dtype", "size_gb"}}
+    :param default: 请求未指定模型时使用的名字
+    :param memory_budget: 常驻模型的总字节数上限（含视觉缓存），None 表示按设备自动估计
+    :param vision_cache_mb: 每个 VLM 的视觉缓存上限，0 关闭
+    :param pinned: 常驻不卸载的模型名（默认模型总是常驻）
+    :param fast_decode: 模型未单独配置时是否启用快速解码路径
+    :param speculative: 模型未单独配置时的推测解码配置，None 关闭
+    """
+
+    def __init__(self, specs, default=None, memory_budget=None, vision_cache_mb=0,
+                 vision_cache_offload=False, device_map="auto", max_new_tokens=1600, pinned=(),
+                 fast_decode=False, speculative=None):
+        for name, spec in specs.items():
+            spec.setdefault("kind", "vlm")
+            if spec["kind"] not in KINDS:
+                raise ValueError(f"模型 {name} 的 kind 必须是 {KINDS} 之一: {spec['kind']}")
+            if "path" not in spec:
+                raise ValueError(f"模型 {name} 缺少 path")
+        self.specs = specs
+        self.default = default or next(iter(specs))
+        self.memory_budget = memory_budget or default_memory_budget()
+        self.vision_cache_mb = vision_cache_mb
+        self.vision_cache_offload = vision_cache_offload
+        self.device_map = device_map
+        self.max_new_tokens = max_new_tokens
+        self.fast_decode = fast_decode
+        self.speculative = speculative
+        self.pinned = set(pinned) | {self.default}
+        self._loaded = {}
+        self._lock = threading.Condition()
+        self._loading = {}     # name -> Event，同一模型只加载一次
+        self._reserved = {}    # 正在加载的模型预占的字节数
+        self.stats = {"loads": 0, "evictions": 0, "load_time_s": 0.0}
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        return cls(cfg["models"], default=cfg.get("default"), pinned=cfg.get("pinned", ()), **kwargs)
+
+    # ==========================
+    # 加载 / 卸载
+    # ==========================
+
+    def _estimate(self, spec):
+        size = int(spec.get("size_gb", 0) * (1 << 30)) or _weights_size(spec["path"])
+        speculative = spec.get("speculative", self.speculative)
+        if speculative and speculative.get("mode") == "draft":
+            size += _weights_size(speculative["draft"])
+        if spec["kind"] == "vlm":
+            size += self.vision_cache_mb << 20
+        return size
+
+    def _used(self):
+        return sum(m.nbytes for m in self._loaded.values()) + sum(self._reserved.values())
+
+    def _make_room(self, needed, keep=None):
+        """按最久未使用顺序卸载空闲、未固定的模型（keep 除外），直到装得下；调用方持有锁"""
+        victims = sorted((m for m in self._loaded.values()
+                          if m.in_use == 0 and m.name not in self.pinned and m.name != keep),
+                         key=lambda m: m.last_used)
+        while self._used() + needed > self.memory_budget and victims:
+            self._unload(victims.pop(0).name)
+        return self._used() + needed <= self.memory_budget
+
+    def _unload(self, name):
+        m = self._loaded.pop(name)
+        print(f"[ModelRegistry] 卸载 {name} ({m.nbytes / 2**30:.1f} GB)")
+        self.stats["evictions"] += 1
+        del m
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def _load(self, name):
+        import torch
+        from fast_decode import FastDecode
+        from speculative import load_speculator
+        from vision_cache import VisionCache
+        from vlm_backend import load_causal_lm, load_vlm, warmup
+
+        spec = self.specs[name]
+        dtype = getattr(torch, spec.get("dtype", "float16" if torch.cuda.is_available() else "float32"))
+        print(f"[ModelRegistry] 加载 {name}: {spec['path']} ({spec['kind']})")
+        t0 = time.time()
+        cache = decoder = speculator = None
+        draft_bytes = 0
+        warmup_s = 0.0
+        speculative = spec.get("speculative", self.speculative)
+        if spec["kind"] == "vlm":
+            model, processor = load_vlm(spec["path"], device_map=self.device_map, torch_dtype=dtype)
+            if self.vision_cache_mb:
+                cache = VisionCache(self.vision_cache_mb << 20, offload=self.vision_cache_offload).install(model)
+        else:
+            model, processor = load_causal_lm(spec["path"], device_map=self.device_map, torch_dtype=dtype)
+        if speculative:
+            # 草稿模型与目标模型同类（VLM 配 VLM，纯文本配纯文本），除非配置里显式指定 kind
+            speculative = dict(speculative)
+            speculative.setdefault("kind", spec["kind"])
+            speculator, draft_bytes = load_speculator(model, speculative, device_map=self.device_map,
+                                                      torch_dtype=dtype)
+        elif spec.get("fast_decode", self.fast_decode):
+            decoder = FastDecode(model, processor).install()
+        if spec["kind"] == "vlm":
+            t1 = time.time()
+            warmup(model, processor)
+            warmup_s = time.time() - t1
+        nbytes = sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+        nbytes += draft_bytes
+        if cache is not None:
+            nbytes += cache.max_bytes
+        elapsed = time.time() - t0
+        self.stats["loads"] += 1
+        self.stats["load_time_s"] += elapsed
+        print(f"[ModelRegistry] {name} 就绪, {nbytes / 2**30:.1f} GB, 用时 {elapsed:.1f}s")
+        loaded = _Loaded(name, spec, model, processor, cache, nbytes, decoder, speculator)
+        loaded.load_time_s = round(elapsed - warmup_s, 3)
+        loaded.warmup_time_s = round(warmup_s, 3)
+        return loaded
+
+    def ensure_loaded(self, name):
+        """确保模型已加载，必要时先卸载其他模型腾出预算"""
+        if name not in self.specs:
+            raise ModelNotFound(name)
+        with self._lock:
+            while True:
+                if name in self._loaded:
+                    return self._loaded[name]
+                event = self._loading.get(name)
+                if event is None:
+                    needed = self._estimate(self.specs[name])
+                    if not self._make_room(needed):
+                        raise ModelBudgetExceeded(
+                            f"加载 {name} 需要约 {needed / 2**30:.1f} GB，"
+                            f"当前占用 {self._used() / 2**30:.1f} / {self.memory_budget / 2**30:.1f} GB 且均在使用中"
+                        )
+                    event = self._loading[name] = threading.Event()
+                    self._reserved[name] = needed
+                    break
+                self._lock.wait_for(event.is_set)
+
+        loaded = None
+        try:
+            loaded = self._load(name)
+        finally:
+            with self._lock:
+                self._reserved.pop(name)
+                if loaded is not None:
+                    self._loaded[name] = loaded
+                    # 实际占用可能比估计的大，再检查一次
+                    self._make_room(0, keep=name)
+                self._loading.pop(name).set()
+                self._lock.notify_all()
+        return loaded
+
+    @contextmanager
+    def acquire(self, name=None):
+        """借用一个模型；借用期间不会被卸载"""
+        name = name or self.default
+        while True:
+            loaded = self.ensure_loaded(name)
+            with self._lock:
+                # 加载完成到这里之间可能已被别的请求挤出去
+                if self._loaded.get(name) is loaded:
+                    loaded.in_use += 1
+                    break
+        try:
+            yield loaded
+        finally:
+            with self._lock:
+                loaded.in_use -= 1
+                loaded.requests += 1
+                loaded.last_used = time.time()
+
+    def unload(self, name):
+        with self._lock:
+            if name in self._loaded and self._loaded[name].in_use == 0:
+                self._unload(name)
+                return True
+            return False
+
+    # ==========================
+    # 推理
+    # ==========================
+
+    def run(self, payload):
+        """
+        执行一个推理请求。payload: {"model"?, "prompt" | "prompts", "image_base64"?, "max_new_tokens"?, "speculative"?}
+        同机 worker（local_worker.py）直接传入 "image"（PIL.Image 或 HxWx3 uint8 数组）和 "image_key"，不经过 base64。
+        speculative 为 True / False 时覆盖模型的推测解码默认开关（模型未配置推测解码时无效）。
+        返回文本（prompts 时为文本列表）
+        """
+        from speculative import speculation
+        from PIL import Image
+        from vision_cache import image_key
+        from vlm_backend import run_text, run_vlm, run_vlm_multi
+
+        with self.acquire(payload.get("model")) as m, speculation(payload.get("speculative")):
+            max_new_tokens = payload.get("max_new_tokens") or m.spec.get("max_new_tokens", self.max_new_tokens)
+            prompts = payload["prompts"] if "prompts" in payload else [payload["prompt"]]
+            if m.kind == "causal_lm":
+                if payload.get("image_base64") or payload.get("image") is not None:
+                    raise ValueError(f"模型 {m.name} 是纯文本模型，不接受图片输入")
+                texts = [run_text(m.model, m.processor, p, max_new_tokens) for p in prompts]
+            else:
+                if payload.get("image") is not None:
+                    image = payload["image"]
+                    key = (payload.get("image_key") or image_key(image)) if m.vision_cache is not None else None
+                elif payload.get("image_base64"):
+                    image_bytes = base64.b64decode(payload["image_base64"])
+                    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+                    key = image_key(image_bytes) if m.vision_cache is not None else None
+                else:
+                    raise ValueError(f"模型 {m.name} 需要图片输入")
+                if "prompts" in payload:
+                    return run_vlm_multi(m.model, m.processor, image, prompts, max_new_tokens, image_key=key)
+                return run_vlm(m.model, m.processor, image, prompts[0], max_new_tokens, image_key=key)
+        return texts if "prompts" in payload else texts[0]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "default": self.default,
+                "memory_budget_gb": round(self.memory_budget / 2**30, 2),
+                "used_gb": round(self._used() / 2**30, 2),
+                "stats": dict(self.stats),
+                "models": {
+                    name: dict(
+                        kind=spec["kind"],
+                        path=spec["path"],
+                        loaded=name in self._loaded,
+                        loading=name in self._loading,
+                        pinned=name in self.pinned,
+                        **({
+                            "gb": round(self._loaded[name].nbytes / 2**30, 2),
+                            "in_use": self._loaded[name].in_use,
+                            "requests": self._loaded[name].requests,
+                            "idle_s": round(time.time() - self._loaded[name].last_used, 1),
+                            "vision_cache": self._loaded[name].vision_cache.snapshot()
+                            if self._loaded[name].vision_cache else None,
+                            "decode": self._loaded[name].decoder.snapshot()
+                            if self._loaded[name].decoder else None,
+                            "speculative": self._loaded[name].speculator.snapshot()
+                            if self._loaded[name].speculator else None,
+                        } if name in self._loaded else {})
+                    )
+                    for name, spec in self.specs.items()
+                }
+            }
@@ -0,0 +1,80 @@
+# region_cache.py
+"""
+按画面内容缓存区域检测结果。
+
+同一个 App 的首页在多次探索之间、或者 L2 回退后再次遇到的页面，往往和之前检测过的某一帧几乎一样。
+用 256 位 dHash 作为画面指纹，汉明距离不超过 max_hamming 时直接复用之前的检测结果，省掉一次 VLM 往返。
+结果按 App 分组保存在 JSON 文件中，跨进程、跨运行复用。
+"""
+import copy
+import json
+import threading
+import time
+from pathlib import Path
+
+from device_controller import frame_dhash, hamming
+
+
+class RegionCache:
+    """
+    :param path: 持久化文件；None 时只在内存中
+    :param max_hamming: 256 位 dHash 的汉明距离上限，越小越保守
+    :param max_entries: 每个 App 最多保存的页面数，超出时淘汰最久未命中的
+    """
+
+    def __init__(self, path=None, max_hamming=6, max_entries=200):
+        self.path = Path(path) if path else None
+        self.max_hamming = max_hamming
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.stats = {'hits': 0, 'misses': 0}
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"区域缓存读取失败，忽略: {e}")
+
+    @staticmethod
+    def key(image):
+        """PIL.Image -> 256 位 dHash"""
+        return frame_dhash(image, size=16)
+
+    @staticmethod
+    def _strip(regions):
+        # 去掉探索过程中附加的 _act_type / _priority 等临时字段
+        return {k: [{f: v for f, v in r.items() if not f.startswith('_')} for r in rs]
+                for k, rs in regions.items() if isinstance(rs, list)}
+
+    def get(self, app, key):
+        with self._lock:
+            best = None
+            for entry in self._entries.get(app, []):
+                d = hamming(int(entry['dhash'], 16), key)
+                if d <= self.max_hamming and (best is None or d < best[0]):
+                    best = (d, entry)
+            if best is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            best[1]['last_hit'] = time.time()
+            return copy.deepcopy(best[1]['regions'])
+
+    def put(self, app, key, regions):
+        with self._lock:
+            entries = self._entries.setdefault(app, [])
+            entries.append({'dhash': f"{key:064x}", 'regions': self._strip(regions), 'last_hit': time.time()})
+            if len(entries) > self.max_entries:
+                entries.sort(key=lambda e: e['last_hit'])
+                del entries[:len(entries) - self.max_entries]
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = json.dumps(self._entries, ensure_ascii=False)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(data, encoding='utf-8')
+        tmp.replace(self.path)
@@ -1,19 +1,21 @@
 # remote_server.py
-import base64
-import io
-import torch
-from PIL import Image
-from fastapi import FastAPI, HTTPException
+import os
+import threading
+import time
+from fastapi import FastAPI, Header, HTTPException
 from pydantic import BaseModel
-from transformers import AutoModelForImageTextToText, AutoProcessor
+from typing import List, Optional
 
-import json
-from datetime import datetime
-from pathlib import Path
+import atexit
 
-LOG_DIR = Path("logs")
-LOG_DIR.mkdir(exist_ok=True)
-LOG_FILE = LOG_DIR / "inference_log.jsonl"
+import tracing
+from inference_log import InferenceLogWriter
+from model_pool import ModelPool
+from model_registry import ModelBudgetExceeded, ModelNotFound, ModelRegistry
+
+# 日志在后台线程中批量写入，不占用推理请求的时间
+inference_logger = InferenceLogWriter("logs")
+atexit.register(inference_logger.close)
 
 
 # ======================
@@ -22,22 +24,114 @@ LOG_FILE = LOG_DIR / "inference_log.jsonl"
 MODEL_PATH = "/home/xiyuan/data/model/Qwen3-VL-4B-Instruct"
 MAX_NEW_TOKENS = 1600
 
+# 多模型：MODEL_REGISTRY 指向模型注册表 JSON（格式见 model_registry.py），请求通过 "model" 字段选择模型，
+# 未设置时只注册 MODEL_PATH 一个模型。MODEL_MEMORY_GB 为常驻模型的总预算，超出时卸载最久未使用的模型
+MODEL_REGISTRY = os.environ.get("MODEL_REGISTRY")
+MODEL_MEMORY_GB = float(os.environ.get("MODEL_MEMORY_GB", "0"))
+
+# NUM_WORKERS > 0 时进入多 worker 模式：每个 GPU / NUMA 节点一个模型进程，由前端路由
+# WORKER_BACKEND=stub 可在 CPU 上用假 worker 测试路由
+NUM_WORKERS = int(os.environ.get("NUM_WORKERS", "0"))
+WORKER_BACKEND = os.environ.get("WORKER_BACKEND", "vlm")
+
+# 视觉编码缓存上限（MB），0 表示关闭；VISION_CACHE_OFFLOAD=1 时缓存放在 CPU 内存
+VISION_CACHE_MB = int(os.environ.get("VISION_CACHE_MB", "2048"))
+VISION_CACHE_OFFLOAD = os.environ.get("VISION_CACHE_OFFLOAD") == "1"
+
+# FAST_DECODE=1：静态 KV cache + torch.compile + 按历史输出长度设定生成预算（见 fast_decode.py）
+FAST_DECODE = os.environ.get("FAST_DECODE") == "1"
+
+# 推测解码（见 speculative.py），模型未在注册表中单独配置时使用:
+#   SPECULATIVE=prompt_lookup             用 prompt 中的 n-gram 提出候选，不需要额外模型
+#   SPECULATIVE=draft:/data/model/xxx     用同系列小模型作草稿
+# SPECULATIVE_ENDPOINTS 限定默认启用的接口（逗号分隔，如 "infer_multi"），不设时所有接口都启用；
+# 请求体的 speculative 字段优先级最高
+SPECULATIVE = os.environ.get("SPECULATIVE", "")
+SPECULATIVE_ENDPOINTS = os.environ.get("SPECULATIVE_ENDPOINTS")
+
 # ======================
-# 初始化模型（只执行一次）
+# 模型状态（后台加载，进程启动后立即可以响应 /health）
 # ======================
-print("Loading model...")
-model = AutoModelForImageTextToText.from_pretrained(
-    MODEL_PATH,
-    torch_dtype=torch.float16,
-    device_map="auto",
-    trust_remote_code=True
-)
-processor = AutoProcessor.from_pretrained(
-    MODEL_PATH,
-    trust_remote_code=True
-)
-model.eval()
-print("Model loaded.")
+registry = pool = None
+server_state = {"status": "starting", "error": None}
+metrics = {
+    "process_start": time.time(),
+    "load_time_s": None,
+    "warmup_time_s": None,
+    "ready_after_s": None,
+    "first_request_latency_s": None,
+    "requests": 0,
+    "failures": 0,
+    "total_latency_s": 0.0,
+}
+_metrics_lock = threading.Lock()
+
+
+def _registry_config():
+    """(specs, default, pinned)：来自 MODEL_REGISTRY 文件，或只含 MODEL_PATH 的单模型配置"""
+    if MODEL_REGISTRY:
+        import json
+        with open(MODEL_REGISTRY, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        return cfg["models"], cfg.get("default"), cfg.get("pinned", [])
+    name = os.path.basename(MODEL_PATH.rstrip("/"))
+    return {name: {"path": MODEL_PATH, "kind": "vlm"}}, name, []
+
+
+def _speculative_config():
+    if not SPECULATIVE:
+        return None
+    if SPECULATIVE.startswith("draft:"):
+        return {"mode": "draft", "draft": SPECULATIVE[len("draft:"):]}
+    return {"mode": SPECULATIVE}
+
+
+def _speculative_for(endpoint, requested):
+    """请求未指定时按 SPECULATIVE_ENDPOINTS 决定该接口是否启用；返回 None 表示使用模型默认"""
+    if requested is not None or SPECULATIVE_ENDPOINTS is None:
+        return requested
+    return endpoint in {e.strip() for e in SPECULATIVE_ENDPOINTS.split(",")}
+
+
+def _registry_kwargs(num_workers=1):
+    budget = int(MODEL_MEMORY_GB * (1 << 30) / num_workers) if MODEL_MEMORY_GB else None
+    specs, default, pinned = _registry_config()
+    return {"specs": specs, "default": default, "pinned": pinned, "memory_budget": budget,
+            "vision_cache_mb": VISION_CACHE_MB, "vision_cache_offload": VISION_CACHE_OFFLOAD,
+            "max_new_tokens": MAX_NEW_TOKENS, "fast_decode": FAST_DECODE,
+            "speculative": _speculative_config()}
+
+
+def _load_model_background():
+    global registry
+    try:
+        server_state["status"] = "loading"
+        registry = ModelRegistry(**_registry_kwargs())
+        print(f"Loading default model {registry.default}...")
+        # 只预加载默认模型，其他模型在第一次被请求时加载
+        loaded = registry.ensure_loaded(registry.default)
+        metrics["load_time_s"] = loaded.load_time_s
+        metrics["warmup_time_s"] = loaded.warmup_time_s
+        print(f"Model loaded in {metrics['load_time_s']}s, warmup {metrics['warmup_time_s']}s.")
+    except Exception as e:
+        server_state.update(status="failed", error=str(e))
+        print(f"Model loading failed: {e}")
+        return
+    metrics["ready_after_s"] = round(time.time() - metrics["process_start"], 3)
+    server_state["status"] = "ready"
+
+
+def _watch_pool_ready():
+    # 池模式下 worker 自己加载 + 预热，第一个 worker 就绪即可接流量
+    while not pool.is_ready():
+        time.sleep(0.5)
+    metrics["ready_after_s"] = round(time.time() - metrics["process_start"], 3)
+    server_state["status"] = "ready"
+
+
+def is_ready():
+    return server_state["status"] == "ready"
+
 
 # ======================
 # FastAPI
@@ -45,75 +139,179 @@ print("Model loaded.")
 app = FastAPI(title="Remote VLM Inference Server")
 
 
+@app.on_event("startup")
+def start_model():
+    global pool
+    if NUM_WORKERS > 0:
+        pool = ModelPool(
+            NUM_WORKERS,
+            backend=WORKER_BACKEND,
+            backend_kwargs={"model_path": MODEL_PATH, "max_new_tokens": MAX_NEW_TOKENS,
+                            "registry": _registry_kwargs(NUM_WORKERS)}
+        )
+        server_state["status"] = "loading"
+        pool.start()
+        threading.Thread(target=_watch_pool_ready, daemon=True).start()
+    else:
+        threading.Thread(target=_load_model_background, name="model-loader", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_pool():
+    if pool is not None:
+        pool.stop()
+
+
+@app.get("/health")
+def health():
+    """存活检查：进程在运行即返回 200，加载失败时返回 500"""
+    if server_state["status"] == "failed":
+        raise HTTPException(status_code=500, detail=server_state["error"])
+    return {"status": server_state["status"]}
+
+
+@app.get("/ready")
+def ready():
+    """就绪检查：模型加载并预热完成才返回 200，编排系统据此决定是否路由流量"""
+    if not is_ready():
+        raise HTTPException(status_code=503, detail=server_state["status"])
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+def get_metrics():
+    with _metrics_lock:
+        out = dict(metrics)
+    out["status"] = server_state["status"]
+    out["mean_latency_s"] = round(out["total_latency_s"] / out["requests"], 3) if out["requests"] else None
+    if registry is not None:
+        out["models"] = registry.snapshot()
+    return out
+
+
+@app.get("/models")
+def models():
+    """已注册的模型及其加载状态；池模式下每个 worker 各自维护一份注册表"""
+    if registry is not None:
+        return registry.snapshot()
+    specs, default, _ = _registry_config()
+    return {"default": default, "models": {n: {"kind": s.get("kind", "vlm"), "path": s["path"]}
+                                           for n, s in specs.items()}}
+
+
+@app.post("/models/{name}/load")
+def load_model(name: str):
+    """提前加载某个模型（如 A/B 测试前预热），避免第一个请求承担加载时间"""
+    if registry is None:
+        raise HTTPException(status_code=400, detail="pool mode: models are loaded inside workers on demand")
+    try:
+        registry.ensure_loaded(name)
+    except ModelNotFound:
+        raise HTTPException(status_code=404, detail=f"unknown model: {name}")
+    except ModelBudgetExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return registry.snapshot()["models"][name]
+
+
 class InferRequest(BaseModel):
     prompt: str
+    # 纯文本模型（kind=causal_lm）不需要图片
+    image_base64: Optional[str] = None
+    # 模型注册表中的名字，不填使用默认模型
+    model: Optional[str] = None
+    # 是否使用推测解码，不填按接口 / 模型的默认配置
+    speculative: Optional[bool] = None
+
+
+class InferMultiRequest(BaseModel):
+    prompts: List[str]
     image_base64: str
+    model: Optional[str] = None
+    speculative: Optional[bool] = None
+
+
+class InferMultiResponse(BaseModel):
+    texts: List[str]
+    trace: Optional[List[dict]] = None
 
 
 class InferResponse(BaseModel):
     text: str
+    # 请求带 traceparent 头时，返回服务端的 span，客户端合并到同一条时间线
+    trace: Optional[List[dict]] = None
 
 
-@app.post("/infer", response_model=InferResponse)
-def infer(req: InferRequest):
-    print("Received inference request.")
-    try:
-        # Decode image
-        image_bytes = base64.b64decode(req.image_base64)
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image", "image": image},
-                    {"type": "text", "text": req.prompt}
-                ]
-            }
-        ]
-
-        text = processor.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True
-        )
+@app.get("/workers")
+def workers():
+    if pool is None:
+        return {"mode": "single", "workers": []}
+    return {"mode": "pool", "workers": pool.stats()}
 
-        inputs = processor(
-            text=[text],
-            images=[image],
-            return_tensors="pt",
-            padding=True
-        ).to(model.device)
-
-        with torch.no_grad():
-            output_ids = model.generate(
-                **inputs,
-                max_new_tokens=MAX_NEW_TOKENS,
-                do_sample=False
-            )
 
-        # Trim prompt tokens
-        gen_ids = output_ids[:, inputs.input_ids.shape[1]:]
+def _run(payload):
+    """执行推理：池模式交给 worker，单进程模式交给模型注册表；返回 (结果, 耗时)"""
+    t0 = time.time()
+    try:
+        if pool is not None:
+            with tracing.span("server.pool_infer", model=payload.get("model")):
+                result = pool.infer(payload)
+        else:
+            with tracing.span("server.generate", model=payload.get("model") or registry.default):
+                result = registry.run(payload)
+    except ModelNotFound as e:
+        raise HTTPException(status_code=404, detail=f"unknown model: {e}")
+    except ModelBudgetExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        with _metrics_lock:
+            metrics["failures"] += 1
+        raise HTTPException(status_code=500, detail=str(e))
 
-        result_text = processor.batch_decode(
-            gen_ids,
-            skip_special_tokens=True,
-            clean_up_tokenization_spaces=False
-        )[0]
+    latency = time.time() - t0
+    with _metrics_lock:
+        if metrics["first_request_latency_s"] is None:
+            metrics["first_request_latency_s"] = round(latency, 3)
+        metrics["requests"] += 1
+        metrics["total_latency_s"] += latency
+    return result, latency
 
-        log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "prompt": req.prompt,
-            "response": result_text,
-            "meta": {
-                "max_new_tokens": MAX_NEW_TOKENS
-            }
-        }
 
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+@app.post("/infer", response_model=InferResponse)
+def infer(req: InferRequest, traceparent: Optional[str] = Header(None)):
+    print("Received inference request.")
+    if not is_ready():
+        raise HTTPException(status_code=503, detail=f"model not ready: {server_state['status']}")
+    req.speculative = _speculative_for("infer", req.speculative)
+    with tracing.remote_span(traceparent, "server.infer", model=req.model) as trace:
+        result_text, latency = _run(req.dict(exclude_none=True))
+        inference_logger.log(
+            req.prompt,
+            result_text,
+            meta={"max_new_tokens": MAX_NEW_TOKENS, "latency_s": round(latency, 3), "model": req.model}
+        )
+    return InferResponse(text=result_text, trace=trace.events)
 
-        return InferResponse(text=result_text)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.post("/infer_multi", response_model=InferMultiResponse)
+def infer_multi(req: InferMultiRequest, traceparent: Optional[str] = Header(None)):
+    """
+    同一张图回答多个 prompt（如区域检测 + 指令生成 + 其他标注任务），图片只解码、编码一次。
+    池模式下整个请求交给同一个 worker，保证缓存命中。
+    """
+    if not is_ready():
+        raise HTTPException(status_code=503, detail=f"model not ready: {server_state['status']}")
+    if not req.prompts:
+        raise HTTPException(status_code=400, detail="prompts is empty")
+    req.speculative = _speculative_for("infer_multi", req.speculative)
+    with tracing.remote_span(traceparent, "server.infer_multi", prompts=len(req.prompts), model=req.model) as trace:
+        texts, latency = _run(req.dict(exclude_none=True))
+        for prompt, text in zip(req.prompts, texts):
+            inference_logger.log(
+                prompt,
+                text,
+                meta={"max_new_tokens": MAX_NEW_TOKENS, "latency_s": round(latency / len(texts), 3),
+                      "multi": len(texts), "model": req.model}
+            )
+    return InferMultiResponse(texts=texts, trace=trace.events)
@@ -0,0 +1,330 @@
+# render_gallery.py
+"""
+批量渲染检测结果 / 探索日志的可视化，并生成分页的静态 HTML 画廊。
+
+    # SwipeBench：左边标注，右边模型预测（预测来自 --predictions 或图片旁的 *_result.json）
+    python render_gallery.py swipebench --predictions preds.json --out gallery/swipebench
+
+    # 探索日志：左边执行动作前的截图和动作，右边执行后的截图
+    python render_gallery.py reports logs/ --out gallery/logs
+
+缩略图在进程池中渲染。文件名带有绘制内容（动作、预测）的哈希，已存在且比源图新的缩略图会跳过，
+重复运行只渲染新增或预测有变化的部分。
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+from swipebench import SWIPEBENCH_DIR, detection_hit, load_swipebench
+
+COLORS = {
+    'clickable': (0, 170, 0),
+    'slidable_horizontal': (30, 90, 255),
+    'slidable_vertical': (230, 30, 30),
+    'slidable_both': (150, 40, 200),
+    'gt_ok': (255, 160, 0),
+    'gt_fail': (120, 120, 120),
+}
+
+_FONT = None
+
+
+def _font():
+    global _FONT
+    if _FONT is None:
+        try:
+            _FONT = ImageFont.truetype("arial.ttf", 14)
+        except Exception:
+            _FONT = ImageFont.load_default()
+    return _FONT
+
+
+def region_color(region, clickable):
+    if clickable:
+        return COLORS['clickable']
+    direction = (region.get('direction') or '').lower()
+    if 'horiz' in direction or direction in ('left', 'right'):
+        return COLORS['slidable_horizontal']
+    if 'vert' in direction or direction in ('up', 'down'):
+        return COLORS['slidable_vertical']
+    return COLORS['slidable_both']
+
+
+def _scale_box(bbox, size):
+    w, h = size
+    return [bbox[0] / 1000 * w, bbox[1] / 1000 * h, bbox[2] / 1000 * w, bbox[3] / 1000 * h]
+
+
+def draw_regions(image, results, width=3):
+    """
+    在图上绘制检测结果（bbox 为 0-1000 坐标），可点击区域标 C*，可滑动区域标 S*。
+    直接修改并返回 image；按类别分别遍历，不再对每个区域做列表成员判断。
+    """
+    draw = ImageDraw.Draw(image)
+    for prefix, key in (("C", "clickable_regions"), ("S", "slidable_regions")):
+        clickable = prefix == "C"
+        for i, region in enumerate(results.get(key, [])):
+            box = _scale_box(region['bbox'], image.size)
+            color = region_color(region, clickable)
+            draw.rectangle(box, outline=color, width=width)
+            draw.text((box[0] + 2, max(0, box[1] - 16)), f"{prefix}{i + 1}", fill=color, font=_font())
+    return image
+
+
+def draw_action(image, action, width=3):
+    """绘制一条标注 / 执行过的动作：bbox + 点击点或滑动箭头，成功为橙色，失败为灰色"""
+    draw = ImageDraw.Draw(image)
+    w, h = image.size
+    color = COLORS['gt_ok'] if action.get('success') else COLORS['gt_fail']
+    if action.get('bbox'):
+        draw.rectangle(_scale_box(action['bbox'], image.size), outline=color, width=width)
+    r = max(4, w // 60)
+    if action['action'] == 'tap':
+        if action.get('position'):
+            x, y = action['position'][0] / 1000 * w, action['position'][1] / 1000 * h
+        else:
+            b = _scale_box(action['bbox'], image.size)
+            x, y = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+        draw.ellipse([x - r, y - r, x + r, y + r], outline=color, width=width)
+    elif action.get('start') and action.get('end'):
+        sx, sy = action['start'][0] / 1000 * w, action['start'][1] / 1000 * h
+        ex, ey = action['end'][0] / 1000 * w, action['end'][1] / 1000 * h
+        draw.line([sx, sy, ex, ey], fill=color, width=width)
+        draw.ellipse([ex - r, ey - r, ex + r, ey + r], fill=color)
+    return image
+
+
+# ==========================
+# 进程池任务
+# ==========================
+
+def _open_thumb(path, thumb_width):
+    """先整数倍 reduce 再缩放，避免对 1080x2400 的原图做全分辨率插值"""
+    image = Image.open(path)
+    image.draft("RGB", (thumb_width, thumb_width * 4))
+    image = image.convert("RGB")
+    factor = image.width // thumb_width
+    if factor >= 2:
+        image = image.reduce(factor)
+    if image.width != thumb_width:
+        image = image.resize((thumb_width, round(image.height * thumb_width / image.width)), Image.BILINEAR)
+    return image
+
+
+def render_card(task):
+    """渲染一张左右对比的缩略图；返回 (key, error)"""
+    try:
+        left = _open_thumb(task['image'], task['thumb_width'])
+        right = left.copy() if not task.get('after') else _open_thumb(task['after'], task['thumb_width'])
+        if task.get('action'):
+            draw_action(left, task['action'], width=2)
+        if task.get('pred') is not None:
+            draw_regions(right, task['pred'], width=2)
+        if right.size != left.size:
+            right = right.resize(left.size, Image.BILINEAR)
+        canvas = Image.new("RGB", (left.width * 2 + 6, left.height), (255, 255, 255))
+        canvas.paste(left, (0, 0))
+        canvas.paste(right, (left.width + 6, 0))
+        tmp = task['thumb'] + ".tmp"
+        canvas.save(tmp, format="JPEG", quality=task.get('quality', 80))
+        os.replace(tmp, task['thumb'])
+        return task['key'], None
+    except Exception as e:
+        return task['key'], f"{task['image']}: {e}"
+
+
+# ==========================
+# 数据源
+# ==========================
+
+def swipebench_cards(bench_dir=SWIPEBENCH_DIR, predictions=None, iou_threshold=0.5):
+    """SwipeBench：左边标注动作，右边预测；预测优先取 predictions，其次取图片旁的 *_result.json"""
+    preds = {}
+    if predictions:
+        with open(predictions, "r", encoding="utf-8") as f:
+            preds = json.load(f)
+    for item in load_swipebench(bench_dir):
+        pred = preds.get(item['img_filename'])
+        if pred is None:
+            sidecar = Path(item['img_path']).with_name(Path(item['img_filename']).stem + "_result.json")
+            if sidecar.exists():
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    pred = json.load(f)
+        a = item['action_data']
+        yield {
+            'key': Path(item['img_filename']).stem,
+            'image': item['img_path'],
+            'action': a,
+            'pred': pred,
+            'title': item['img_filename'],
+            'caption': a.get('instruction', ''),
+            'group': item['img_filename'].rsplit('_', 1)[0],
+            'hit': None if pred is None else detection_hit(pred, a, iou_threshold),
+            'labels': [a['action'], a.get('direction') or '', 'success' if a.get('success') else 'fail'],
+        }
+
+
+def report_cards(logs_dir):
+    """探索日志：每个执行过的动作一张卡片，左边执行前 + 动作，右边执行后"""
+    for path in sorted(Path(logs_dir).glob("report_tree_*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        pkg = report.get('app_package', '')
+        for group in ("l1_slides", "l1_clicks"):
+            for i, res in enumerate(report.get('results', {}).get(group, [])):
+                items = [(f"{group}{i}", res)] + [(f"{group}{i}_l2_{j}", sub) for j, sub in
+                                                   enumerate(res.get('l2_exploration') or [])]
+                for name, r in items:
+                    if not r.get('screenshot_before') or not r.get('action_data'):
+                        continue
+                    a = dict(r['action_data'], success=r.get('has_changed', False))
+                    yield {
+                        'key': f"{path.stem}_{name}",
+                        'image': r['screenshot_before'],
+                        'after': r.get('screenshot_after'),
+                        'action': a,
+                        'pred': None,
+                        'title': f"{pkg} · {name}",
+                        'caption': (r.get('region_info') or {}).get('description', ''),
+                        'group': pkg,
+                        'hit': None,
+                        'labels': [a['action'], str(a.get('direction') or ''),
+                                   'changed' if r.get('has_changed') else 'unchanged']
+                                  + ([f"scroll {r['scroll']['offset']}px"] if r.get('scroll') else []),
+                    }
+
+
+# ==========================
+# 渲染 + HTML
+# ==========================
+
+_CSS = """
+body{font-family:sans-serif;margin:16px;background:#f4f4f4}
+.grid{display:flex;flex-wrap:wrap;gap:12px}
+.card{background:#fff;border:2px solid #ddd;border-radius:6px;padding:6px;width:%dpx}
+.card.hit{border-color:#3a3}.card.miss{border-color:#d33}
+.card img{width:100%%;display:block}
+.t{font-size:12px;font-weight:bold;word-break:break-all}.c{font-size:12px;color:#444}
+.l{display:inline-block;font-size:11px;background:#eee;border-radius:3px;padding:0 4px;margin:2px 2px 0 0}
+.nav a{margin-right:8px}
+"""
+
+
+def thumb_name(card, thumb_width):
+    """缩略图文件名：key + 绘制内容的哈希，换了预测文件 / sidecar 后自动失效"""
+    drawn = json.dumps([card.get('action'), card.get('pred'), card.get('after'), thumb_width],
+                       sort_keys=True, ensure_ascii=False, default=str)
+    return f"{card['key']}_{hashlib.blake2b(drawn.encode('utf-8'), digest_size=5).hexdigest()}.jpg"
+
+
+def _page_name(i):
+    return "index.html" if i == 0 else f"page-{i + 1:04d}.html"
+
+
+def write_gallery(cards, out_dir, title, page_size=100, thumb_width=270):
+    out_dir = Path(out_dir)
+    pages = [cards[i:i + page_size] for i in range(0, len(cards), page_size)] or [[]]
+    hits = [c['hit'] for c in cards if c['hit'] is not None]
+    summary = f"{len(cards)} 条"
+    if hits:
+        summary += f" · 预测命中 {sum(hits)}/{len(hits)} ({sum(hits) / len(hits):.1%})"
+
+    for p, page in enumerate(pages):
+        nav = " ".join(
+            f"<b>{i + 1}</b>" if i == p else f'<a href="{_page_name(i)}">{i + 1}</a>' for i in range(len(pages))
+        )
+        body = []
+        for c in page:
+            cls = "" if c['hit'] is None else ("hit" if c['hit'] else "miss")
+            src = os.path.relpath(c['image'], out_dir)
+            body.append(
+                f'<div class="card {cls}"><a href="{html.escape(src)}">'
+                f'<img loading="lazy" src="thumbs/{html.escape(thumb_name(c, thumb_width))}"></a>'
+                f'<div class="t">{html.escape(c["title"])}</div>'
+                f'<div class="c">{html.escape(c["caption"] or "")}</div>'
+                + "".join(f'<span class="l">{html.escape(str(l))}</span>' for l in c['labels'] if l)
+                + "</div>"
+            )
+        with open(out_dir / _page_name(p), "w", encoding="utf-8") as f:
+            f.write(
+                f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+                f"<style>{_CSS % (thumb_width * 2 + 18)}</style></head><body>"
+                f"<h2>{html.escape(title)}</h2><p>{summary} · 左: 标注/执行动作 · 右: 预测/执行后</p>"
+                f"<div class='nav'>{nav}</div><div class='grid'>{''.join(body)}</div>"
+                f"<div class='nav'>{nav}</div></body></html>"
+            )
+    print(f"画廊已生成: {out_dir / 'index.html'} ({len(pages)} 页)")
+
+
+def render(cards, out_dir, thumb_width=270, workers=None, force=False):
+    """渲染所有卡片的缩略图；已是最新的缩略图跳过，绘制内容已变化的旧缩略图删除"""
+    thumbs = Path(out_dir) / "thumbs"
+    thumbs.mkdir(parents=True, exist_ok=True)
+    tasks = []
+    current = set()
+    for c in cards:
+        name = thumb_name(c, thumb_width)
+        current.add(name)
+        thumb = thumbs / name
+        if not os.path.exists(c['image']):
+            continue
+        sources = [c['image']] + ([c['after']] if c.get('after') and os.path.exists(c['after']) else [])
+        if not force and thumb.exists() and thumb.stat().st_mtime >= max(map(os.path.getmtime, sources)):
+            continue
+        tasks.append(dict(c, thumb=str(thumb), thumb_width=thumb_width))
+
+    stale = [p for p in thumbs.glob("*.jpg") if p.name not in current]
+    for p in stale:
+        p.unlink()
+    if stale:
+        print(f"删除 {len(stale)} 张过期缩略图")
+
+    print(f"共 {len(cards)} 条, 需要渲染 {len(tasks)} 张缩略图")
+    errors = 0
+    if tasks:
+        with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+            for key, err in pool.map(render_card, tasks, chunksize=16):
+                if err:
+                    errors += 1
+                    print(f"渲染失败: {err}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render detection overlays and a static HTML gallery")
+    sub = parser.add_subparsers(dest="source", required=True)
+    p_b = sub.add_parser("swipebench")
+    p_b.add_argument("--bench-dir", default=str(SWIPEBENCH_DIR))
+    p_b.add_argument("--predictions", default=None, help="{img_filename: 检测结果} 的 JSON 文件")
+    p_b.add_argument("--iou", type=float, default=0.5)
+    p_r = sub.add_parser("reports")
+    p_r.add_argument("logs_dir")
+    for p in (p_b, p_r):
+        p.add_argument("--out", required=True)
+        p.add_argument("--page-size", type=int, default=100)
+        p.add_argument("--thumb-width", type=int, default=270)
+        p.add_argument("--workers", type=int, default=None)
+        p.add_argument("--force", action="store_true", help="忽略已有缩略图，全部重新渲染")
+    args = parser.parse_args()
+
+    if args.source == "swipebench":
+        cards = list(swipebench_cards(args.bench_dir, args.predictions, args.iou))
+        title = "SwipeBench"
+    else:
+        cards = list(report_cards(args.logs_dir))
+        title = f"Exploration logs: {args.logs_dir}"
+    # 按 app 分组排列，便于逐个 app 翻看
+    cards.sort(key=lambda c: (c['group'], c['key']))
+
+    render(cards, args.out, args.thumb_width, args.workers, args.force)
+    write_gallery(cards, args.out, title, args.page_size, args.thumb_width)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# resolution.py
+import math
+from PIL import Image
+
+# Qwen3-VL: patch 16 x 16，2x2 合并为一个视觉 token，即每 32x32 像素一个 token
+# Qwen2.5-VL 对应的是 28
+DEFAULT_FACTOR = 32
+
+# 预设的视觉 token 预算，1080x2400 原图约 2500 个 token
+TOKEN_BUDGETS = {
+    "tiny": 256,
+    "low": 512,
+    "medium": 1024,
+    "high": 2048,
+}
+
+
+class ResolutionPolicy:
+    """
+    发送给 VLM 前的分辨率策略。
+
+    - scale: 固定缩放比例，与旧行为完全一致（边长 int 截断，不对齐 factor）；detect.py 默认 0.5，
+      1080x2400 -> 540x1200
+    - min_pixels / max_pixels: 像素预算，保持长宽比缩放到预算内，
+      边长对齐到 factor 的整数倍，这样服务端 processor 不会再做二次缩放
+    """
+
+    def __init__(self, min_pixels=None, max_pixels=None, scale=None, factor=DEFAULT_FACTOR):
+        self.min_pixels = min_pixels
+        self.max_pixels = max_pixels
+        self.scale = scale
+        self.factor = factor
+
+    @classmethod
+    def from_tokens(cls, max_tokens, min_tokens=None, factor=DEFAULT_FACTOR):
+        """按视觉 token 数指定预算"""
+        per_token = factor * factor
+        return cls(
+            min_pixels=min_tokens * per_token if min_tokens else None,
+            max_pixels=max_tokens * per_token,
+            factor=factor
+        )
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        从字符串构造，便于命令行使用:
+        "full" / "tiny" / "low" / "medium" / "high" / "scale:0.5" / "tokens:800"
+        """
+        if spec is None or isinstance(spec, cls):
+            return spec
+        spec = str(spec).strip().lower()
+        if spec == "full":
+            return cls()
+        if spec in TOKEN_BUDGETS:
+            return cls.from_tokens(TOKEN_BUDGETS[spec], min_tokens=TOKEN_BUDGETS[spec] // 4)
+        if spec.startswith("scale:"):
+            return cls(scale=float(spec.split(":", 1)[1]))
+        if spec.startswith("tokens:"):
+            return cls.from_tokens(int(spec.split(":", 1)[1]))
+        raise ValueError(f"无法解析的分辨率策略: {spec}")
+
+    def target_size(self, width, height):
+        """返回缩放后的 (width, height)"""
+        if self.scale is not None:
+            width, height = width * self.scale, height * self.scale
+            if not (self.min_pixels or self.max_pixels):
+                return max(1, int(width)), max(1, int(height))
+
+        f = self.factor
+        h_bar = max(f, round(height / f) * f)
+        w_bar = max(f, round(width / f) * f)
+        if self.max_pixels and h_bar * w_bar > self.max_pixels:
+            beta = math.sqrt(height * width / self.max_pixels)
+            h_bar = max(f, math.floor(height / beta / f) * f)
+            w_bar = max(f, math.floor(width / beta / f) * f)
+        elif self.min_pixels and h_bar * w_bar < self.min_pixels:
+            beta = math.sqrt(self.min_pixels / (height * width))
+            h_bar = math.ceil(height * beta / f) * f
+            w_bar = math.ceil(width * beta / f) * f
+        return int(w_bar), int(h_bar)
+
+    def visual_tokens(self, width, height):
+        """估算给定原图尺寸在该策略下的视觉 token 数"""
+        w, h = self.target_size(width, height)
+        # 未对齐的尺寸由服务端 processor 就近取整到 factor 的倍数
+        return max(1, round(w / self.factor)) * max(1, round(h / self.factor))
+
+    def apply(self, image: Image.Image) -> Image.Image:
+        size = self.target_size(image.width, image.height)
+        if size == image.size:
+            return image
+        return image.resize(size, Image.BILINEAR)
+
+    def __repr__(self):
+        if self.scale is not None and not (self.min_pixels or self.max_pixels):
+            return f"ResolutionPolicy(scale={self.scale})"
+        return f"ResolutionPolicy(min_pixels={self.min_pixels}, max_pixels={self.max_pixels})"
@@ -1,3 +1,5 @@
+import os
+
 from app_explorer import AppExplorer
 
 def main():
@@ -49,8 +51,8 @@ def main():
         "Snapchat": "com.snapchat.android",
     }
     
-    # 确保 backend server 已启动
-    model_url = "http://127.0.0.1:8000/" 
+    # 确保 backend server 已启动；多个推理节点用逗号分隔，客户端会做负载均衡和故障转移
+    model_url = os.environ.get("INFER_ENDPOINTS", "http://127.0.0.1:8000/")
     
     for app in PACKAGE_HOT.values():
         explorer = AppExplorer(None, model_url, app)
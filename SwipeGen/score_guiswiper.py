@@ -0,0 +1,166 @@
+# score_guiswiper.py
+"""
+用 SwipeBench 评测 GUISwiper：所有条目并发送入模型，统计动作准确率、端点误差和吞吐。
+
+    # 进程内，随机初始化的微型 Qwen2-VL（CPU），跑通真实的批量推理路径
+    python score_guiswiper.py --model tiny --concurrency 16
+    # 已启动的 guiswiper_server（可以是多个节点，逗号分隔）
+    python score_guiswiper.py --url http://127.0.0.1:8100 --concurrency 32
+
+指标（坐标单位均为 0-1000 归一化）:
+- action_accuracy: 动作类型 (tap / swipe) 正确的比例
+- direction_accuracy: 标注为 swipe 的条目中，预测为 swipe 且方向正确的比例
+- tap_hit_rate: 标注为 tap 的条目中，预测点落在标注 bbox 内的比例
+- swipe_endpoint_error: swipe 起点、终点与标注的平均欧氏距离（仅动作类型正确的条目）
+- tap_center_error: 点击位置到标注 bbox 中心的距离（仅动作类型正确的条目）
+"""
+import argparse
+import base64
+import json
+import math
+import statistics
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from swipebench import load_swipebench
+
+
+def _dist(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def score_item(pred, gt):
+    """单条评分；gt 为 SwipeBench 的 action_data"""
+    out = {"action_ok": pred.get("action") == gt["action"], "invalid": pred.get("action") == "invalid"}
+    if gt["action"] == "swipe":
+        out["direction_ok"] = out["action_ok"] and pred.get("direction") == gt.get("direction")
+        if out["action_ok"]:
+            out["endpoint_error"] = (_dist(pred["start"], gt["start"]) + _dist(pred["end"], gt["end"])) / 2
+    else:
+        x1, y1, x2, y2 = gt["bbox"]
+        pos = pred.get("position") if out["action_ok"] else None
+        out["tap_hit"] = bool(pos) and x1 <= pos[0] <= x2 and y1 <= pos[1] <= y2
+        if pos:
+            out["center_error"] = _dist(pos, ((x1 + x2) / 2, (y1 + y2) / 2))
+    return out
+
+
+def _mean(values):
+    return round(statistics.fmean(values), 4) if values else None
+
+
+def aggregate(scores):
+    swipes = [s for s in scores if "direction_ok" in s]
+    taps = [s for s in scores if "tap_hit" in s]
+    endpoint = [s["endpoint_error"] for s in swipes if "endpoint_error" in s]
+    return {
+        "items": len(scores),
+        "action_accuracy": _mean([s["action_ok"] for s in scores]),
+        "invalid_rate": _mean([s["invalid"] for s in scores]),
+        "direction_accuracy": _mean([s["direction_ok"] for s in swipes]),
+        "tap_hit_rate": _mean([s["tap_hit"] for s in taps]),
+        "swipe_endpoint_error": _mean(endpoint),
+        "swipe_endpoint_error_median": round(statistics.median(endpoint), 2) if endpoint else None,
+        "tap_center_error": _mean([s["center_error"] for s in taps if "center_error" in s]),
+    }
+
+
+def _app_name(img_filename):
+    # com.foo.bar_003.png -> com.foo.bar
+    return Path(img_filename).stem.rsplit("_", 1)[0]
+
+
+def make_runner(args):
+    """返回 run(item) -> action_data，以及结束后收集额外统计的函数"""
+    if args.url:
+        from inference_client import InferenceClient
+        client = InferenceClient(args.url, timeout=args.timeout)
+
+        def run(item):
+            with open(item["img_path"], "rb") as f:
+                b64 = base64.b64encode(f.read()).decode("utf-8")
+            body = client.post("/predict", {"image_base64": b64, "instruction": item["action_data"]["instruction"]})
+            return body["action_data"]
+        return run, client.stats
+
+    from guiswiper import BatchedPredictor, load_model
+    predictor = BatchedPredictor(load_model(args.model), max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+
+    def run(item):
+        # 只读文件头，像素在模型真正需要时才解码（规则模型完全不解码）
+        image = Image.open(item["img_path"])
+        return predictor.predict(image, item["action_data"]["instruction"], timeout=args.timeout)
+    return run, predictor.snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score GUISwiper on SwipeBench")
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument("--model", default="tiny", help="heuristic（规则桩）、tiny（微型随机 VLM）或模型路径（进程内推理）")
+    src.add_argument("--url", default=None, help="guiswiper_server 地址，多个用逗号分隔")
+    parser.add_argument("--bench-dir", default=None)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--output", default="logs/score_guiswiper.json")
+    args = parser.parse_args()
+
+    items = load_swipebench(args.bench_dir) if args.bench_dir else load_swipebench()
+    items = items[:args.limit] if args.limit else items
+    run, extra_stats = make_runner(args)
+
+    def task(item):
+        t0 = time.perf_counter()
+        try:
+            pred = run(item)
+        except Exception as e:
+            pred = {"action": "invalid", "error": str(e)}
+        return pred, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        outputs = list(ex.map(task, items))
+    elapsed = time.perf_counter() - t0
+
+    scores, per_app, records = [], defaultdict(list), []
+    for item, (pred, latency) in zip(items, outputs):
+        s = score_item(pred, item["action_data"])
+        scores.append(s)
+        per_app[_app_name(item["img_filename"])].append(s)
+        records.append({"img_filename": item["img_filename"], "gt": item["action_data"], "pred": pred,
+                        "latency_s": round(latency, 4), **s})
+
+    latencies = sorted(lat for _, lat in outputs)
+    summary = aggregate(scores)
+    summary.update({
+        "source": args.url or args.model,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_items_per_s": round(len(items) / elapsed, 2) if elapsed else None,
+        "latency_p50_s": round(latencies[len(latencies) // 2], 4) if latencies else None,
+        "latency_p95_s": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4)
+        if latencies else None,
+        "runner": extra_stats(),
+    })
+
+    print(f"条目 {summary['items']}，用时 {summary['elapsed_s']}s，吞吐 {summary['throughput_items_per_s']} 条/s")
+    for key in ("action_accuracy", "direction_accuracy", "tap_hit_rate", "swipe_endpoint_error",
+                "tap_center_error", "invalid_rate", "latency_p50_s", "latency_p95_s"):
+        print(f"  {key:24s} {summary[key]}")
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"summary": summary,
+                   "per_app": {app: aggregate(s) for app, s in sorted(per_app.items())},
+                   "items": records}, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# screencap.py
+import struct
+import subprocess
+import numpy as np
+from PIL import Image
+
+# screencap -p 以外的原始输出格式:
+#   Android 8 及以前: width, height, format            (12 字节头)
+#   Android 9 及以后: width, height, format, colorspace (16 字节头)
+# 之后紧跟 width * height * 4 字节像素
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+_SUPPORTED_FORMATS = (PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888)
+
+
+def parse_screencap_raw(buf, downsample=1):
+    """
+    解析 `screencap` 原始输出，返回 (H, W, 4) uint8 数组。
+
+    数组直接引用 buf 的内存（np.frombuffer），不拷贝像素；
+    downsample > 1 时按步长取样，得到的仍是同一块内存上的视图。
+    """
+    if len(buf) < 12:
+        raise ValueError(f"screencap 数据过短: {len(buf)} 字节")
+    width, height, fmt = struct.unpack_from("<III", buf, 0)
+    n_bytes = width * height * 4
+    if len(buf) >= 16 + n_bytes:
+        header = 16
+    elif len(buf) >= 12 + n_bytes:
+        header = 12
+    else:
+        raise ValueError(f"screencap 数据不完整: {width}x{height} 需要 {n_bytes} 字节像素，实际 {len(buf)} 字节")
+    if fmt not in _SUPPORTED_FORMATS:
+        raise ValueError(f"不支持的像素格式: {fmt}")
+
+    frame = np.frombuffer(buf, dtype=np.uint8, count=n_bytes, offset=header).reshape(height, width, 4)
+    if downsample > 1:
+        frame = frame[::downsample, ::downsample]
+    return frame
+
+
+def frame_to_image(frame):
+    """(H, W, 4) RGBA 数组 -> PIL RGB 图像"""
+    if not frame.flags["C_CONTIGUOUS"]:
+        frame = np.ascontiguousarray(frame)
+    return Image.frombuffer("RGBA", (frame.shape[1], frame.shape[0]), frame, "raw", "RGBA", 0, 1).convert("RGB")
+
+
+class RawScreencapBackend:
+    """
+    通过 adb 直接读取 screencap 原始帧，省掉设备端 PNG/JPEG 编码和主机端解码。
+
+    transport:
+    - "adb":      调用 adb 可执行文件 `adb exec-out screencap`，与 uiautomator2 共用 adb server
+    - "adb_shell": 使用 adb-shell 库通过 TCP 直连设备 (host:port)，适合无 adb server 的环境
+    """
+
+    def __init__(self, serial=None, transport="adb", adb_path="adb", adbkey_path=None, timeout=10):
+        self.serial = serial
+        self.transport = transport
+        self.adb_path = adb_path
+        self.timeout = timeout
+        self._device = None
+        if transport == "adb_shell":
+            self._device = self._connect_adb_shell(serial, adbkey_path)
+        elif transport != "adb":
+            raise ValueError(f"未知的 transport: {transport}")
+
+    @staticmethod
+    def _connect_adb_shell(serial, adbkey_path):
+        import os
+        from adb_shell.adb_device import AdbDeviceTcp
+        from adb_shell.auth.sign_pythonrsa import PythonRSASigner
+
+        if not serial or ":" not in serial:
+            raise ValueError("adb_shell 传输需要 host:port 形式的 serial")
+        host, port = serial.rsplit(":", 1)
+        adbkey_path = adbkey_path or os.path.expanduser("~/.android/adbkey")
+        with open(adbkey_path) as f:
+            priv = f.read()
+        with open(adbkey_path + ".pub") as f:
+            pub = f.read()
+        device = AdbDeviceTcp(host, int(port), default_transport_timeout_s=9.0)
+        device.connect(rsa_keys=[PythonRSASigner(pub, priv)], auth_timeout_s=10)
+        return device
+
+    def capture_bytes(self):
+        if self._device is not None:
+            return self._device.shell("screencap", decode=False, timeout_s=self.timeout)
+        cmd = [self.adb_path]
+        if self.serial:
+            cmd += ["-s", self.serial]
+        cmd += ["exec-out", "screencap"]
+        return subprocess.run(cmd, capture_output=True, check=True, timeout=self.timeout).stdout
+
+    def capture_array(self, downsample=1):
+        return parse_screencap_raw(self.capture_bytes(), downsample=downsample)
+
+    def capture(self, downsample=1):
+        return frame_to_image(self.capture_array(downsample=downsample))
+
+
+def main():
+    """离线解析录制的原始帧：python screencap.py dump.raw [out.png] [--downsample N]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Parse a recorded `adb exec-out screencap` dump")
+    parser.add_argument("dump")
+    parser.add_argument("output", nargs="?", default=None)
+    parser.add_argument("--downsample", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.dump, "rb") as f:
+        buf = f.read()
+    frame = parse_screencap_raw(buf, downsample=args.downsample)
+    print(f"解析成功: {frame.shape[1]}x{frame.shape[0]}, 共享内存={np.shares_memory(frame, np.frombuffer(buf, np.uint8))}")
+    if args.output:
+        frame_to_image(frame).save(args.output)
+        print(f"已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# scroll_estimator.py
+import numpy as np
+from PIL import Image
+
+
+def _to_gray(image):
+    """PIL.Image / 路径 / ndarray -> float32 灰度数组"""
+    if isinstance(image, np.ndarray):
+        arr = image.astype(np.float32)
+        if arr.ndim == 3:
+            arr = arr[..., :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        return arr
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    return np.asarray(image.convert("L"), dtype=np.float32)
+
+
+def _block_mean(arr, factor):
+    """按 factor x factor 块求均值降采样（向量化，不做插值）"""
+    if factor <= 1:
+        return arr
+    h, w = arr.shape[0] // factor * factor, arr.shape[1] // factor * factor
+    return arr[:h, :w].reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3))
+
+
+def _subpixel(values, i):
+    """对峰值及左右邻居做抛物线拟合，返回亚像素偏移"""
+    n = len(values)
+    l, c, r = values[(i - 1) % n], values[i], values[(i + 1) % n]
+    denom = l - 2 * c + r
+    return 0.0 if abs(denom) < 1e-12 else 0.5 * (l - r) / denom
+
+
+def phase_correlate(a, b):
+    """
+    FFT 相位相关，返回 (dy, dx, confidence)：b 中的内容相对 a 平移了 (dy, dx) 像素。
+    confidence 是归一化互功率谱逆变换的峰值（纯平移时接近 1，无关画面接近 0）。
+    """
+    a = a - a.mean()
+    b = b - b.mean()
+    # Hann 窗抑制边界不连续带来的十字形伪峰
+    win = np.outer(np.hanning(a.shape[0]), np.hanning(a.shape[1])).astype(np.float32)
+    fa = np.fft.rfft2(a * win)
+    fb = np.fft.rfft2(b * win)
+    cross = fb * np.conj(fa)
+    cross /= np.abs(cross) + 1e-9
+    corr = np.fft.irfft2(cross, s=a.shape)
+
+    py, px = np.unravel_index(np.argmax(corr), corr.shape)
+    confidence = float(corr[py, px])
+    dy = py + _subpixel(corr[:, px], py)
+    dx = px + _subpixel(corr[py, :], px)
+    # 循环相关：超过一半尺寸的峰对应负方向的平移
+    if dy > a.shape[0] / 2:
+        dy -= a.shape[0]
+    if dx > a.shape[1] / 2:
+        dx -= a.shape[1]
+    return float(dy), float(dx), confidence
+
+
+def estimate_scroll(before, after, bbox=None, axis="vertical", expected=None,
+                    downsample=4, strip_ratio=0.6, min_confidence=0.1):
+    """
+    估计一次滑动后区域内容实际滚动的距离和方向。
+
+    :param before/after: 截图（PIL.Image、路径或数组），尺寸需一致
+    :param bbox: 像素坐标 (x1, y1, x2, y2)，在该区域内估计；None 表示全屏
+    :param axis: "vertical" / "horizontal"，滑动所沿的轴
+    :param expected: 手指移动的像素距离，用于判断是否滑到了尽头
+    :param downsample: 块均值降采样倍数，FFT 在降采样后的条带上做
+    :param strip_ratio: 垂直于滑动轴只取区域中间的一条，减少两侧固定元素的干扰
+    :return: dict，dx/dy 为原图像素位移（内容向上/向左移动为负），
+             offset 为沿滑动轴的位移，confidence 为相关峰值，
+             end_of_list 表示内容几乎没动（或远小于手指移动距离）
+    """
+    a, b = _to_gray(before), _to_gray(after)
+    if a.shape != b.shape:
+        raise ValueError(f"截图尺寸不一致: {a.shape} vs {b.shape}")
+    if bbox is not None:
+        x1, y1, x2, y2 = [int(round(v)) for v in bbox]
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(a.shape[1], x2), min(a.shape[0], y2)
+        a, b = a[y1:y2, x1:x2], b[y1:y2, x1:x2]
+
+    vertical = axis == "vertical"
+    if 0 < strip_ratio < 1:
+        h, w = a.shape
+        if vertical:
+            m = int(w * (1 - strip_ratio) / 2)
+            a, b = a[:, m:w - m], b[:, m:w - m]
+        else:
+            m = int(h * (1 - strip_ratio) / 2)
+            a, b = a[m:h - m], b[m:h - m]
+
+    a, b = _block_mean(a, downsample), _block_mean(b, downsample)
+    result = {"dx": 0.0, "dy": 0.0, "offset": 0.0, "confidence": 0.0,
+              "static": False, "end_of_list": False, "ratio": None}
+    if min(a.shape) < 8:
+        return result
+
+    if np.mean(np.abs(a - b) > 10) < 1e-3:
+        # 区域内几乎没有像素变化：内容未滚动
+        result.update(confidence=1.0, static=True, end_of_list=True, ratio=0.0 if expected else None)
+        return result
+
+    dy, dx, confidence = phase_correlate(a, b)
+    dy, dx = dy * max(downsample, 1), dx * max(downsample, 1)
+    offset = dy if vertical else dx
+    result.update(dx=round(dx, 1), dy=round(dy, 1), offset=round(offset, 1), confidence=round(confidence, 3))
+
+    if confidence >= min_confidence:
+        if expected:
+            ratio = abs(offset) / expected
+            result["ratio"] = round(ratio, 3)
+            # 惯性滚动时位移通常不小于手指距离；明显偏小说明中途碰到了列表边界
+            result["end_of_list"] = ratio < 0.35
+        else:
+            result["end_of_list"] = abs(offset) < downsample
+    return result
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Estimate scroll displacement between two screenshots")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--bbox", type=float, nargs=4, default=None, help="像素坐标 x1 y1 x2 y2")
+    parser.add_argument("--axis", choices=["vertical", "horizontal"], default="vertical")
+    parser.add_argument("--expected", type=float, default=None)
+    parser.add_argument("--downsample", type=int, default=4)
+    args = parser.parse_args()
+
+    print(json.dumps(estimate_scroll(args.before, args.after, args.bbox, args.axis,
+                                     args.expected, args.downsample), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# speculative.py
+"""
+推测解码（assisted generation）：小模型或 prompt 中的 n-gram 先提出若干候选 token，
+目标模型一次 forward 并行验证，贪心解码下输出与逐 token 生成完全一致。
+
+两种候选来源：
+- "draft": 同系列的小模型（VLM 目标配 VLM 草稿，如 Qwen3-VL-8B + Qwen3-VL-2B；纯文本目标配纯文本草稿）
+- "prompt_lookup": 在 prompt 和已生成文本里查找 n-gram 续写，不需要额外模型；
+  区域检测的 JSON 键名、结构高度重复，这种方式的接受率很高
+
+    spec = Speculator(model, mode="draft", draft=draft_model).install()
+    with speculation(False):      # 单个请求关闭
+        model.generate(...)
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+import torch
+
+MODES = ("draft", "prompt_lookup")
+
+_enabled = contextvars.ContextVar("speculation_enabled", default=None)
+_counters = contextvars.ContextVar("speculation_counters", default=None)
+_hook_lock = threading.Lock()
+_hook_installed = False
+
+
+@contextmanager
+def speculation(enabled):
+    """覆盖本次请求是否启用推测解码；None 表示使用模型的默认配置"""
+    token = _enabled.set(enabled)
+    try:
+        yield
+    finally:
+        _enabled.reset(token)
+
+
+def _install_candidate_hook():
+    """
+    包装 transformers 的候选生成器，统计每轮提出的候选 token 数。
+    计数写入当前上下文的 counters，不在 Speculator.generate 内的调用不受影响。
+    """
+    global _hook_installed
+    with _hook_lock:
+        if _hook_installed:
+            return
+        try:
+            from transformers.generation import candidate_generator as cg
+        except ImportError:
+            return
+        for name in ("AssistedCandidateGenerator", "PromptLookupCandidateGenerator"):
+            cls = getattr(cg, name, None)
+            if cls is None or getattr(cls.get_candidates, "_counted", False):
+                continue
+            original = cls.get_candidates
+
+            def get_candidates(self, input_ids, *a, _original=original, **kw):
+                out = _original(self, input_ids, *a, **kw)
+                counters = _counters.get()
+                if counters is not None:
+                    counters["proposed"] += out[0].shape[1] - input_ids.shape[1]
+                    counters["rounds"] += 1
+                return out
+            get_candidates._counted = True
+            cls.get_candidates = get_candidates
+        _hook_installed = True
+
+
+class Speculator:
+    """
+    :param mode: "draft" 或 "prompt_lookup"
+    :param draft: mode="draft" 时的草稿模型
+    :param num_assistant_tokens: 草稿模型每轮提出的 token 数（transformers 会按接受情况动态调整）
+    :param lookup_tokens: prompt_lookup 每轮提出的 token 数
+    :param enabled: 默认是否启用，可被 speculation() 按请求覆盖
+    """
+
+    def __init__(self, model, mode="prompt_lookup", draft=None, num_assistant_tokens=8, lookup_tokens=10,
+                 max_matching_ngram_size=3, enabled=True):
+        if mode not in MODES:
+            raise ValueError(f"mode 必须是 {MODES} 之一: {mode}")
+        if mode == "draft" and draft is None:
+            raise ValueError("mode='draft' 需要提供草稿模型")
+        self.model = model
+        self.mode = mode
+        self.draft = draft
+        self.num_assistant_tokens = num_assistant_tokens
+        self.lookup_tokens = lookup_tokens
+        self.max_matching_ngram_size = max_matching_ngram_size
+        self.enabled = enabled
+        self._original = None
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "speculative_calls": 0, "generated_tokens": 0, "target_steps": 0,
+                      "proposed_tokens": 0, "accepted_tokens": 0, "time_s": 0.0}
+
+    def install(self):
+        if self._original is not None:
+            return self
+        self._original = self.model.generate
+        if self.mode == "draft" and hasattr(self.draft, "generation_config"):
+            self.draft.generation_config.num_assistant_tokens = self.num_assistant_tokens
+            # 按接受情况动态调整每轮候选数
+            self.draft.generation_config.num_assistant_tokens_schedule = "heuristic"
+        _install_candidate_hook()
+        # 钩子常驻，只给当前上下文中的 generate 计数；并发请求各自有自己的 counters，互不干扰
+        self.model.register_forward_pre_hook(self._count_step)
+        self.model.generate = self._generate
+        return self
+
+    @staticmethod
+    def _count_step(*_):
+        counters = _counters.get()
+        if counters is not None:
+            counters["steps"] += 1
+
+    def _assist_kwargs(self):
+        if self.mode == "draft":
+            return {"assistant_model": self.draft}
+        return {"prompt_lookup_num_tokens": self.lookup_tokens,
+                "max_matching_ngram_size": self.max_matching_ngram_size}
+
+    def _generate(self, input_ids=None, **kwargs):
+        enabled = _enabled.get()
+        enabled = self.enabled if enabled is None else enabled
+        # transformers 的 assisted generation 只支持 batch=1 的贪心 / 采样解码
+        if not enabled or input_ids is None or input_ids.shape[0] != 1 or kwargs.get("num_beams", 1) > 1:
+            with self._lock:
+                self.stats["calls"] += 1
+            return self._original(input_ids=input_ids, **kwargs)
+
+        counters = {"proposed": 0, "rounds": 0, "steps": 0}
+        ctoken = _counters.set(counters)
+        t0 = time.perf_counter()
+        try:
+            out = self._original(input_ids=input_ids, **kwargs, **self._assist_kwargs())
+        finally:
+            _counters.reset(ctoken)
+
+        generated = out.shape[1] - input_ids.shape[1]
+        steps = counters["steps"]
+        # 每次目标模型 forward 产出 (接受的候选数 + 1) 个 token
+        accepted = max(0, generated - steps)
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["speculative_calls"] += 1
+            self.stats["generated_tokens"] += generated
+            self.stats["target_steps"] += steps
+            self.stats["proposed_tokens"] += counters["proposed"]
+            self.stats["accepted_tokens"] += accepted
+            self.stats["time_s"] += time.perf_counter() - t0
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            s = dict(self.stats)
+        s["mode"] = self.mode
+        s["time_s"] = round(s["time_s"], 3)
+        s["acceptance_rate"] = round(s["accepted_tokens"] / s["proposed_tokens"], 3) \
+            if s["proposed_tokens"] else None
+        # 每次目标模型 forward 平均产出的 token 数，即相对逐 token 解码的理论加速比
+        s["tokens_per_target_step"] = round(s["generated_tokens"] / s["target_steps"], 2) \
+            if s["target_steps"] else None
+        return s
+
+
+def load_speculator(model, config, device_map="auto", torch_dtype=None):
+    """
+    按注册表中的配置构造 Speculator，例如
+    {"mode": "draft", "draft": "/data/model/Qwen3-VL-2B-Instruct", "kind": "vlm"} 或 {"mode": "prompt_lookup"}。
+    返回 (speculator, 草稿模型占用的字节数)
+    """
+    config = dict(config)
+    mode = config.pop("mode", "prompt_lookup")
+    draft = None
+    nbytes = 0
+    if mode == "draft":
+        from vlm_backend import load_causal_lm, load_vlm
+        loader = load_vlm if config.pop("kind", "vlm") == "vlm" else load_causal_lm
+        draft, _ = loader(config.pop("draft"), device_map=device_map,
+                          torch_dtype=torch_dtype or torch.float16)
+        nbytes = sum(t.numel() * t.element_size() for t in list(draft.parameters()) + list(draft.buffers()))
+    else:
+        config.pop("draft", None)
+        config.pop("kind", None)
+    return Speculator(model, mode=mode, draft=draft, **config).install(), nbytes
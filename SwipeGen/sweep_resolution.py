@@ -0,0 +1,119 @@
+# sweep_resolution.py
+"""
+分辨率 / 视觉 token 预算扫描：在 SwipeBench 上对每个预算测量检测准确率和延迟，
+画出 准确率-延迟 曲线，并给出准确率不明显下降前提下最便宜的预算。
+
+    python sweep_resolution.py --server http://127.0.0.1:8000 --budgets tiny low medium high scale:0.5
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from PIL import Image
+
+from detect import ExplorationDetector
+from resolution import ResolutionPolicy
+from swipebench import load_swipebench, detection_hit
+
+
+def sweep(server_url, budgets, items, iou_threshold=0.5):
+    rows = []
+    for budget in budgets:
+        policy = ResolutionPolicy.parse(budget)
+        detector = ExplorationDetector(server_url, resolution=policy)
+        hits, latencies, tokens = 0, [], []
+        for item in items:
+            t0 = time.perf_counter()
+            try:
+                results = detector.analyze_image(item["img_path"])
+            except Exception as e:
+                print(f"[{budget}] {item['img_filename']} 推理失败: {e}")
+                continue
+            latencies.append(time.perf_counter() - t0)
+            hits += detection_hit(results, item["action_data"], iou_threshold)
+            with Image.open(item["img_path"]) as im:  # 只读文件头
+                tokens.append(policy.visual_tokens(*im.size))
+
+        n = len(latencies)
+        latencies.sort()
+        row = {
+            "budget": budget,
+            "visual_tokens": round(sum(tokens) / max(1, n)),
+            "accuracy": round(hits / max(1, n), 4),
+            "mean_latency_s": round(sum(latencies) / max(1, n), 3),
+            "p95_latency_s": round(latencies[int(0.95 * (n - 1))], 3) if n else None,
+            "samples": n,
+        }
+        print(f"[{budget}] tokens≈{row['visual_tokens']} acc={row['accuracy']} "
+              f"mean={row['mean_latency_s']}s p95={row['p95_latency_s']}s")
+        rows.append(row)
+    return rows
+
+
+def pick_cheapest(rows, tolerance):
+    """准确率不低于最优值 - tolerance 的预算中延迟最低的那个"""
+    valid = [r for r in rows if r["samples"]]
+    if not valid:
+        return None
+    best = max(r["accuracy"] for r in valid)
+    ok = [r for r in valid if r["accuracy"] >= best - tolerance]
+    return min(ok, key=lambda r: r["mean_latency_s"])
+
+
+def plot(rows, path):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("未安装 matplotlib，跳过绘图")
+        return
+    fig, ax = plt.subplots(figsize=(6, 4))
+    xs = [r["mean_latency_s"] for r in rows]
+    ys = [r["accuracy"] for r in rows]
+    ax.plot(xs, ys, "o-")
+    for r in rows:
+        ax.annotate(f"{r['budget']} ({r['visual_tokens']} tok)", (r["mean_latency_s"], r["accuracy"]),
+                    textcoords="offset points", xytext=(4, 4), fontsize=8)
+    ax.set_xlabel("mean latency per screenshot (s)")
+    ax.set_ylabel("SwipeBench detection accuracy")
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(path, dpi=150)
+    print(f"曲线已保存: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep visual-token budgets on SwipeBench")
+    parser.add_argument("--server", default="http://127.0.0.1:8000")
+    parser.add_argument("--budgets", nargs="+", default=["tiny", "low", "medium", "high", "scale:0.5", "full"])
+    parser.add_argument("--limit", type=int, default=None, help="只使用前 N 条数据")
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="可接受的准确率下降")
+    parser.add_argument("--include-fullscreen", action="store_true",
+                        help="包含注入的全屏滑动标注（模型不会检测出这些区域）")
+    parser.add_argument("--output", default="logs/resolution_sweep")
+    args = parser.parse_args()
+
+    items = load_swipebench()
+    if not args.include_fullscreen:
+        items = [it for it in items if it["action_data"]["bbox"] != [0, 0, 1000, 1000]]
+    if args.limit:
+        items = items[:args.limit]
+    print(f"共 {len(items)} 条数据，{len(args.budgets)} 个预算")
+
+    rows = sweep(args.server, args.budgets, items, args.iou)
+
+    out = Path(args.output)
+    out.parent.mkdir(exist_ok=True)
+    with open(f"{out}.json", "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2)
+    plot(rows, f"{out}.png")
+
+    choice = pick_cheapest(rows, args.tolerance)
+    if choice:
+        print(f"推荐预算: {choice['budget']} (acc={choice['accuracy']}, {choice['mean_latency_s']}s/张)")
+
+
+if __name__ == "__main__":
+    main()
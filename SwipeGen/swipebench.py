@@ -0,0 +1,36 @@
+# swipebench.py
+import json
+from pathlib import Path
+
+SWIPEBENCH_DIR = Path(__file__).resolve().parent.parent / "SwipeBench"
+
+
+def load_swipebench(bench_dir=SWIPEBENCH_DIR, summary="all_apps_summary_SwipeBench.json"):
+    """读取 SwipeBench 汇总文件，为每条数据补上图片的绝对路径"""
+    bench_dir = Path(bench_dir)
+    with open(bench_dir / summary, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    for item in items:
+        item["img_path"] = str(bench_dir / item["img_filename"])
+    return items
+
+
+def bbox_iou(a, b):
+    """两个 [x1, y1, x2, y2] 框的 IoU"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    area_a = max(0.0, a[2] - a[0]) * max(0.0, a[3] - a[1])
+    area_b = max(0.0, b[2] - b[0]) * max(0.0, b[3] - b[1])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def detection_hit(results, action_data, iou_threshold=0.5):
+    """
+    检测结果是否覆盖了这条标注：存在同类别（tap->clickable, swipe->slidable）
+    且与标注 bbox 的 IoU 不低于阈值的区域
+    """
+    key = "clickable_regions" if action_data["action"] == "tap" else "slidable_regions"
+    gt = action_data["bbox"]
+    return any(bbox_iou(r["bbox"], gt) >= iou_threshold for r in results.get(key, []))
@@ -0,0 +1,271 @@
+# tracing.py
+"""
+可选的 span 埋点，导出为 Chrome trace / Perfetto 可读取的 JSON（chrome://tracing 或 ui.perfetto.dev）。
+
+    import tracing
+    tracing.enable("explorer")
+    with tracing.span("detect", image=path):
+        ...
+    tracing.export("logs/trace.json")
+
+未启用时 span() 返回一个共享的空上下文管理器，traced 装饰器直接调用原函数，开销只有一次全局变量判断。
+跨进程的上下文通过 W3C traceparent 头传递：客户端 inject_headers()，服务端 remote_span() 收集本请求的
+span 并放进响应，客户端 merge_remote() 合并到同一条时间线上。
+"""
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+_pid = os.getpid()
+_process_name = None
+
+# 当前 span: (trace_id, span_id)；服务端按请求收集 span 的列表
+_current = contextvars.ContextVar("trace_current", default=None)
+_collector = contextvars.ContextVar("trace_collector", default=None)
+
+
+def enable(process_name="swiper"):
+    global _enabled, _process_name
+    _enabled = True
+    _process_name = process_name
+    _record({"name": "process_name", "ph": "M", "pid": _pid, "tid": 0, "args": {"name": process_name}})
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def _now_us():
+    # 用墙上时钟，客户端与服务端的时间戳才能放在同一条时间线上
+    return time.time_ns() / 1000
+
+
+def _record(event):
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(event)
+    else:
+        with _lock:
+            _events.append(event)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "trace_id", "span_id", "parent_id", "start", "_token")
+
+    def __init__(self, name, cat, args, parent=None):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        if parent is None:
+            parent = _current.get()
+        self.trace_id = parent[0] if parent else secrets.token_hex(16)
+        self.parent_id = parent[1] if parent else None
+        self.span_id = secrets.token_hex(8)
+
+    def __enter__(self):
+        self._token = _current.set((self.trace_id, self.span_id))
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+        _current.reset(self._token)
+        args = dict(self.args, trace_id=self.trace_id, span_id=self.span_id)
+        if self.parent_id:
+            args["parent_id"] = self.parent_id
+        if exc_type is not None:
+            args["error"] = f"{exc_type.__name__}: {exc}"
+        _record({
+            "name": self.name, "cat": self.cat, "ph": "X",
+            "ts": self.start, "dur": end - self.start,
+            "pid": _pid, "tid": threading.get_native_id(),
+            "args": args
+        })
+        return False
+
+    def set(self, **args):
+        """在 span 结束前补充属性（如结果数量、图片尺寸）"""
+        self.args.update(args)
+
+
+def span(name, cat="swiper", **args):
+    if not _enabled and _collector.get() is None:
+        return _NOOP
+    return _Span(name, cat, args)
+
+
+def traced(name=None, cat="swiper"):
+    """函数级埋点装饰器；未启用时直接调用原函数"""
+    def deco(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*a, **kw):
+            if not _enabled and _collector.get() is None:
+                return func(*a, **kw)
+            with _Span(span_name, cat, {}):
+                return func(*a, **kw)
+        return wrapper
+    return deco
+
+
+# ==========================
+# 跨进程传播 (W3C traceparent)
+# ==========================
+
+def inject_headers(headers=None):
+    """在 HTTP 头中写入当前 span 的 traceparent；未启用或不在 span 内时原样返回"""
+    headers = dict(headers or {})
+    cur = _current.get()
+    if _enabled and cur:
+        headers["traceparent"] = f"00-{cur[0]}-{cur[1]}-01"
+    return headers
+
+
+def parse_traceparent(header):
+    try:
+        _version, trace_id, span_id, _flags = header.strip().split("-")
+    except (AttributeError, ValueError):
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16:
+        return None
+    return trace_id, span_id
+
+
+class remote_span:
+    """
+    服务端使用：请求带 traceparent 时，以远端 span 为父记录本请求内的所有 span，
+    退出后 self.events 即为要放进响应的事件；不带 traceparent 时为空操作。
+    """
+
+    def __init__(self, traceparent, name, process_name="remote_server", **args):
+        self.parent = parse_traceparent(traceparent) if traceparent else None
+        self.name = name
+        self.process_name = process_name
+        self.args = args
+        self.events = None
+
+    def __enter__(self):
+        if self.parent is None:
+            return self
+        self.events = [{"name": "process_name", "ph": "M", "pid": _pid, "tid": 0,
+                        "args": {"name": self.process_name}}]
+        self._ctoken = _collector.set(self.events)
+        self._span = _Span(self.name, "server", self.args, parent=self.parent)
+        self._span.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.parent is None:
+            return False
+        self._span.__exit__(*exc)
+        _collector.reset(self._ctoken)
+        return False
+
+    def set(self, **args):
+        if self.parent is not None:
+            self._span.set(**args)
+
+
+def merge_remote(events, parent=None):
+    """
+    合并服务端返回的事件，在客户端 HTTP span（parent）内部调用。
+    两台机器时钟不同步时，服务端 span 会落在 [parent 开始, 当前时刻] 之外，
+    此时把服务端事件整体平移到这段时间的中间。
+    """
+    if not _enabled or not events:
+        return
+    spans = [e for e in events if e.get("ph") == "X"]
+    if spans and isinstance(parent, _Span):
+        parent_start, parent_end = parent.start, _now_us()
+        s = min(e["ts"] for e in spans)
+        e = max(ev["ts"] + ev["dur"] for ev in spans)
+        if s < parent_start or e > parent_end:
+            shift = (parent_start + parent_end) / 2 - (s + e) / 2
+            for ev in spans:
+                ev["ts"] += shift
+                ev["args"]["clock_shift_us"] = round(shift)
+    with _lock:
+        _events.extend(events)
+
+
+# ==========================
+# 导出
+# ==========================
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def reset():
+    with _lock:
+        del _events[:]
+    if _enabled:
+        enable(_process_name)
+
+
+def export(path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events(), "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    print(f"Trace 已导出: {path} (chrome://tracing 或 ui.perfetto.dev 打开)")
+    return path
+
+
+def summarize(path_or_events, top=15):
+    """按 span 名汇总总耗时/次数，用于快速定位某个 app 慢在哪里"""
+    evs = path_or_events
+    if isinstance(path_or_events, (str, Path)):
+        with open(path_or_events, "r", encoding="utf-8") as f:
+            evs = json.load(f)["traceEvents"]
+    agg = {}
+    for e in evs:
+        if e.get("ph") != "X":
+            continue
+        cell = agg.setdefault(e["name"], [0, 0.0, 0.0])
+        cell[0] += 1
+        cell[1] += e["dur"]
+        cell[2] = max(cell[2], e["dur"])
+    rows = sorted(agg.items(), key=lambda kv: -kv[1][1])[:top]
+    print(f"{'span':40s} {'count':>6s} {'total_s':>9s} {'max_s':>8s}")
+    for name, (n, total, mx) in rows:
+        print(f"{name:40s} {n:6d} {total / 1e6:9.2f} {mx / 1e6:8.2f}")
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+    for p in sys.argv[1:]:
+        print(p)
+        summarize(p)
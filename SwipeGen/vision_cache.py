@@ -0,0 +1,185 @@
+# vision_cache.py
+"""
+视觉编码器输出缓存。
+
+同一张截图常常要过好几次 VLM（区域检测、指令生成、多任务标注），每次都重新跑一遍视觉塔。
+VisionCache 包装 model.visual.forward：调用方用 use_keys() 声明本次推理中各图片的内容哈希，
+命中的图片直接复用缓存的视觉 token，只对未命中的图片切出对应的 patch 重新编码。
+未声明 key 的调用原样透传，不影响其他代码路径。
+"""
+import contextvars
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import torch
+
+_current_keys = contextvars.ContextVar("vision_cache_keys", default=None)
+
+
+def image_key(data):
+    """图片内容哈希：bytes（编码后的文件内容）或 PIL.Image（像素）"""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(data, (bytes, bytearray)):
+        h.update(data)
+    else:
+        h.update(f"{data.mode}:{data.size[0]}x{data.size[1]}".encode())
+        h.update(data.tobytes())
+    return h.hexdigest()
+
+
+@contextmanager
+def use_keys(keys):
+    """声明接下来的推理中按顺序出现的各图片的 key；None 表示不使用缓存"""
+    token = _current_keys.set(list(keys) if keys is not None else None)
+    try:
+        yield
+    finally:
+        _current_keys.reset(token)
+
+
+def _nbytes(entry):
+    main, deep = entry
+    return main.nbytes + sum(t.nbytes for t in deep)
+
+
+class VisionCache:
+    """
+    按字节数限制的 LRU。
+
+    :param max_bytes: 缓存上限（视觉 token 的 hidden states，fp16 下一张 1024 token 的截图约几 MB）
+    :param offload: True 时缓存放在 CPU 内存，命中后再拷回模型所在设备；False 时留在 GPU 上
+    """
+
+    def __init__(self, max_bytes=2 << 30, offload=False):
+        self.max_bytes = max_bytes
+        self.offload = offload
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._merge = 2
+        self._kind = "tensor"
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bypassed": 0}
+
+    # ==========================
+    # 安装到模型
+    # ==========================
+
+    def install(self, model):
+        visual = getattr(model, "visual", None)
+        if visual is None:
+            visual = getattr(getattr(model, "model", None), "visual", None)
+        if visual is None:
+            raise ValueError("模型没有 visual 子模块，无法安装视觉缓存")
+        self._merge = getattr(visual, "spatial_merge_size", 2)
+        original = visual.forward
+
+        def forward(hidden_states, grid_thw=None, **kwargs):
+            keys = _current_keys.get()
+            if keys is None or grid_thw is None or len(keys) != grid_thw.shape[0]:
+                return original(hidden_states, grid_thw=grid_thw, **kwargs)
+            return self._cached_forward(original, hidden_states, grid_thw, keys, kwargs)
+
+        # 实例属性覆盖类上的 forward，nn.Module.__call__ 会调用它
+        visual.forward = forward
+        return self
+
+    # ==========================
+    # 缓存逻辑
+    # ==========================
+
+    def _cached_forward(self, original, pixel_values, grid_thw, keys, kwargs):
+        patches = grid_thw.prod(-1).tolist()
+        tokens = [p // (self._merge ** 2) for p in patches]
+        offsets = [0]
+        for p in patches:
+            offsets.append(offsets[-1] + p)
+
+        results = [self._get(k) for k in keys]
+        # 同一次调用里重复出现的图片只编码一次
+        missing, seen = [], set()
+        for i, (k, r) in enumerate(zip(keys, results)):
+            if r is None and k not in seen:
+                missing.append(i)
+                seen.add(k)
+        with self._lock:
+            self.stats["hits"] += len(keys) - len(missing)
+            self.stats["misses"] += len(missing)
+
+        if missing:
+            pv = torch.cat([pixel_values[offsets[i]:offsets[i + 1]] for i in missing])
+            out = original(pv, grid_thw=grid_thw[missing], **kwargs)
+            parts = self._split(out, [tokens[i] for i in missing])
+            if parts is None:
+                # 视觉塔的输出结构不认识：不缓存，按原样重新完整计算
+                with self._lock:
+                    self.stats["bypassed"] += 1
+                return original(pixel_values, grid_thw=grid_thw, **kwargs)
+            fresh = dict(zip((keys[i] for i in missing), parts))
+            for k, part in fresh.items():
+                self._put(k, part)
+            results = [r if r is not None else fresh[k] for k, r in zip(keys, results)]
+
+        device = pixel_values.device
+        return self._concat([(m.to(device), [d.to(device) for d in ds]) for m, ds in results])
+
+    def _split(self, out, sizes):
+        """
+        把视觉塔输出按图片切开，每张图为 (hidden, [deepstack...])。
+        Qwen2.5-VL 返回单个 tensor；Qwen3-VL 返回 (hidden, deepstack 特征列表)。
+        """
+        if torch.is_tensor(out):
+            self._kind = "tensor"
+            return [(t, []) for t in out.split(sizes)]
+        if isinstance(out, (tuple, list)) and len(out) == 2 and torch.is_tensor(out[0]):
+            self._kind = "deepstack"
+            mains = out[0].split(sizes)
+            deeps = [d.split(sizes) for d in out[1]]
+            return [(mains[i], [d[i] for d in deeps]) for i in range(len(sizes))]
+        return None
+
+    def _concat(self, entries):
+        main = torch.cat([m for m, _ in entries])
+        if self._kind == "tensor":
+            return main
+        n_deep = len(entries[0][1])
+        return main, [torch.cat([ds[j] for _, ds in entries]) for j in range(n_deep)]
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        main, deep = entry
+        if self.offload:
+            entry = (main.detach().to("cpu"), [d.detach().to("cpu") for d in deep])
+        else:
+            # split 得到的是视图，clone 后才能单独释放
+            entry = (main.detach().clone(), [d.detach().clone() for d in deep])
+        size = _nbytes(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= _nbytes(old)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self):
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes,
+                        hit_rate=round(self.stats["hits"] / total, 3) if total else None)
@@ -0,0 +1,230 @@
+# vlm_backend.py
+import torch
+from PIL import Image, ImageDraw
+from transformers import AutoConfig, AutoModelForCausalLM, AutoModelForImageTextToText, AutoProcessor, AutoTokenizer
+
+import tracing
+from fast_decode import decode_task
+from vision_cache import use_keys
+
+
+def model_kind(model_path):
+    """
+    按 checkpoint 的 config 判断模型类型：带 vision_config（Qwen-VL、LLaVA 等）的是 "vlm"，
+    否则是 "causal_lm"。只读 config.json，不加载权重
+    """
+    config = AutoConfig.from_pretrained(model_path, trust_remote_code=True)
+    return "vlm" if getattr(config, "vision_config", None) is not None else "causal_lm"
+
+
+def load_vlm(model_path, device_map="auto", torch_dtype=torch.float16):
+    """
+    加载 VLM 模型和处理器，供 remote_server 与模型工作进程共用。
+    有 safetensors 权重时 transformers 默认优先使用并按 mmap 读取，只有 .bin 的 checkpoint 也能加载；
+    low_cpu_mem_usage 避免先在 CPU 上完整构造一份随机权重。
+    """
+    model = AutoModelForImageTextToText.from_pretrained(
+        model_path,
+        torch_dtype=torch_dtype,
+        device_map=device_map,
+        low_cpu_mem_usage=True,
+        trust_remote_code=True
+    )
+    processor = AutoProcessor.from_pretrained(
+        model_path,
+        trust_remote_code=True
+    )
+    model.eval()
+    return model, processor
+
+
+def load_causal_lm(model_path, device_map="auto", torch_dtype=torch.float16):
+    """加载纯文本的 CausalLM，返回 (model, tokenizer)"""
+    model = AutoModelForCausalLM.from_pretrained(
+        model_path,
+        torch_dtype=torch_dtype,
+        device_map=device_map,
+        low_cpu_mem_usage=True,
+        trust_remote_code=True
+    )
+    tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+    model.eval()
+    return model, tokenizer
+
+
+def run_text(model, tokenizer, prompt, max_new_tokens):
+    """纯文本生成；tokenizer 带 chat template 时按对话格式组织 prompt"""
+    if getattr(tokenizer, "chat_template", None):
+        prompt = tokenizer.apply_chat_template(
+            [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+        )
+    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+    with tracing.span("lm.generate", prompt_tokens=int(inputs.input_ids.shape[1])), torch.no_grad(), \
+            decode_task(prompt):
+        output_ids = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False)
+    return tokenizer.decode(output_ids[0, inputs.input_ids.shape[1]:], skip_special_tokens=True)
+
+
+def run_vlm(model, processor, image, prompt, max_new_tokens, image_key=None):
+    """
+    单图单 prompt 推理，返回生成的文本（已去掉 prompt 部分）。
+    image_key: 图片内容哈希；模型装了 VisionCache 时，同一张图的视觉编码只算一次
+    """
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "image", "image": image},
+                {"type": "text", "text": prompt}
+            ]
+        }
+    ]
+
+    with tracing.span("vlm.preprocess"):
+        text = processor.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True
+        )
+
+        inputs = processor(
+            text=[text],
+            images=[image],
+            return_tensors="pt",
+            padding=True
+        ).to(model.device)
+
+    keys = [image_key] if image_key else None
+    # decode_task 让 FastDecode（若已安装）按 prompt 统计输出长度、设定生成预算
+    with tracing.span("vlm.generate", prompt_tokens=int(inputs.input_ids.shape[1])) as sp, \
+            torch.no_grad(), use_keys(keys), decode_task(prompt):
+        output_ids = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False
+        )
+        sp.set(new_tokens=int(output_ids.shape[1] - inputs.input_ids.shape[1]))
+
+    # Trim prompt tokens
+    gen_ids = output_ids[:, inputs.input_ids.shape[1]:]
+
+    return processor.batch_decode(
+        gen_ids,
+        skip_special_tokens=True,
+        clean_up_tokenization_spaces=False
+    )[0]
+
+
+def run_vlm_multi(model, processor, image, prompts, max_new_tokens, image_key=None):
+    """同一张图依次回答多个 prompt；传入 image_key 且装了 VisionCache 时，视觉塔只在第一个 prompt 时运行"""
+    return [run_vlm(model, processor, image, p, max_new_tokens, image_key=image_key) for p in prompts]
+
+
+def run_vlm_batch(model, processor, images, prompts, max_new_tokens):
+    """
+    多张图、每张图一个 prompt，一次 generate 完成（左侧 padding），返回与输入等长的文本列表。
+    适合短输出的批量推理（如 GUISwiper 的动作预测）；长输出时批内最慢的样本决定整批耗时。
+    """
+    texts = [
+        processor.apply_chat_template(
+            [{"role": "user", "content": [{"type": "image", "image": img}, {"type": "text", "text": p}]}],
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        for img, p in zip(images, prompts)
+    ]
+    tokenizer = getattr(processor, "tokenizer", processor)
+    # decoder-only 模型批量生成时必须左侧 padding，生成的 token 才紧接在各自的 prompt 之后
+    tokenizer.padding_side = "left"
+    with tracing.span("vlm.preprocess", batch=len(texts)):
+        inputs = processor(text=texts, images=list(images), return_tensors="pt", padding=True).to(model.device)
+
+    with tracing.span("vlm.generate", batch=len(texts), prompt_tokens=int(inputs.input_ids.shape[1])), \
+            torch.no_grad():
+        output_ids = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False)
+
+    return processor.batch_decode(
+        output_ids[:, inputs.input_ids.shape[1]:],
+        skip_special_tokens=True,
+        clean_up_tokenization_spaces=False
+    )
+
+
+# Qwen2-VL 风格的最小 chat template：图片展开为 <|vision_start|><|image_pad|><|vision_end|>
+_TINY_CHAT_TEMPLATE = (
+    "{% for message in messages %}<|im_start|>{{ message['role'] }}\n"
+    "{% if message['content'] is string %}{{ message['content'] }}{% else %}{% for c in message['content'] %}"
+    "{% if c['type'] == 'image' %}<|vision_start|><|image_pad|><|vision_end|>"
+    "{% elif c['type'] == 'text' %}{{ c['text'] }}{% endif %}{% endfor %}{% endif %}<|im_end|>\n{% endfor %}"
+    "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+
+
+def build_tiny_vlm(out_dir, corpus=(), seed=0):
+    """
+    在 out_dir 生成一个随机初始化的微型 Qwen2-VL（约 65 万参数）及其 processor，CPU 上零点几秒一批。
+    用于在没有 GPU / 真实权重时把图文批量推理链路（processor、左侧 padding、generate、decode）完整跑通；
+    输出是随机 token，没有任何预测能力。已存在时直接返回。
+    corpus: 训练 BPE 词表用的文本（如 prompt 模板）
+    需要 torchvision（transformers 的 Qwen2-VL processor 依赖它），与真实的 Qwen-VL 模型相同
+    """
+    from pathlib import Path
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import (PreTrainedTokenizerFast, Qwen2VLConfig, Qwen2VLForConditionalGeneration,
+                              Qwen2VLImageProcessorPil, Qwen2VLProcessor, Qwen2VLVideoProcessor)
+
+    out_dir = Path(out_dir)
+    if (out_dir / "config.json").exists():
+        return str(out_dir)
+    special = ["<|endoftext|>", "<|im_start|>", "<|im_end|>", "<|vision_start|>", "<|vision_end|>",
+               "<|image_pad|>", "<|video_pad|>"]
+    bpe = Tokenizer(models.BPE())
+    bpe.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    bpe.decoder = decoders.ByteLevel()
+    bpe.train_from_iterator(list(corpus) or ["{}"], trainers.BpeTrainer(
+        vocab_size=512, special_tokens=special, initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=bpe, eos_token="<|im_end|>", pad_token="<|endoftext|>",
+                                        extra_special_tokens={"image_token": "<|image_pad|>",
+                                                              "video_token": "<|video_pad|>"})
+    ids = {t: tokenizer.convert_tokens_to_ids(t) for t in special}
+    # 截图最多缩到 224x448，即 128 个视觉 token
+    processor = Qwen2VLProcessor(image_processor=Qwen2VLImageProcessorPil(min_pixels=56 * 56, max_pixels=224 * 448),
+                                 tokenizer=tokenizer, video_processor=Qwen2VLVideoProcessor(),
+                                 chat_template=_TINY_CHAT_TEMPLATE)
+    config = Qwen2VLConfig(
+        text_config=dict(vocab_size=len(tokenizer), hidden_size=128, intermediate_size=256, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=4096,
+                         rope_scaling={"type": "mrope", "mrope_section": [4, 6, 6]},
+                         bos_token_id=ids["<|endoftext|>"], eos_token_id=ids["<|im_end|>"],
+                         pad_token_id=ids["<|endoftext|>"]),
+        vision_config=dict(depth=2, embed_dim=64, num_heads=4, mlp_ratio=2, hidden_size=128, patch_size=14,
+                           spatial_merge_size=2, temporal_patch_size=2),
+        image_token_id=ids["<|image_pad|>"], video_token_id=ids["<|video_pad|>"],
+        vision_start_token_id=ids["<|vision_start|>"], vision_end_token_id=ids["<|vision_end|>"],
+        eos_token_id=ids["<|im_end|>"], pad_token_id=ids["<|endoftext|>"])
+    torch.manual_seed(seed)
+    model = Qwen2VLForConditionalGeneration(config)
+    model.generation_config.eos_token_id = ids["<|im_end|>"]
+    model.generation_config.pad_token_id = ids["<|endoftext|>"]
+    model.save_pretrained(out_dir)
+    processor.save_pretrained(out_dir)
+    return str(out_dir)
+
+
+def synthetic_screenshot(size=(544, 1216)):
+    """生成一张类似手机界面的合成截图，用于预热（触发 CUDA kernel / processor 的首次初始化）"""
+    w, h = size
+    image = Image.new("RGB", size, (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, w, h // 12], fill=(33, 150, 243))
+    for i in range(6):
+        top = h // 8 + i * h // 8
+        draw.rectangle([w // 20, top, w - w // 20, top + h // 10], fill=(255, 255, 255), outline=(200, 200, 200))
+        draw.text((w // 10, top + h // 40), f"Item {i + 1}", fill=(0, 0, 0))
+    draw.rectangle([0, h - h // 14, w, h], fill=(255, 255, 255), outline=(200, 200, 200))
+    return image
+
+
+def warmup(model, processor, max_new_tokens=8):
+    """用合成截图跑一次短生成，让首个真实请求不再承担惰性初始化的开销"""
+    return run_vlm(model, processor, synthetic_screenshot(), "Describe this screen.", max_new_tokens)